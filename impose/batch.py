@@ -0,0 +1,351 @@
+"""Headless colocalization of all datasets in an impose session
+
+Usage::
+
+    python -m impose.batch session.impose-session output_directory
+
+The structure composites of the colocalization tab are applied to
+their data sources in a process pool and the extracted data are
+written to the output directory (see :mod:`impose.export`).
+Completed datasets are recorded in the file "impose-batch.json" in
+the output directory, so that an interrupted run can be resumed by
+running the same command again.
+"""
+import argparse
+import concurrent.futures
+import copy
+import hashlib
+import json
+import multiprocessing
+import os
+import pathlib
+import sys
+import traceback
+
+from . import export
+from .data import DataSource
+from .file_index import FileSignatureIndex
+from .session import (
+    ImposeDataFileNotFoundError, ImposeSession, JSONEncoderFromNumpy)
+from .structure import StructureComposite
+from ._version import version
+
+#: Name of the file in the output directory recording completed jobs
+PROGRESS_FILE = "impose-batch.json"
+
+
+class BatchJob:
+    def __init__(self, name, data_source_state, composite_state,
+                 fmt="tsv"):
+        """Colocalization of one data source with one structure composite
+
+        Parameters
+        ----------
+        name: str
+            Unique name of the job, used as the stem of the output files
+        data_source_state: dict
+            State of the data source (see
+            :func:`impose.data.DataSource.__getstate__`)
+        composite_state: dict
+            State of the structure composite (see
+            :func:`impose.structure.StructureComposite.__getstate__`)
+        fmt: str
+            Export format ("tsv", see :func:`impose.export.export_tsv`,
+            or "hdf5" and "npz", see :func:`impose.export.export_data`)
+        """
+        #: Name of the job (stem of the output files)
+        self.name = name
+        self.data_source_state = data_source_state
+        self.composite_state = composite_state
+        #: Export format
+        self.fmt = fmt
+
+    def __repr__(self):
+        return f"<BatchJob '{self.name}' at {hex(id(self))}>"
+
+    @property
+    def path(self):
+        """Path to the data file"""
+        return pathlib.Path(self.data_source_state["path"])
+
+    @property
+    def key(self):
+        """Identifier of the job input (data source and composite)
+
+        The key is computed from the data signature, the state of
+        the data source (e.g. the view slice of a stack) without the
+        path, and the state of the structure composite.
+        """
+        dss = {kk: vv for kk, vv in self.data_source_state.items()
+               if kk != "path"}
+        dump = json.dumps({"data source": dss,
+                           "structure composite": self.composite_state},
+                          sort_keys=True,
+                          cls=JSONEncoderFromNumpy)
+        chash = hashlib.md5(dump.encode("utf-8")).hexdigest()
+        return "{}_{}_{}".format(
+            self.data_source_state["metadata"]["signature"], chash, self.fmt)
+
+    def run(self, path):
+        """Extract and export the data to the output directory `path`
+
+        Returns
+        -------
+        paths: list of pathlib.Path
+            All files written
+        """
+        ds = DataSource(self.data_source_state["path"])
+        # `__setstate__` modifies the state (see `BatchJob.key`)
+        ds.__setstate__(copy.deepcopy(self.data_source_state))
+        sc = StructureComposite()
+        sc.__setstate__(self.composite_state)
+        if self.fmt == "tsv":
+            return export.export_tsv(path=path,
+                                     data_source=ds,
+                                     structure_composite=sc,
+                                     stem=self.name)
+        else:
+            return [export.export_data(path=path,
+                                       data_source=ds,
+                                       structure_composite=sc,
+                                       fmt=self.fmt,
+                                       stem=self.name)]
+
+
+def get_jobs(state, fmt="tsv"):
+    """Return the colocalization jobs of a session
+
+    Parameters
+    ----------
+    state: dict
+        State of an impose session with data sources and structure
+        composites in the colocalization tab (see
+        :func:`impose.session.ImposeSession.load_state`); The data
+        signatures are used to distinguish files with identical stems.
+    fmt: str
+        Export format (see :class:`BatchJob`)
+
+    Returns
+    -------
+    jobs: list of BatchJob
+        One job for every data source; The output file stems
+        are the data file stems, with the data signature appended
+        for files with identical stems.
+    """
+    coloc = state["colocalization"]
+    stems = [pathlib.Path(dss["path"]).stem for dss in coloc["data sources"]]
+    jobs = []
+    for dss, scs in zip(coloc["data sources"],
+                        coloc["structure composites manual"]):
+        stem = pathlib.Path(dss["path"]).stem
+        sig = dss["metadata"].get("signature")
+        if stems.count(stem) > 1 and sig is not None:
+            stem += "_" + sig[:8]
+        jobs.append(BatchJob(name=stem,
+                             data_source_state=dss,
+                             composite_state=scs,
+                             fmt=fmt))
+    return jobs
+
+
+def load_progress(path):
+    """Return the completed jobs recorded in the output directory `path`
+
+    Returns
+    -------
+    completed: dict
+        Job keys (see :func:`BatchJob.key`) as keys and a dictionary
+        with the job name and the output files as values
+    """
+    ppath = pathlib.Path(path) / PROGRESS_FILE
+    if ppath.exists():
+        with ppath.open("r") as fd:
+            return json.load(fd)["completed"]
+    else:
+        return {}
+
+
+def save_progress(path, completed):
+    """Record the completed jobs in the output directory `path`
+
+    The file is replaced atomically, so that it is not corrupted
+    when the batch run is interrupted.
+    """
+    ppath = pathlib.Path(path) / PROGRESS_FILE
+    tpath = ppath.with_name(ppath.name + ".tmp")
+    with tpath.open("w") as fd:
+        json.dump({"impose": {"version": version},
+                   "completed": completed},
+                  fd,
+                  ensure_ascii=False,
+                  indent=1)
+    os.replace(tpath, ppath)
+
+
+def is_completed(job, path, completed):
+    """Whether a job was completed and its output files still exist"""
+    entry = completed.get(job.key)
+    if entry is None:
+        return False
+    return all((pathlib.Path(path) / fn).exists() for fn in entry["files"])
+
+
+def run_batch(session_path, path, fmt="tsv", workers=None, resume=True,
+              search_paths=None, callback=None):
+    """Colocalize all datasets of an impose session
+
+    Parameters
+    ----------
+    session_path: str or pathlib.Path
+        Path to the .impose-session file
+    path: str or pathlib.Path
+        Output directory (created if it does not exist)
+    fmt: str
+        Export format ("tsv", "hdf5", or "npz", see :class:`BatchJob`)
+    workers: int
+        Number of worker processes; If set to None, the number
+        of CPUs is used. If set to 1, the jobs are run sequentially
+        in the calling process.
+    resume: bool
+        If True (default), skip jobs that were completed in a
+        previous run with the same data and structure composite
+    search_paths: list of pathlib.Path
+        Directories where to search for data files that are not
+        at their original location (see
+        :func:`impose.session.ImposeSession.load`); Jobs whose data
+        file cannot be found are reported as failed.
+    callback: callable
+        Function called with the arguments `(job, done, total,
+        error)` after each job; `error` is None or the traceback
+        of the exception
+
+    Returns
+    -------
+    summary: dict
+        Dictionary with the keys "completed", "skipped", and "failed"
+        and lists of job names as values
+    """
+    path = pathlib.Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    session_path = pathlib.Path(session_path)
+    if search_paths is None:
+        search_paths = []
+    search_paths = list(search_paths) + [session_path.parent]
+    # The data are only loaded in the jobs.
+    with session_path.open("r") as fd:
+        state = json.load(fd)
+    # Data files that cannot be found are reported as failed jobs.
+    file_index = FileSignatureIndex()
+    errors = []
+    for dss in state["colocalization"]["data sources"]:
+        try:
+            ImposeSession.check_json_paths(dss, search_paths, file_index)
+        except ImposeDataFileNotFoundError:
+            errors.append(traceback.format_exc())
+            continue
+        errors.append(None)
+        if dss["metadata"].get("signature") is None:
+            dss["metadata"]["signature"] = file_index.get_signature(
+                dss["path"])
+    jobs = get_jobs(state, fmt=fmt)
+
+    completed = load_progress(path) if resume else {}
+    summary = {"completed": [], "skipped": [], "failed": []}
+    pending = []
+    missing = []
+    for job, error in zip(jobs, errors):
+        if error is not None:
+            missing.append((job, error))
+        elif is_completed(job, path, completed):
+            summary["skipped"].append(job.name)
+        else:
+            pending.append(job)
+    total = len(jobs)
+    done = len(summary["skipped"])
+
+    def finish(job, files=None, error=None):
+        nonlocal done
+        done += 1
+        if error is None:
+            completed[job.key] = {"name": job.name,
+                                  "files": [pp.name for pp in files]}
+            save_progress(path, completed)
+            summary["completed"].append(job.name)
+        else:
+            summary["failed"].append(job.name)
+        if callback is not None:
+            callback(job, done, total, error)
+
+    for job, error in missing:
+        finish(job, error=error)
+
+    if workers == 1:
+        for job in pending:
+            try:
+                files = job.run(path)
+            except BaseException:
+                finish(job, error=traceback.format_exc())
+            else:
+                finish(job, files=files)
+    elif pending:
+        # "spawn" does not inherit the state of the parent (e.g. Qt)
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = {pool.submit(job.run, path): job for job in pending}
+            for fut in concurrent.futures.as_completed(futures):
+                job = futures[fut]
+                try:
+                    files = fut.result()
+                except BaseException:
+                    # includes the traceback of the worker process
+                    finish(job, error=traceback.format_exc())
+                else:
+                    finish(job, files=files)
+    return summary
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m impose.batch",
+        description="Extract the data of all datasets in the "
+                    "colocalization tab of an impose session")
+    parser.add_argument("session", type=pathlib.Path,
+                        help="path to an .impose-session file")
+    parser.add_argument("output", type=pathlib.Path,
+                        help="output directory")
+    parser.add_argument("-f", "--format", default="tsv",
+                        choices=["tsv"] + sorted(export.EXPORT_SUFFIXES),
+                        help="export format (default: tsv)")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="number of worker processes "
+                             "(default: number of CPUs)")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="process all datasets again")
+    parser.add_argument("-s", "--search-path", type=pathlib.Path,
+                        action="append", default=None,
+                        help="directory in which to search for missing "
+                             "data files (can be given multiple times)")
+    args = parser.parse_args(args)
+
+    def report(job, done, total, error):
+        status = "OK" if error is None else "FAILED"
+        print(f"[{done}/{total}] {status} {job.path}", flush=True)
+        if error is not None:
+            print(error, file=sys.stderr, flush=True)
+
+    summary = run_batch(session_path=args.session,
+                        path=args.output,
+                        fmt=args.format,
+                        workers=args.workers,
+                        resume=not args.no_resume,
+                        search_paths=args.search_path,
+                        callback=report)
+    print(f"Completed: {len(summary['completed'])}, "
+          f"skipped: {len(summary['skipped'])}, "
+          f"failed: {len(summary['failed'])}")
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
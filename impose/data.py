@@ -1,12 +1,16 @@
 import warnings
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import copy
+import os
 import pathlib
 import errno
+import threading
 
 import numpy as np
 
-from .flblend import FlBlend
+from .flblend import (
+    FlBlend, get_contrast_range, get_contrast_range_stack)
 from .formats import load
 from .util import equal_states, dict_update_nested
 
@@ -29,18 +33,208 @@ class DataChannel(dict):
         self["hue"] = hue
 
 
+class SnapshotCache:
+    def __init__(self, max_bytes=2**28):
+        """Least-recently-used cache for visualization snapshots
+
+        Parameters
+        ----------
+        max_bytes: int
+            Memory budget in bytes; The least-recently used
+            snapshots are removed when the budget is exceeded.
+        """
+        #: memory budget in bytes
+        self.max_bytes = max_bytes
+        #: number of bytes currently used
+        self.nbytes = 0
+        self._items = OrderedDict()
+        # snapshots may be rendered in background threads
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.nbytes = 0
+
+    def get(self, key):
+        """Return the snapshot for `key` (None if not cached)"""
+        with self._lock:
+            image = self._items.get(key)
+            if image is not None:
+                self._items.move_to_end(key)
+        return image
+
+    def put(self, key, image, keep=()):
+        """Add a snapshot to the cache
+
+        The snapshot is made read-only, because it is shared
+        between all callers that request it.
+
+        Parameters
+        ----------
+        key: hashable
+            Snapshot key
+        image: np.ndarray
+            Snapshot
+        keep: collection of hashables
+            Keys of snapshots that must not be removed to make room
+            for `image`; If there is not enough room otherwise,
+            `image` is not added.
+        """
+        with self._lock:
+            if key in self._items:
+                self.nbytes -= self._items.pop(key).nbytes
+            if image.nbytes > self.max_bytes:
+                # do not flush the entire cache for one large image
+                return
+            kept = sum(self._items[kk].nbytes for kk in set(keep)
+                       if kk in self._items)
+            if kept + image.nbytes > self.max_bytes:
+                return
+            # remove the least-recently used snapshots
+            for old_key in list(self._items.keys()):
+                if self.nbytes + image.nbytes <= self.max_bytes:
+                    break
+                if old_key not in keep:
+                    self.nbytes -= self._items.pop(old_key).nbytes
+            image.flags.writeable = False
+            self._items[key] = image
+            self.nbytes += image.nbytes
+
+
+class SlicePrefetcher:
+    def __init__(self, radius=2, dtype=np.float32):
+        """Render neighboring slices of a stack in a background thread
+
+        The images of the slices around the current view slice are
+        blended in advance and stored in the snapshot cache of the
+        data source (see :func:`DataSource.get_image`), so that
+        stepping through a stack only requires cache lookups. The
+        direction of travel is learned from consecutive calls to
+        :func:`SlicePrefetcher.update` and slices ahead are rendered
+        first. Prefetching is cancelled when the view changes in any
+        other way than the view slice (e.g. view plane, channel
+        selection, or visualization parameters).
+
+        Parameters
+        ----------
+        radius: int
+            Number of slices to prefetch in the direction of travel
+        dtype: np.dtype
+            Output data type of the images (see
+            :func:`DataSource.get_image`)
+        """
+        #: Number of slices to prefetch in the direction of travel
+        self.radius = radius
+        #: Output data type of the images
+        self.dtype = dtype
+        #: Direction of travel (-1, 0, or 1)
+        self.direction = 0
+        self._context = None
+        self._view_slice = None
+        self._generation = 0
+        self._future = None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def cancel(self):
+        """Stop prefetching after the current slice"""
+        self._generation += 1
+
+    def shutdown(self):
+        """Cancel prefetching and stop the background thread"""
+        self.cancel()
+        self._executor.shutdown(wait=False)
+
+    def update(self, data_source, metadata):
+        """Prefetch the neighbors of the view slice in `metadata`
+
+        Parameters
+        ----------
+        data_source: DataSource
+            The data source of the stack
+        metadata: dict
+            Copy of `data_source.metadata` (it must not be modified
+            during prefetching)
+        """
+        self.cancel()
+        view_slice = metadata["slice"]["view slice"]
+        # everything that defines the images except for the view slice
+        context = (id(data_source),
+                   data_source.get_snapshot_key(
+                       dtype=self.dtype,
+                       metadata=dict(metadata,
+                                     slice=dict(metadata["slice"],
+                                                **{"view slice": None}))))
+        if context != self._context:
+            self.direction = 0
+        elif view_slice != self._view_slice:
+            self.direction = 1 if view_slice > self._view_slice else -1
+        self._context = context
+        self._view_slice = view_slice
+        slices = get_prefetch_slices(
+            view_slice=view_slice,
+            count=data_source.get_slice_count(metadata=metadata),
+            direction=self.direction,
+            radius=self.radius)
+        # The current image and the prefetched images must fit into
+        # the snapshot cache (RGB images, see `DataSource.get_image`).
+        nbytes = (3 * np.dtype(self.dtype).itemsize
+                  * int(np.prod(data_source.get_image_shape())))
+        capacity = data_source._snapshot_cache.max_bytes // nbytes - 1
+        slices = slices[:max(capacity, 0)]
+        if slices:
+            self._future = self._executor.submit(
+                self._prefetch, self._generation, data_source, metadata,
+                slices)
+
+    def wait(self, timeout=None):
+        """Wait until prefetching is done (for testing)"""
+        if self._future is not None:
+            self._future.result(timeout=timeout)
+
+    def _prefetch(self, generation, data_source, metadata, slices):
+        # the current image is never removed from the cache
+        current = data_source.get_snapshot_key(dtype=self.dtype,
+                                               metadata=metadata)
+        for view_slice in slices:
+            if generation != self._generation:
+                # cancelled
+                break
+            meta = dict(metadata,
+                        slice=dict(metadata["slice"],
+                                   **{"view slice": view_slice}))
+            data_source.get_image(dtype=self.dtype, metadata=meta,
+                                  keep=[current])
+
+
 class DataSource:
     """Reproducible visualization of a slice through a 3D dataset"""
 
+    #: Maximum number of slices read for the autocontrast range of
+    #: a stack (see :func:`DataSource.get_contrast_range`)
+    contrast_stack_slices = 64
+
     def __init__(self, path):
         #: dataset path
         self.path = None
-        #: data dictionary {"channel name": np.ndarray)
+        #: data dictionary {"channel name": array-like}; the values may
+        #: be lazy proxies (see :mod:`impose.formats.lazy`) that are only
+        #: read from disk when sliced
         self.data_channels = {}
         #: metadata dictionary
         self.metadata = {}
         #: current visualization snapshot
         self._snapshot = None
+        #: cache of previously blended snapshots
+        self._snapshot_cache = SnapshotCache()
+        #: cache of autocontrast intensity ranges
+        self._contrast_cache = {}
         self._initialize_from_path(path)
 
     def __eq__(self, other):
@@ -129,6 +323,8 @@ class DataSource:
             "blend": {
                 "mode": "hsv",
                 "channels": channels_sel,
+                # autocontrast for each "slice" or for the entire "stack"
+                "autocontrast": "slice",
             },
             "channels": meta_channels,
             "slice": {
@@ -139,6 +335,8 @@ class DataSource:
             "stack": meta_stack,
         }
         self._snapshot = None
+        self._snapshot_cache.clear()
+        self._contrast_cache.clear()
 
     @property
     def signature(self):
@@ -154,36 +352,212 @@ class DataSource:
             self.get_image()
         return self._snapshot
 
-    def get_channel_data(self, name):
+    def get_channel_data(self, name, view_slice=None, metadata=None,
+                         step=1):
+        """Return the 2D image data of a channel for the current view
+
+        Only the requested slice is read from disk.
+
+        Parameters
+        ----------
+        name: str
+            Channel name
+        view_slice: int
+            Position along the cut axis; defaults to the current
+            view slice (`self.metadata["slice"]["view slice"]`)
+        metadata: dict
+            Metadata to use instead of `self.metadata` (see
+            :func:`DataSource.get_image`)
+        step: int
+            Only return every `step`-th pixel along each axis (for
+            previews); The other pixels are not read from disk.
+        """
+        if metadata is None:
+            metadata = self.metadata
         cdat = self.data_channels[name]
         if len(cdat.shape) == 2:
-            return cdat
+            return np.asarray(cdat[::step, ::step])
         else:
             # Assemble tuple for slicing
-            metasl = self.metadata["slice"]
+            metasl = metadata["slice"]
+            if view_slice is None:
+                view_slice = metasl["view slice"]
             cslice = [0] * len(cdat.shape)
             for imax in metasl["view plane"]:
-                cslice[imax] = slice(None, None)
-            cslice[metasl["cut axis"]] = metasl["view slice"]
-            return cdat[tuple(cslice)]
+                cslice[imax] = slice(None, None, step)
+            cslice[metasl["cut axis"]] = view_slice
+            return np.asarray(cdat[tuple(cslice)])
+
+    def get_contrast_range(self, name, image=None, metadata=None,
+                           preview=1):
+        """Return the autocontrast intensity range of a channel
+
+        Depending on `self.metadata["blend"]["autocontrast"]`, the
+        range is computed from the current slice ("slice", default)
+        or from the entire stack ("stack"). For stacks, the histogram
+        is accumulated one slice at a time from at most
+        `DataSource.contrast_stack_slices` evenly-spaced slices (see
+        :func:`impose.flblend.get_contrast_range_stack`). Ranges are
+        computed only once per channel (stack) or slice and cached.
+
+        Parameters
+        ----------
+        name: str
+            Channel name
+        image: 2d ndarray
+            The current image data of the channel (optional, to
+            avoid reading the data again)
+        metadata: dict
+            Metadata to use instead of `self.metadata` (see
+            :func:`DataSource.get_image`)
+        preview: int
+            Downsampling factor of `image` (see
+            :func:`DataSource.get_image`); If the range of the slice
+            is not cached, it is estimated from the downsampled data
+            and not cached.
+        """
+        if metadata is None:
+            metadata = self.metadata
+        mode = metadata["blend"].get("autocontrast", "slice")
+        if mode == "stack":
+            key = (name,)
+        elif mode == "slice":
+            metasl = metadata["slice"]
+            key = (name,
+                   tuple(metasl["view plane"]),
+                   metasl["cut axis"],
+                   metasl["view slice"])
+        else:
+            raise ValueError(f"Unknown autocontrast mode '{mode}'!")
+        if key not in self._contrast_cache:
+            if mode == "stack":
+                self._contrast_cache[key] = get_contrast_range_stack(
+                    lambda: self._iter_contrast_slices(name, metadata))
+            else:
+                if image is None:
+                    image = self.get_channel_data(name, metadata=metadata,
+                                                  step=preview)
+                if preview > 1:
+                    return get_contrast_range(image)
+                self._contrast_cache[key] = get_contrast_range(image)
+        return self._contrast_cache[key]
 
-    def get_image(self):
-        fb = FlBlend()
+    def _iter_contrast_slices(self, name, metadata):
+        """Yield the slices used for the "stack" autocontrast range
+
+        At most `self.contrast_stack_slices` evenly-spaced slices
+        are read (one at a time).
+        """
+        count = self.get_slice_count(metadata=metadata)
+        slices = np.unique(np.linspace(
+            0, count - 1, min(count, self.contrast_stack_slices)).astype(int))
+        for view_slice in slices:
+            yield self.get_channel_data(name, view_slice=int(view_slice),
+                                        metadata=metadata)
+
+    def get_image(self, dtype=None, metadata=None, cache_only=False,
+                  preview=1, keep=()):
+        """Return the blended RGB image for the current view
+
+        Blended images are cached (see :class:`SnapshotCache`) and
+        are therefore read-only.
+
+        Parameters
+        ----------
+        dtype: np.dtype
+            Output data type (see :func:`impose.flblend.FlBlend.blend`);
+            Use float32 or uint8 for display-ready images.
+        metadata: dict
+            Metadata to use instead of `self.metadata`; Pass a copy
+            of `self.metadata` to render images in a background
+            thread while `self.metadata` is being modified. In this
+            case, the current snapshot is not updated.
+        cache_only: bool
+            If True, return None instead of blending the image if
+            it is not cached
+        preview: int
+            Downsampling factor for fast previews (e.g. while the
+            user is moving a slider); Only every `preview`-th pixel
+            along each axis is read and blended. The autocontrast
+            range of the full-resolution data is used if it is
+            cached, otherwise it is estimated from the preview (see
+            :func:`DataSource.get_contrast_range`). Previews do not
+            replace the current snapshot.
+        keep: list
+            Keys of cached images (see :func:`DataSource.get_snapshot_key`)
+            that must not be removed from the cache to make room for
+            this image (see :func:`SnapshotCache.put`)
+        """
+        if int(preview) != preview or preview < 1:
+            raise ValueError(f"Invalid preview level {preview}, expected "
+                             "a positive integer!")
+        update_snapshot = metadata is None and preview == 1
+        if metadata is None:
+            metadata = self.metadata
+        key = self.get_snapshot_key(dtype=dtype, metadata=metadata,
+                                    preview=preview)
+        image = self._snapshot_cache.get(key)
+        if image is None:
+            if cache_only:
+                return None
+            fb = FlBlend()
+            for name in self.data_channels:
+                if name in metadata["blend"]["channels"]:
+                    chimg = self.get_channel_data(name, metadata=metadata,
+                                                  step=preview)
+                    cmet = metadata["channels"][name]
+                    fb.add_image(
+                        image=chimg,
+                        hue=cmet["hue"],
+                        brightness=cmet["brightness"],
+                        contrast=cmet["contrast"],
+                        contrast_range=self.get_contrast_range(
+                            name, chimg, metadata=metadata,
+                            preview=preview))
+            image = fb.blend(metadata["blend"]["mode"], dtype=dtype)
+            self._snapshot_cache.put(key, image, keep=keep)
+        if update_snapshot:
+            self._snapshot = image
+        return image
+
+    def get_snapshot_key(self, dtype=None, metadata=None, preview=1):
+        """Return a key identifying the image returned by `get_image`
+
+        The key is computed from all metadata that affect blending
+        (view slice, selected channels and their visualization
+        parameters, and the blend mode), the output data type, and
+        the preview level.
+        """
+        if metadata is None:
+            metadata = self.metadata
+        metasl = metadata["slice"]
+        channels = []
         for name in self.data_channels:
-            if name in self.metadata["blend"]["channels"]:
-                chimg = self.get_channel_data(name)
-                cmet = self.metadata["channels"][name]
-                fb.add_image(image=chimg,
-                             hue=cmet["hue"],
-                             brightness=cmet["brightness"],
-                             contrast=cmet["contrast"])
-        self._snapshot = fb.blend(self.metadata["blend"]["mode"])
-        return self._snapshot
+            if name in metadata["blend"]["channels"]:
+                cmet = metadata["channels"][name]
+                channels.append([name,
+                                 cmet["hue"],
+                                 cmet["brightness"],
+                                 cmet["contrast"]])
+        return _hashable([metasl["view plane"],
+                          metasl["cut axis"],
+                          metasl["view slice"],
+                          metadata["blend"]["mode"],
+                          metadata["blend"].get("autocontrast"),
+                          channels,
+                          None if dtype is None else np.dtype(dtype).str,
+                          int(preview)])
 
     def get_image_shape(self):
         """Return the 2D shape of the image returned by `get_image`"""
         name = list(self.data_channels.keys())[0]
-        return self.get_channel_data(name).shape
+        cshape = self.data_channels[name].shape
+        if len(cshape) == 2:
+            return cshape
+        else:
+            # this does not require reading any data
+            plane = sorted(self.metadata["slice"]["view plane"])
+            return tuple(cshape[ax] for ax in plane)
 
     def get_image_size_um(self):
         """Return the size of the currently set image"""
@@ -203,6 +577,38 @@ class DataSource:
                      self.metadata["stack"]["pixel size z"]]
             return sizes[ax1], sizes[ax2]
 
+    def get_slice_count(self, metadata=None):
+        """Return the number of slices along the cut axis
+
+        Parameters
+        ----------
+        metadata: dict
+            Metadata to use instead of `self.metadata` (see
+            :func:`DataSource.get_image`)
+        """
+        if metadata is None:
+            metadata = self.metadata
+        name = list(self.data_channels.keys())[0]
+        cshape = self.data_channels[name].shape
+        if len(cshape) == 2:
+            return 1
+        else:
+            return cshape[metadata["slice"]["cut axis"]]
+
+    def get_view(self):
+        """Return a copy of the data source with a copy of the metadata
+
+        The data channels and the caches are shared with this data
+        source, so nothing is read from disk. Changes of the
+        metadata (e.g. the view slice) do not affect the view,
+        which is why views are passed to background computations.
+        """
+        view = DataSource.__new__(DataSource)
+        view.__dict__.update(self.__dict__)
+        view.metadata = copy.deepcopy(self.metadata)
+        view._snapshot = None
+        return view
+
     def get_voxel_depth(self):
         """Return voxel depth for current view in microns"""
         if len(self.shape) == 2:
@@ -218,3 +624,97 @@ class DataSource:
         """Update the metadata dictionary"""
         for sec in meta_dict:
             self.metadata[sec].update(meta_dict[sec])
+
+
+def get_prefetch_slices(view_slice, count, direction=0, radius=2):
+    """Return the slices to prefetch around a view slice
+
+    Parameters
+    ----------
+    view_slice: int
+        Current view slice
+    count: int
+        Number of slices in the stack
+    direction: int
+        Direction of travel; If 1 or -1, `radius` slices ahead of
+        `view_slice` are returned first, followed by the slice
+        behind `view_slice`. If 0, slices on both sides are
+        returned alternately.
+    radius: int
+        Number of slices to prefetch in the direction of travel
+
+    Returns
+    -------
+    slices: list of int
+        Slices in the order in which they should be prefetched
+    """
+    if direction:
+        slices = [view_slice + direction * ii for ii in range(1, radius + 1)]
+        slices.append(view_slice - direction)
+    else:
+        slices = []
+        for ii in range(1, radius + 1):
+            slices += [view_slice + ii, view_slice - ii]
+    return [sl for sl in slices if 0 <= sl < count]
+
+
+def _hashable(obj):
+    """Convert nested lists and numpy scalars to a hashable tuple"""
+    if isinstance(obj, (list, tuple, np.ndarray)):
+        return tuple(_hashable(ob) for ob in obj)
+    elif isinstance(obj, np.generic):
+        return obj.item()
+    else:
+        return obj
+
+
+def load_data_sources(paths, states=None, workers=None,
+                      return_exceptions=False):
+    """Load multiple data sources concurrently
+
+    Parameters
+    ----------
+    paths: list of str or pathlib.Path
+        Paths to the data files
+    states: list of dict
+        Optional states (see :func:`DataSource.__getstate__`) that
+        are applied to the data sources after loading
+    workers: int
+        Number of worker threads; If set to None, the number
+        of CPUs is used. If set to 1, the data sources are loaded
+        sequentially in the calling thread.
+    return_exceptions: bool
+        If set to True, exceptions are returned in place of the
+        corresponding data sources; Otherwise the first exception
+        (in the order of `paths`) is raised.
+
+    Returns
+    -------
+    data_sources: list of DataSource
+        The data sources in the same order as `paths`
+    """
+    paths = list(paths)
+    if states is None:
+        states = [None] * len(paths)
+
+    def load_single(args):
+        path, state = args
+        try:
+            ds = DataSource(path)
+            if state is not None:
+                ds.__setstate__(state)
+        except BaseException as e:
+            if return_exceptions:
+                return e
+            raise
+        return ds
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(paths))
+    if workers <= 1:
+        return [load_single(args) for args in zip(paths, states)]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # `map` preserves the order of `paths`
+            return list(pool.map(load_single, zip(paths, states)))
@@ -0,0 +1,238 @@
+"""Export data extracted with structure composites"""
+from collections import OrderedDict
+import json
+import pathlib
+
+import h5py
+import numpy as np
+
+from .session import JSONEncoderFromNumpy
+from .structure import StructureComposite
+from ._version import version
+
+#: Suffixes of the binary export formats
+EXPORT_SUFFIXES = {
+    "hdf5": ".impose-data.h5",
+    "npz": ".impose-data.npz",
+}
+
+
+def export_composite(path, structure_composite):
+    """Save a structure composite as an .impose-composite file"""
+    with pathlib.Path(path).open("w") as fd:
+        json.dump(structure_composite.__getstate__(), fd,
+                  ensure_ascii=False,
+                  allow_nan=True,
+                  indent=1,
+                  sort_keys=False)
+
+
+def export_tsv(path, data_source, structure_composite, stem=None):
+    """Export the data points of all structure layers as text files
+
+    For every layer, a tab-separated file "{stem}_{layer}.tsv" with
+    one column per channel is written. The structure composite is
+    saved to "{stem}.impose-composite".
+
+    Parameters
+    ----------
+    path: str or pathlib.Path
+        Output directory
+    data_source: impose.data.DataSource
+        Data source from which to extract the data
+    structure_composite: impose.structure.StructureComposite
+        Structure composite defining the layers
+    stem: str
+        File name stem; defaults to the stem of the data source path
+
+    Returns
+    -------
+    paths: list of pathlib.Path
+        All files written
+    """
+    path = pathlib.Path(path)
+    if stem is None:
+        stem = data_source.path.stem
+    data = structure_composite.extract_data(data_source)
+    paths = []
+    for ll in data:
+        layd = data[ll]
+        # export all channel data as a text file
+        lp = path / "{}_{}.tsv".format(stem, ll)
+        channels = sorted(layd.keys())
+        # data
+        layarr = np.zeros((layd[channels[0]].size, len(channels)),
+                          dtype=float)
+        for ii, chn in enumerate(channels):
+            layarr[:, ii] = layd[chn]
+        np.savetxt(lp, layarr,
+                   fmt="%.5g",
+                   delimiter="\t",
+                   header="\t".join(channels),
+                   newline="\r\n",
+                   encoding="utf-8",
+                   )
+        paths.append(lp)
+    # also save the structure composite
+    pc = path / "{}.impose-composite".format(stem)
+    export_composite(pc, structure_composite)
+    paths.append(pc)
+    return paths
+
+
+def export_data(path, data_source, structure_composite, fmt="hdf5",
+                stem=None):
+    """Export all structure layers to a single binary file
+
+    The data points of all channels, the pixel coordinates (row,
+    column) of all layers, and the structure composite are stored
+    in one file "{stem}.impose-data.h5" (HDF5, chunked and
+    compressed) or "{stem}.impose-data.npz" (compressed NumPy
+    archive). Use :func:`load_data` to read the file.
+
+    Parameters
+    ----------
+    path: str or pathlib.Path
+        Output directory
+    data_source: impose.data.DataSource
+        Data source from which to extract the data
+    structure_composite: impose.structure.StructureComposite
+        Structure composite defining the layers
+    fmt: str
+        Export format ("hdf5" or "npz")
+    stem: str
+        File name stem; defaults to the stem of the data source path
+
+    Returns
+    -------
+    path: pathlib.Path
+        The file written
+    """
+    if fmt not in EXPORT_SUFFIXES:
+        raise ValueError(f"Unknown export format '{fmt}', expected one "
+                         f"of {sorted(EXPORT_SUFFIXES.keys())}!")
+    if stem is None:
+        stem = data_source.path.stem
+    fpath = pathlib.Path(path) / (stem + EXPORT_SUFFIXES[fmt])
+    channels = sorted(data_source.data_channels.keys())
+    shape = data_source.get_image_shape()
+    indices = structure_composite.get_flat_indices(data_source)
+    meta = {
+        "impose version": version,
+        "data path": str(data_source.path),
+        "data signature": data_source.signature,
+        "image shape": list(shape),
+        "pixel size": [float(ps) for ps in data_source.get_pixel_size()],
+        "channels": channels,
+        "layers": [sl.label for sl in structure_composite.layers],
+        "composite": json.dumps(structure_composite.__getstate__(),
+                                allow_nan=True,
+                                cls=JSONEncoderFromNumpy),
+    }
+    if fmt == "hdf5":
+        _write_hdf5(fpath, data_source, meta, indices)
+    else:
+        _write_npz(fpath, data_source, meta, indices)
+    return fpath
+
+
+def load_data(path):
+    """Load a file written by :func:`export_data`
+
+    Returns
+    -------
+    data: collections.OrderedDict
+        Layer labels as keys and dictionaries as values; The inner
+        dictionaries have the keys "row" and "column" (pixel
+        coordinates) and the channel names (data points).
+    structure_composite: impose.structure.StructureComposite
+        The structure composite used for the export
+    meta: dict
+        Metadata (keys "impose version", "data path", "data
+        signature", "image shape", "pixel size", "channels",
+        and "layers")
+    """
+    path = pathlib.Path(path)
+    if path.name.endswith(EXPORT_SUFFIXES["hdf5"]):
+        data, meta = _read_hdf5(path)
+    elif path.name.endswith(EXPORT_SUFFIXES["npz"]):
+        data, meta = _read_npz(path)
+    else:
+        raise ValueError(f"Unknown export file format: '{path}'!")
+    sc = StructureComposite()
+    sc.__setstate__(json.loads(meta.pop("composite")))
+    return data, sc, meta
+
+
+def _get_coordinates(indices, shape):
+    """Pixel coordinates (row, column) with the smallest dtype"""
+    dtype = np.uint16 if max(shape) <= 2**16 else np.uint32
+    rows, cols = np.unravel_index(indices, shape)
+    return rows.astype(dtype), cols.astype(dtype)
+
+
+def _read_hdf5(path):
+    data = OrderedDict()
+    with h5py.File(path, "r") as h5:
+        meta = json.loads(h5.attrs["impose"])
+        for ii, label in enumerate(meta["layers"]):
+            group = h5["layers"][str(ii)]
+            data[label] = {key: group[key][:] for key in
+                           ["row", "column"] + meta["channels"]}
+    return data, meta
+
+
+def _read_npz(path):
+    data = OrderedDict()
+    with np.load(path, allow_pickle=False) as arc:
+        meta = json.loads(str(arc["impose"]))
+        for ii, label in enumerate(meta["layers"]):
+            data[label] = {key: arc[f"{ii}/{key}"] for key in
+                           ["row", "column"] + meta["channels"]}
+    return data, meta
+
+
+def _write_hdf5(path, data_source, meta, indices):
+    with h5py.File(path, "w") as h5:
+        # the metadata are stored as JSON to preserve the types
+        h5.attrs["impose"] = json.dumps(meta, allow_nan=True)
+        # one group per layer (labels may contain slashes)
+        layers = h5.create_group("layers")
+        groups = []
+        for ii, (label, idx) in enumerate(zip(meta["layers"], indices)):
+            group = layers.create_group(str(ii))
+            group.attrs["label"] = label
+            rows, cols = _get_coordinates(idx, meta["image shape"])
+            for key, arr in [("row", rows), ("column", cols)]:
+                _write_hdf5_array(group, key, arr)
+            groups.append(group)
+        # each channel is only read once for all layers
+        for chn in meta["channels"]:
+            chdata = np.ravel(data_source[chn])
+            for group, idx in zip(groups, indices):
+                _write_hdf5_array(group, chn, np.take(chdata, idx))
+
+
+def _write_hdf5_array(group, name, arr):
+    kwargs = {}
+    if arr.size:
+        # chunked and compressed
+        kwargs = {"chunks": (min(arr.size, 2**16),),
+                  "compression": "gzip",
+                  "compression_opts": 1,
+                  "shuffle": True}
+    group.create_dataset(name, data=arr, **kwargs)
+
+
+def _write_npz(path, data_source, meta, indices):
+    arrays = {"impose": np.array(json.dumps(meta, allow_nan=True))}
+    for ii, idx in enumerate(indices):
+        rows, cols = _get_coordinates(idx, meta["image shape"])
+        arrays[f"{ii}/row"] = rows
+        arrays[f"{ii}/column"] = cols
+    for chn in meta["channels"]:
+        chdata = np.ravel(data_source[chn])
+        for ii, idx in enumerate(indices):
+            arrays[f"{ii}/{chn}"] = np.take(chdata, idx)
+    with path.open("wb") as fd:
+        np.savez_compressed(fd, **arrays)
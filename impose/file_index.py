@@ -0,0 +1,187 @@
+"""Index of data file signatures for locating data files of sessions"""
+import json
+import os
+import pathlib
+import warnings
+
+from .formats import get_signature, suffix_dict
+
+
+class FileSignatureIndexWarning(UserWarning):
+    pass
+
+
+class FileSignatureIndex:
+    def __init__(self, path=None):
+        """Index for finding data files by name and signature
+
+        The signatures of data files are cached with the file size and
+        modification time as keys, so a file is only hashed again if it
+        changed. Search paths are walked only once per index instance,
+        which allows resolving all missing files of a session with a
+        single directory walk.
+
+        Parameters
+        ----------
+        path: str or pathlib.Path
+            Path to a JSON file in which the signatures are stored
+            persistently; If set to None (default), the signatures
+            are only kept in memory.
+        """
+        #: path to the persistent index file
+        self.path = pathlib.Path(path) if path is not None else None
+        #: signature entries {"path": [size, mtime_ns, signature]}
+        self.entries = {}
+        #: directory listings {root: {file name: [paths]}}
+        self._listings = {}
+        self._modified = False
+        if self.path is not None and self.path.exists():
+            self.load()
+
+    def find(self, name, search_paths, signature=None):
+        """Find a data file
+
+        Parameters
+        ----------
+        name: str
+            The original file name
+        search_paths: list of pathlib.Path
+            Directories where to search for `name` (recursively)
+        signature: str
+            Optional data file signature (defined in the `formats`
+            submodule)
+
+        Returns
+        -------
+        new_path: pathlib.Path or None
+            The path to the data file; None if it could not be found
+        """
+        for sp in search_paths:
+            for pp in self.get_candidates(name, sp):
+                if signature is None:
+                    # signature check not possible
+                    return pp
+                elif signature == self.get_signature(pp):
+                    # only return signature if we have a match
+                    return pp
+        return None
+
+    def get_candidates(self, name, search_path):
+        """Return all files named `name` in `search_path` (recursively)
+
+        The order of the files is the same as in `search_path.rglob(name)`.
+        """
+        search_path = pathlib.Path(search_path)
+        for root in self._listings:
+            if search_path == root or root in search_path.parents:
+                # `search_path` has already been walked
+                return [pp for pp in self._listings[root].get(name, [])
+                        if pp.parent == search_path
+                        or search_path in pp.parents]
+        return self.walk(search_path).get(name, [])
+
+    def get_signature(self, path):
+        """Return the signature of a data file
+
+        The signature is only computed if the file is not in the index
+        or if its size or modification time changed.
+        """
+        path = pathlib.Path(path)
+        stat = path.stat()
+        key = str(path)
+        entry = self.entries.get(key)
+        if entry is None or entry[:2] != [stat.st_size, stat.st_mtime_ns]:
+            entry = [stat.st_size, stat.st_mtime_ns, get_signature(path)]
+            self.entries[key] = entry
+            self._modified = True
+        return entry[2]
+
+    def load(self):
+        """Load the signatures from `self.path`"""
+        try:
+            with self.path.open("r") as fd:
+                self.entries.update(json.load(fd)["entries"])
+        except (OSError, ValueError, KeyError) as e:
+            warnings.warn(f"Could not load file index {self.path}: {e}",
+                          FileSignatureIndexWarning)
+
+    def prune(self):
+        """Remove the entries of files that do not exist anymore
+
+        Only entries in the search paths that were walked by this
+        index (see :func:`FileSignatureIndex.walk`) are checked, and
+        files found in the directory listings are not accessed
+        again. Entries are kept if their search path or their
+        directory cannot be reached (e.g. an unmounted network
+        share), because the files may still exist.
+        """
+        roots = [root for root in self._listings if root.is_dir()]
+        if not roots:
+            return
+        found = {str(pp) for root in roots
+                 for paths in self._listings[root].values()
+                 for pp in paths}
+        for key in list(self.entries.keys()):
+            path = pathlib.Path(key)
+            if key in found or not any(root in path.parents
+                                       for root in roots):
+                continue
+            try:
+                os.stat(key)
+            except FileNotFoundError:
+                if path.parent.is_dir():
+                    self.entries.pop(key)
+                    self._modified = True
+            except OSError:
+                pass
+
+    def save(self):
+        """Save the signatures to `self.path` (if it changed)
+
+        Entries of deleted or moved files are removed before
+        saving (see :func:`FileSignatureIndex.prune`).
+        """
+        if self.path is None:
+            return
+        self.prune()
+        if not self._modified:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # write to a temporary file first to not corrupt the index
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with tmp.open("w") as fd:
+            json.dump({"entries": self.entries}, fd)
+        tmp.replace(self.path)
+        self._modified = False
+
+    def walk(self, search_path):
+        """Walk `search_path` once and remember the data files in it"""
+        search_path = pathlib.Path(search_path)
+        listing = {}
+        if search_path.is_dir():
+            for pp in _walk_files(search_path):
+                if pp.suffix in suffix_dict:
+                    listing.setdefault(pp.name, []).append(pp)
+        self._listings[search_path] = listing
+        return listing
+
+
+def _walk_files(path):
+    """Yield all files in `path`, in the order of `pathlib.Path.rglob`"""
+    subdirs = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir():
+                        # like `rglob`, do not follow symlinks
+                        if not entry.is_symlink():
+                            subdirs.append(entry)
+                    else:
+                        yield path / entry.name
+                except OSError:
+                    continue
+    except (PermissionError, FileNotFoundError):
+        return
+    for entry in subdirs:
+        yield from _walk_files(path / entry.name)
@@ -26,7 +26,7 @@ class FlBlend:
             return None
 
     def add_image(self, image, hue, brightness=127, contrast=127,
-                  autocontrast=True):
+                  autocontrast=True, contrast_range=None):
         """Add a new image
 
         Parameters
@@ -45,48 +45,63 @@ class FlBlend:
         autocontrast: bool
             Automatically sets the contrast (histogram based
             between 1% and 99% of image data)
+        contrast_range: tuple of float
+            Precomputed intensity range for `autocontrast` (see
+            :func:`get_contrast_range`); If set, the histogram
+            analysis is skipped.
         """
         assert len(image.shape) == 2
         if autocontrast:
-            values_to_bin = image[~np.isnan(image)]
-            # only perform histogram analysis if whe have data
-            if values_to_bin.size:
-                hist, edges = np.histogram(values_to_bin,
-                                           bins=int(np.sqrt(image.size)),
-                                           density=True)
-                shist = np.cumsum(hist) / np.nansum(hist)
-                amin = np.argmin(np.abs(shist - .01))
-                amax = np.argmin(np.abs(shist - .99))
-                vmin = edges[amin]
-                vmax = edges[amax]
-                # scale to interval [0, 1]
-                image = rescale_intensity(image, in_range=(vmin, vmax),
-                                          out_range=(0, 1))
+            if contrast_range is None:
+                contrast_range = get_contrast_range(image)
+        else:
+            contrast_range = None
+        # The image is scaled to the interval [0, 1] in FlImage
+        # (only if we have data).
         flim = FlImage(image=image,
                        hue=hue,
                        contrast=contrast,
-                       brightness=brightness)
+                       brightness=brightness,
+                       in_range=contrast_range)
         self.images.append(flim)
 
-    def blend(self, mode="hsv"):
+    def blend(self, mode="hsv", dtype=None):
+        """Return the blended RGB image
+
+        Parameters
+        ----------
+        mode: str
+            Blending mode ("hsv" or "rgb")
+        dtype: np.dtype
+            Output data type; If set to None (default), the image
+            is computed in float64. For float32, computations are
+            done in float32. For uint8, computations are done in
+            float32 and the image is converted for display (see
+            :func:`convert_rgb`).
+        """
         if len(self) == 0:
             warnings.warn("No image data available for blending!",
                           NoImageDataWarning)
-            image = np.zeros((2, 2)) * np.nan
+            image = convert_rgb(np.zeros((2, 2)) * np.nan, dtype)
         elif len(self) == 1:
             # single images do not need blending
-            image = self.images[0].get_rgb()
+            image = self.images[0].get_rgb(dtype=dtype)
         else:
             if mode == "hsv":
-                image = self.blend_hsv()
+                image = self.blend_hsv(dtype=dtype)
             else:
-                image = self.blend_rgb()
+                image = self.blend_rgb(dtype=dtype)
 
         return image
 
-    def blend_rgb(self):
+    def blend_rgb(self, dtype=None):
         """Return image from RGB blending
 
+        Parameters
+        ----------
+        dtype: np.dtype
+            Output data type (see :func:`FlBlend.blend`)
+
         Returns
         -------
         blend_rgb: 3d ndarray
@@ -95,37 +110,37 @@ class FlBlend:
             of individual images; The last axis iterates over RGB
         """
         shape = self.shape
-        stack_r = np.zeros((shape[0], shape[1], len(self)), dtype=float)
-        stack_g = np.zeros((shape[0], shape[1], len(self)), dtype=float)
-        stack_b = np.zeros((shape[0], shape[1], len(self)), dtype=float)
+        # The images are accumulated one after another in running sums
+        # (instead of stacking them), so memory usage does not depend
+        # on the number of images.
+        sum_rgb = np.zeros((shape[0], shape[1], 3), dtype=np.float32)
         # We use this array to track the number of valid images pixel-wise
-        # (we have to use float here, since np.nan only exists for floats)
         # This is necessary so we can correctly account for NaN values
         # that might occur e.g. for Brillouin data.
         # See https://github.com/GuckLab/impose/issues/25 for more background.
-        stack_v = np.zeros((shape[0], shape[1], len(self)), dtype=float)
+        norm_v = np.zeros(shape, dtype=np.float32)
 
-        for ii, flim in enumerate(self.images):
-            rgb = flim.get_rgb()
-            stack_r[:, :, ii] = rgb[:, :, 0]
-            stack_g[:, :, ii] = rgb[:, :, 1]
-            stack_b[:, :, ii] = rgb[:, :, 2]
-            stack_v[:, :, ii] = np.invert(np.isnan(rgb[:, :, 0]))
+        for flim in self.images:
+            bim = flim.get_intensity(dtype=np.float32)
+            valid = ~np.isnan(bim)
+            norm_v += valid
+            bim = np.where(valid, bim, 0).astype(np.float32)
+            for cc in range(3):
+                sum_rgb[:, :, cc] += bim * np.float32(flim.hue_rgb[cc])
 
-        # Get the number of valid images per pixel for later normalization
-        norm_v = np.nansum(stack_v, axis=2)
         # Zero-valued pixels means all images were NaN at that pixel
         norm_v[norm_v == 0] = np.nan
+        sum_rgb /= norm_v[:, :, np.newaxis]
 
-        merged = np.zeros((shape[0], shape[1], 3), dtype=float)
-        merged[:, :, 0] = np.nansum(stack_r, axis=2) / norm_v
-        merged[:, :, 1] = np.nansum(stack_g, axis=2) / norm_v
-        merged[:, :, 2] = np.nansum(stack_b, axis=2) / norm_v
+        return convert_rgb(sum_rgb, dtype)
 
-        return merged
+    def blend_hsv(self, dtype=None):
+        """Return image from HSV blending
 
-    def blend_hsv(self):
-        """Return image from RGB blending
+        Parameters
+        ----------
+        dtype: np.dtype
+            Output data type (see :func:`FlBlend.blend`)
 
         Returns
         -------
@@ -134,43 +149,162 @@ class FlBlend:
             iterates over RGB
         """
         shape = self.shape
+        # The images are accumulated one after another in running sums
+        # (instead of stacking them), so memory usage does not depend
+        # on the number of images. For every image, the HSV value is
+        # the (non-negative) intensity and the HSV saturation is one,
+        # so that the weighted saturation equals the value.
+        sum_xh = np.zeros(shape, dtype=np.float32)
+        sum_yh = np.zeros(shape, dtype=np.float32)
+        sum_v = np.zeros(shape, dtype=np.float32)
+        # number of valid (non-NaN) images for every pixel
+        norm_v = np.zeros(shape, dtype=np.float32)
+
+        for flim in self.images:
+            val = flim.get_intensity(dtype=np.float32)
+            valid = ~np.isnan(val)
+            norm_v += valid
+            val = np.where(valid, np.maximum(val, 0), 0).astype(np.float32)
+            sum_v += val
+            angle = flim.get_hue() * 2 * np.pi
+            sum_xh += np.float32(np.cos(angle)) * val
+            sum_yh += np.float32(np.sin(angle)) * val
 
-        stack_s = np.zeros((shape[0], shape[1], len(self)), dtype=float)
-        stack_v = np.zeros((shape[0], shape[1], len(self)), dtype=float)
-        stack_xh = np.zeros((shape[0], shape[1], len(self)), dtype=float)
-        stack_yh = np.zeros((shape[0], shape[1], len(self)), dtype=float)
-
-        for ii, flim in enumerate(self.images):
-            hsv = flim.get_hsv()
-            stack_s[:, :, ii] = hsv[:, :, 1] * hsv[:, :, 2]
-            stack_v[:, :, ii] = hsv[:, :, 2]
-            stack_xh[:, :, ii] = np.cos(
-                (hsv[:, :, 0]) * 2 * np.pi) * np.abs(hsv[:, :, 2])
-            stack_yh[:, :, ii] = np.sin(
-                (hsv[:, :, 0]) * 2 * np.pi) * np.abs(hsv[:, :, 2])
-
-        merged_hsv = np.zeros((shape[0], shape[1], 3), dtype=float)
-
-        stack_havg = np.arctan2(
-            np.nanmean(stack_yh, axis=2),
-            np.nanmean(stack_xh, axis=2)) / 2 / np.pi % 1
-
-        valid = np.nansum(stack_v, axis=2) != 0
-        sat = np.nansum(stack_s, axis=2)
-        sat[valid] = np.nansum(stack_v, axis=2)[valid]
-        sat /= np.nanmax(sat)
-
-        merged_hsv[:, :, 0] = stack_havg
-        merged_hsv[:, :, 1] = 1-sat
-        merged_hsv[:, :, 2] = np.nanmean(stack_v, axis=2)
+        # Zero-valued pixels means all images were NaN at that pixel
+        norm_v[norm_v == 0] = np.nan
 
-        return hsv2rgb(merged_hsv)
+        merged_hsv = np.zeros((shape[0], shape[1], 3),
+                              dtype=get_work_dtype(dtype))
+        merged_hsv[:, :, 0] = np.arctan2(
+            sum_yh / norm_v, sum_xh / norm_v) / 2 / np.pi % 1
+        sat = sum_v / np.nanmax(sum_v)
+        merged_hsv[:, :, 1] = 1 - sat
+        merged_hsv[:, :, 2] = sum_v / norm_v
+
+        return convert_rgb(hsv2rgb(merged_hsv), dtype)
+
+
+def convert_rgb(image, dtype=None):
+    """Convert a float RGB image to an output data type
+
+    Parameters
+    ----------
+    image: ndarray
+        RGB image with values between 0 and 1
+    dtype: np.dtype
+        Output data type; If set to None, float64 is used. For
+        uint8, the values are clipped to the interval [0, 1] and
+        scaled to [0, 255]; NaN values are set to zero.
+    """
+    dtype = np.dtype(dtype)  # None yields float64
+    if dtype == np.uint8:
+        image = np.clip(image, 0, 1)
+        image *= 255
+        image[np.isnan(image)] = 0
+        image = np.rint(image, out=image).astype(np.uint8)
+    else:
+        image = image.astype(dtype, copy=False)
+    return image
+
+
+def get_contrast_range(data):
+    """Return the intensity range for autocontrast
+
+    The range is histogram based between 1% and 99% of the data.
+
+    Parameters
+    ----------
+    data: ndarray
+        Image data (2D image or 3D stack)
+
+    Returns
+    -------
+    contrast_range: tuple of float or None
+        Intensity range (vmin, vmax); None if `data` contains
+        only NaN values
+    """
+    values_to_bin = data[~np.isnan(data)]
+    # only perform histogram analysis if whe have data
+    if values_to_bin.size:
+        hist, edges = np.histogram(values_to_bin,
+                                   bins=int(np.sqrt(data.size)),
+                                   density=True)
+        return _get_histogram_range(hist, edges)
+    else:
+        return None
+
+
+def get_contrast_range_stack(get_slices):
+    """Return the intensity range for autocontrast of an image stack
+
+    This is equivalent to :func:`get_contrast_range` for the stack
+    of all slices, but the histogram is accumulated one slice at a
+    time, so that the stack is never loaded into memory.
+
+    Parameters
+    ----------
+    get_slices: callable
+        Function that returns an iterator over the 2D slices of
+        the stack; It is called twice (for the histogram range and
+        for the histogram).
+
+    Returns
+    -------
+    contrast_range: tuple of float or None
+        Intensity range (vmin, vmax); None if the stack contains
+        only NaN values
+    """
+    vmin = np.inf
+    vmax = -np.inf
+    size = 0
+    for image in get_slices():
+        size += image.size
+        if not np.all(np.isnan(image)):
+            vmin = min(vmin, np.nanmin(image))
+            vmax = max(vmax, np.nanmax(image))
+    if vmin > vmax:
+        return None
+    bins = int(np.sqrt(size))
+    hist = np.zeros(bins)
+    for image in get_slices():
+        hist += np.histogram(image[~np.isnan(image)],
+                             bins=bins,
+                             range=(vmin, vmax))[0]
+    edges = np.histogram_bin_edges([], bins=bins, range=(vmin, vmax))
+    return _get_histogram_range(hist, edges)
+
+
+def _get_histogram_range(hist, edges):
+    """Return the edges at 1% and 99% of a histogram"""
+    shist = np.cumsum(hist) / np.nansum(hist)
+    amin = np.argmin(np.abs(shist - .01))
+    amax = np.argmin(np.abs(shist - .99))
+    return edges[amin], edges[amax]
+
+
+def get_work_dtype(dtype=None):
+    """Return the floating point data type for blending computations"""
+    dtype = np.dtype(dtype)  # None yields float64
+    if np.issubdtype(dtype, np.floating):
+        return dtype
+    else:
+        # lower precision is sufficient for integer display data
+        return np.dtype(np.float32)
 
 
 class FlImage:
-    def __init__(self, image, hue, contrast=127.0, brightness=127.0):
+    #: Integer data types for which lookup tables are used
+    lut_dtypes = [np.dtype(np.uint8), np.dtype(np.uint16)]
+
+    def __init__(self, image, hue, contrast=127.0, brightness=127.0,
+                 in_range=None):
         """Image instance used for blending
 
+        For uint8 and uint16 images, the image values are not
+        converted. Instead, brightness, contrast, and hue are
+        applied to a lookup table with one entry per integer level
+        and rendering is a single lookup operation.
+
         Parameters
         ----------
         image: 2d ndarray
@@ -184,10 +318,27 @@ class FlImage:
             Brightness; value between 0 and 255
         contrast: float
             Contrast; value between 0 and 255
+        in_range: tuple of float
+            Intensity range of `image` that is scaled to the
+            interval [0, 1] (see :func:`get_contrast_range`)
         """
-        if image.dtype == np.dtype(np.uint8):
-            # convert image to float in range [0, 1]
-            image = image / 255
+        #: Whether a lookup table is used for rendering
+        self.use_lut = image.dtype in self.lut_dtypes
+        if self.use_lut:
+            levels = np.arange(np.iinfo(image.dtype).max + 1,
+                               dtype=image.dtype)
+            if in_range is not None:
+                levels = rescale_intensity(levels, in_range=in_range,
+                                           out_range=(0, 1))
+            elif image.dtype == np.dtype(np.uint8):
+                # convert to float in range [0, 1]
+                levels = levels / 255
+            #: Scaled image value for every integer level
+            self.lut_levels = levels
+        elif in_range is not None:
+            # scale to interval [0, 1]
+            image = rescale_intensity(image, in_range=in_range,
+                                      out_range=(0, 1))
         self.image = image
         #: Hue (RGB triple with values from 0 to 255)
         self.hue_rgb = self.colorhue2rgb(hue)
@@ -224,28 +375,85 @@ class FlImage:
     def shape(self):
         return self.image.shape[0], self.image.shape[1]
 
-    def get_rgb(self):
-        """Return RGB image as a 3d ndarray
+    def get_hue(self):
+        """Return the color hue as an HSV hue value (0 to 1)"""
+        return rgb2hsv(np.array(self.hue_rgb))[0]
+
+    def get_intensity(self, dtype=None):
+        """Return the image with contrast and brightness applied
+
+        Parameters
+        ----------
+        dtype: np.dtype
+            Floating point data type of the computation; If set to
+            None, the data type of the image is used.
 
         Returns
         -------
-        image_rgb: 3d ndarray
-            Unnormalized RGB image (if contrast and brightness were
-            not modified, then the image values are always between
-            0 and 1); Last axis iterates over RGB
+        image: 2d ndarray
+            Intensity image (if contrast and brightness were not
+            modified, then the values are between 0 and 1)
         """
+        if self.use_lut:
+            return np.take(self.get_intensity_lut(dtype=dtype), self.image)
+        else:
+            return self._apply_contrast_brightness(self.image, dtype)
+
+    def get_intensity_lut(self, dtype=None):
+        """Return the intensity lookup table (one entry per level)
+
+        Only available for integer images (see `FlImage.use_lut`).
+        """
+        if not self.use_lut:
+            raise ValueError(
+                f"No lookup table for images of type {self.image.dtype}!")
+        return self._apply_contrast_brightness(self.lut_levels, dtype)
+
+    def _apply_contrast_brightness(self, image, dtype=None):
         # contrast: do not allow zero brightness (offset 1 from zero)
         # runs from 2/256 to 2
         con = 2 * (self.contrast + 1) / 256
         # brightness
         # runs from -127/256 to 1/2
         bri = (self.brightness - 127) / 256
-        bim = con * self.image + bri
+        if dtype is not None:
+            image = image.astype(dtype, copy=False)
+        return con * image + bri
+
+    def get_rgb(self, dtype=None):
+        """Return RGB image as a 3d ndarray
+
+        Parameters
+        ----------
+        dtype: np.dtype
+            Output data type (see :func:`FlBlend.blend`); If set
+            to None, the data type of the image is used.
+
+        Returns
+        -------
+        image_rgb: 3d ndarray
+            Unnormalized RGB image (if contrast and brightness were
+            not modified, then the image values are always between
+            0 and 1); Last axis iterates over RGB
+        """
+        work_dtype = None if dtype is None else get_work_dtype(dtype)
+        if self.use_lut:
+            # compute the RGB lookup table and apply it
+            bri_lut = self.get_intensity_lut(dtype=work_dtype)
+            lut_rgb = bri_lut[:, np.newaxis] \
+                * np.array(self.hue_rgb, dtype=bri_lut.dtype)
+            if dtype is not None:
+                lut_rgb = convert_rgb(lut_rgb, dtype)
+            # (`np.take` is faster than fancy indexing)
+            return np.take(lut_rgb, self.image, axis=0)
+        bim = self.get_intensity(dtype=work_dtype)
         image_rgb = gray2rgb(bim)
         # apply hue
         image_rgb[:, :, 0] *= self.hue_rgb[0]
         image_rgb[:, :, 1] *= self.hue_rgb[1]
         image_rgb[:, :, 2] *= self.hue_rgb[2]
+        if dtype is not None:
+            image_rgb = convert_rgb(image_rgb, dtype)
         return image_rgb
 
     def get_hsv(self):
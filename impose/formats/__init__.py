@@ -12,10 +12,10 @@ from ..util import hashfile
 # - bm: Brillouin Microscopy
 # - fl: Fluorescence Microscopy
 
-from .fmt_fl_zeiss import load_czi
-from .fmt_bm_bmlab import load_h5
+from .fmt_fl_zeiss import load_czi, signature_czi
+from .fmt_bm_bmlab import load_h5, signature_h5
 from .fmt_bf_generic import load_img
-from .fmt_fl_ometif import load_ometif
+from .fmt_fl_ometif import load_ometif, signature_ometif
 
 
 def load(path):
@@ -30,7 +30,10 @@ def load(path):
     -------
     channels: collections.OrderedDict
         The keys are the names of the channels (`str`) and the values
-        are numpy arrays (3d for volume data).
+        are numpy arrays or array-like objects (3d for volume data).
+        For large files, the array-like objects are lazy proxies
+        (see :class:`impose.formats.lazy.LazyChannel`) or memory maps
+        which only read the data from disk when they are sliced.
     meta: dict
         The corresponding metadata with the following keys:
 
@@ -56,8 +59,7 @@ def load(path):
             for name, hue in zip(channels.keys(), hues):
                 meta["channel hues"][name] = hue
     if "signature" not in meta:
-        # Use the first 2^16 bytes as a file signature
-        meta["signature"] = hashfile(path, blocksize=65536, count=1)
+        meta["signature"] = get_default_signature(path)
     for key in ["pixel size x", "pixel size y", "pixel size z"]:
         if key in meta:
             assert isinstance(meta[key], numbers.Number)
@@ -65,10 +67,25 @@ def load(path):
     return channels, meta
 
 
+def get_default_signature(path):
+    """Signature for formats that do not define their own signature
+
+    The first 2^16 bytes of the file are used as a file signature.
+    """
+    return hashfile(path, blocksize=65536, count=1)
+
+
 def get_signature(path):
-    """Convenience function for getting the signature of a data file"""
-    _, meta = load(path)
-    return meta["signature"]
+    """Return the signature of a data file
+
+    This is identical to `load(path)[1]["signature"]`, but only the
+    file headers (or the first block of the file) are read. Use this
+    function for identifying data files (e.g. when searching for
+    the data files of a session).
+    """
+    path = pathlib.Path(path)
+    sig_func = signature_dict.get(path.suffix, get_default_signature)
+    return sig_func(path)
 
 
 suffix_dict = {
@@ -78,3 +95,11 @@ suffix_dict = {
     ".png": load_img,
     ".tif": load_ometif,
 }
+
+#: Functions that return the signature of a file without loading its
+#: data; formats not listed here use :func:`get_default_signature`.
+signature_dict = {
+    ".czi": signature_czi,
+    ".h5": signature_h5,
+    ".tif": signature_ometif,
+}
@@ -1,4 +1,5 @@
 from collections import OrderedDict
+import threading
 
 from bmlab.session import Session, get_valid_source, get_session_file_path, \
     BmlabInvalidFileError, is_session_file
@@ -9,6 +10,51 @@ import errno
 
 from ..util import hashfile, hashobj
 
+from .lazy import LazyChannel
+
+
+#: The bmlab session is a singleton, so only one file can be loaded
+#: at a time (e.g. when loading data sources in multiple threads).
+BMLAB_LOCK = threading.Lock()
+
+
+class LazyChannelH5(LazyChannel):
+    def __init__(self, path, name, axes):
+        """Channel of a BrillouinEvaluation .h5 file, read on demand
+
+        Parameters
+        ----------
+        path: str or pathlib.Path
+            Path to the .h5 file
+        name: str
+            Name of the dataset in the root of the .h5 file
+        axes: tuple of int
+            Axes in the .h5 dataset corresponding to (x, y, z)
+        """
+        self.path = path
+        self.name = name
+        self.axes = tuple(axes)
+        # The file is opened for every read so that no file handles
+        # are left open (and the proxy can be pickled).
+        with h5py.File(path, "r") as h5:
+            ds = h5[name]
+            if len(ds.shape) != 3:
+                raise ValueError(
+                    "Invalid number of dimensions in "
+                    "'{}'. ".format(path)
+                    + "Please verify the original Brillouin dataset.")
+            shape = [ds.shape[ax] for ax in self.axes]
+            dtype = ds.dtype
+        super(LazyChannelH5, self).__init__(shape=shape, dtype=dtype)
+
+    def read(self, key):
+        h5key = [None] * 3
+        for kk, ax in zip(key, self.axes):
+            h5key[ax] = kk
+        with h5py.File(self.path, "r") as h5:
+            data = h5[self.name][tuple(h5key)]
+        return data.transpose(self.axes)
+
 
 def load_h5(path):
     """Load .h5 files exported from BrillouinEvaluation (legacy Matlab)
@@ -18,50 +64,32 @@ def load_h5(path):
     """
     try:
         # Load data with bmlab
-        session = Session.get_instance()
-        session.set_file(path)
-        evc = EvaluationController()
-
-        rep_keys = session.file.repetition_keys()
-
-        channels = OrderedDict()
-        for rep_key in rep_keys:
-            session.set_current_repetition(rep_key)
-            keys = session.evaluation_model().get_parameter_keys()
-
-            # If the file contains multiple repetitions, we
-            # prepend the repetition key
-            key_prefix = ''
-            if len(rep_keys) > 1:
-                key_prefix = 'rep-' + rep_key + '_'
-            for key in keys:
-                data, positions, dimensionality, labels =\
-                    evc.get_data(key)
-                channels[key_prefix + key] = data
-
-        session.clear()
+        with BMLAB_LOCK:
+            session = Session.get_instance()
+            session.set_file(path)
+            evc = EvaluationController()
+
+            rep_keys = session.file.repetition_keys()
+
+            channels = OrderedDict()
+            for rep_key in rep_keys:
+                session.set_current_repetition(rep_key)
+                keys = session.evaluation_model().get_parameter_keys()
+
+                # If the file contains multiple repetitions, we
+                # prepend the repetition key
+                key_prefix = ''
+                if len(rep_keys) > 1:
+                    key_prefix = 'rep-' + rep_key + '_'
+                for key in keys:
+                    data, positions, dimensionality, labels =\
+                        evc.get_data(key)
+                    channels[key_prefix + key] = data
+
+            session.clear()
 
         # create a unique signature for this dataset
-        p1 = get_valid_source(path)
-        p2 = get_session_file_path(p1)
-        h1 = hashfile(p1, blocksize=65536, count=1)
-        # bmlab can open source data files without
-        # associated session files, so we need to check
-        # for this case explicitly.
-        if is_session_file(p2):
-            h2 = hashfile(p2, blocksize=65536, count=1)
-        else:
-            # The provided data is all-NaN in this case,
-            # which does not help much for Impose.
-            # So we raise an error for now. This might change,
-            # once bmlab can also provide
-            # brightfield or fluorescence images.
-            raise FileNotFoundError(
-                errno.ENOENT,
-                f"The bmlab session file {p2} is missing.",
-                p2
-            )
-        signature = hashobj((h1, h2))
+        signature = signature_h5_bmlab(path)
 
         chan = sorted(channels)
         if len(chan) > 0:
@@ -86,16 +114,13 @@ def load_h5(path):
                 yid = axes.index("Y")
                 zid = axes.index("Z")
 
-                channels = OrderedDict()
-                for chan in chkeys:
-                    dslice = h5[chan][:]
-                    if len(dslice.shape) != 3:
-                        raise ValueError(
-                            "Invalid number of dimensions in "
-                            "'{}'. ".format(path)
-                            + "Please verify the original Brillouin dataset.")
-                    channels[chan] = dslice.transpose(xid, yid, zid)
+            channels = OrderedDict()
+            for chan in chkeys:
+                channels[chan] = LazyChannelH5(path=path,
+                                               name=chan,
+                                               axes=(xid, yid, zid))
 
+            with h5py.File(path, "r") as h5:
                 # Metadata
                 meta = {
                     "pixel size x": np.array(h5.attrs["scaleX"]).item(),
@@ -118,6 +143,46 @@ def load_h5(path):
     return channels, meta
 
 
+def signature_h5(path):
+    """Return the signature of an .h5 file without loading any data
+
+    Please see :func:`impose.formats.get_signature` for more information.
+    """
+    try:
+        return signature_h5_bmlab(path)
+    except BmlabInvalidFileError:
+        # BrillouinEvaluation exported h5 file (default signature)
+        return hashfile(path, blocksize=65536, count=1)
+
+
+def signature_h5_bmlab(path):
+    """Return the signature of a BrillouinAcquisition/bmlab dataset
+
+    The signature is computed from the first 2^16 bytes of the
+    source data file and of the bmlab session file.
+    """
+    p1 = get_valid_source(path)
+    p2 = get_session_file_path(p1)
+    h1 = hashfile(p1, blocksize=65536, count=1)
+    # bmlab can open source data files without
+    # associated session files, so we need to check
+    # for this case explicitly.
+    if is_session_file(p2):
+        h2 = hashfile(p2, blocksize=65536, count=1)
+    else:
+        # The provided data is all-NaN in this case,
+        # which does not help much for Impose.
+        # So we raise an error for now. This might change,
+        # once bmlab can also provide
+        # brightfield or fluorescence images.
+        raise FileNotFoundError(
+            errno.ENOENT,
+            f"The bmlab session file {p2} is missing.",
+            p2
+        )
+    return hashobj((h1, h2))
+
+
 def calc_pixel_size(positions, axis):
     s = [0, 0, 0]
     s[axis] = slice(0, 2, 1)
@@ -16,7 +16,13 @@ def load_ometif(path):
                 f"Could not load ome_metadata from file {path}. Please ask "
                 f"for implementing support for your file format.")
         ome_meta = parseString(tif.ome_metadata)
-        data = tif.asarray()
+        try:
+            # Memory-map the image data so that only the slices that are
+            # actually displayed are read from disk.
+            data = tifffile.memmap(path, mode="r")
+        except ValueError:
+            # data are compressed or not contiguous
+            data = tif.asarray()
 
     channels = OrderedDict()
     name = ome_meta.getElementsByTagName("Image")[0].attributes["Name"].value
@@ -31,16 +37,32 @@ def load_ometif(path):
     assert px.attributes["PhysicalSizeXUnit"].value == "µm"
     assert px.attributes["PhysicalSizeYUnit"].value == "µm"
 
-    # Channel names
-    data_uuid = ome_meta.getElementsByTagName(
-        "UUID")[0].childNodes[0].data.split(":")[-1]
-
     meta = {
         "pixel size x": xs,
         "pixel size y": ys,
         "pixel size z": np.nan,
         "shape": data.shape,
-        "signature": data_uuid,
+        "signature": get_ome_uuid(ome_meta),
     }
 
     return channels, meta
+
+
+def get_ome_uuid(ome_meta):
+    """Return the UUID of the image data from parsed OME-XML metadata"""
+    return ome_meta.getElementsByTagName(
+        "UUID")[0].childNodes[0].data.split(":")[-1]
+
+
+def signature_ometif(path):
+    """Return the signature of an .ome.tif file without reading any data
+
+    Please see :func:`impose.formats.get_signature` for more information.
+    """
+    with tifffile.TiffFile(path) as tif:
+        if not tif.is_ome:
+            raise NotImplementedError(
+                f"Could not load ome_metadata from file {path}. Please ask "
+                f"for implementing support for your file format.")
+        ome_meta = parseString(tif.ome_metadata)
+    return get_ome_uuid(ome_meta)
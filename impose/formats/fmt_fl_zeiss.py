@@ -1,4 +1,5 @@
 from collections import OrderedDict
+import warnings
 from xml.etree import ElementTree
 
 import numpy as np
@@ -7,6 +8,82 @@ from skimage.color import rgb2hsv
 
 from ..util import hashobj
 
+from .lazy import LazyChannel
+
+
+class LazyChannelCZI(LazyChannel):
+    def __init__(self, path, channel_index):
+        """Channel of a .czi file, decoded on demand
+
+        Only the subblocks that intersect with the requested region
+        are read and decoded.
+
+        Parameters
+        ----------
+        path: str or pathlib.Path
+            Path to the .czi file
+        channel_index: int
+            Index of the channel along the "C" axis
+        """
+        self.path = path
+        self.channel_index = channel_index
+        with czifile.CziFile(path) as czi:
+            axes = czi.axes
+            czi_shape = czi.shape
+            dtype = czi.dtype
+        self.xid = axes.index("X")
+        self.yid = axes.index("Y")
+        self.zid = axes.index("Z")
+        self.cid = axes.index("C")
+        shape = (czi_shape[self.xid],
+                 czi_shape[self.yid],
+                 czi_shape[self.zid])
+        super(LazyChannelCZI, self).__init__(shape=shape, dtype=dtype)
+
+    def read(self, key):
+        # Window (start, stop) in the czi array for every axis. Like
+        # `load_czi` used to do, we take the first index for all
+        # axes that are not X, Y, Z, or C.
+        with czifile.CziFile(self.path) as czi:
+            window = [(0, 1)] * len(czi.shape)
+            window[self.cid] = (self.channel_index, self.channel_index + 1)
+            sub_key = [slice(None)] * 3
+            for ii, ax in enumerate([self.xid, self.yid, self.zid]):
+                kk = key[ii]
+                if kk.step == 1:
+                    window[ax] = (kk.start, max(kk.start, kk.stop))
+                else:
+                    window[ax] = (0, czi.shape[ax])
+                    sub_key[ii] = kk
+            out = np.zeros([b - a for (a, b) in window], dtype=czi.dtype)
+            for entry in czi.filtered_subblock_directory:
+                # position of this subblock in the output array
+                begin = [st - cst - a for st, cst, (a, _)
+                         in zip(entry.start, czi.start, window)]
+                end = [bg + sz for bg, sz in zip(begin, entry.shape)]
+                if any(bg >= ot or en <= 0 for bg, en, ot
+                       in zip(begin, end, out.shape)):
+                    # subblock does not intersect with the window
+                    continue
+                tile = entry.data_segment().data(resize=True, order=0)
+                dst = []
+                src = []
+                for bg, ot, tsz in zip(begin, out.shape, tile.shape):
+                    dst.append(slice(max(bg, 0), min(bg + tsz, ot)))
+                    src.append(slice(max(-bg, 0), min(ot - bg, tsz)))
+                try:
+                    out[tuple(dst)] = tile[tuple(src)]
+                except ValueError as e:
+                    warnings.warn(str(e))
+        myslice = [0] * len(out.shape)
+        myslice[self.xid] = slice(None, None)
+        myslice[self.yid] = slice(None, None)
+        myslice[self.zid] = slice(None, None)
+        dslice = out[tuple(myslice)]
+        # bring in x, y, z order
+        a0, a1, a2 = np.argsort([self.xid, self.yid, self.zid])
+        return dslice.transpose(a0, a1, a2)[tuple(sub_key)]
+
 
 def load_czi(path):
     """Load .czi files
@@ -22,17 +99,13 @@ def load_czi(path):
     for item in root.findall(".//DefaultScalingUnit"):
         assert item.text == "µm"
 
-    # Data
-    data = czi.asarray()
+    # Data (only the shape is read here, see `LazyChannelCZI`)
+    data_shape = czi.shape
     xid = czi.axes.index("X")
     yid = czi.axes.index("Y")
     zid = czi.axes.index("Z")
     cid = czi.axes.index("C")
-
-    myslice = [0] * len(czi.shape)
-    myslice[xid] = slice(None, None)
-    myslice[yid] = slice(None, None)
-    myslice[zid] = slice(None, None)
+    czi.close()
 
     # Channel names
     image = root.findall(".//Image")
@@ -50,15 +123,11 @@ def load_czi(path):
             break
     else:
         # fallback
-        channel_names = [str(ii) for ii in range(data.shape[cid])]
+        channel_names = [str(ii) for ii in range(data_shape[cid])]
 
     channels = OrderedDict()
     for chid, chan in enumerate(channel_names):
-        myslice[cid] = chid
-        dslice = data[tuple(myslice)]
-        # bring in x, y, z order
-        a0, a1, a2 = np.argsort([xid, yid, zid])
-        channels[str(chan)] = dslice.transpose(a0, a1, a2)
+        channels[str(chan)] = LazyChannelCZI(path=path, channel_index=chid)
 
     # Other Metadata
     # lateral pixel size
@@ -77,7 +146,7 @@ def load_czi(path):
     ys /= mag
 
     # voxel depth
-    if data.shape[zid] > 1:
+    if data_shape[zid] > 1:
         for item in root.findall(".//AcquisitionBlock/SubDimensionSetups/"
                                  + "ZStackSetup/Interval/Distance/Value"):
             zs = float(item.text)
@@ -94,7 +163,7 @@ def load_czi(path):
         "pixel size x": xs,
         "pixel size y": ys,
         "pixel size z": zs,
-        "shape": (data.shape[xid], data.shape[yid], data.shape[zid]),
+        "shape": (data_shape[xid], data_shape[yid], data_shape[zid]),
         "signature": hashobj(czi_meta),
     }
     if channel_hues:
@@ -103,6 +172,16 @@ def load_czi(path):
     return channels, meta
 
 
+def signature_czi(path):
+    """Return the signature of a .czi file without decoding any data
+
+    Please see :func:`impose.formats.get_signature` for more information.
+    """
+    with czifile.CziFile(path) as czi:
+        czi_meta = czi.metadata()
+    return hashobj(czi_meta)
+
+
 def color_hex2hue(hex_string):
     """Convert a czi hex color string to hue
 
@@ -0,0 +1,93 @@
+"""Array-like proxies for reading channel data on demand"""
+import abc
+import numbers
+
+import numpy as np
+
+
+class LazyChannel(abc.ABC):
+    def __init__(self, shape, dtype):
+        """Array-like channel data that is only read when sliced
+
+        Subclasses implement :func:`LazyChannel.read` which receives
+        a normalized index (a tuple of `slice` objects with one entry
+        per dimension). Integer indices are converted to slices of
+        length one and the corresponding axes are squeezed
+        afterwards, so only the requested region has to be read from
+        disk.
+
+        Parameters
+        ----------
+        shape: tuple of int
+            Shape of the channel data (x, y[, z])
+        dtype: np.dtype
+            Data type of the channel data
+        """
+        self.shape = tuple(int(s) for s in shape)
+        self.dtype = np.dtype(dtype)
+
+    def __array__(self, dtype=None, copy=None):
+        data = self[...]
+        if dtype is not None:
+            data = data.astype(dtype, copy=False)
+        return data
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        try:
+            norm_key, squeeze = self._normalize_key(key)
+        except TypeError:
+            # fancy indexing (e.g. boolean masks) is done in memory
+            return np.asarray(self)[key]
+        data = self.read(norm_key)
+        if squeeze:
+            data = data[tuple(0 if sq else slice(None) for sq in squeeze)]
+        return data
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.shape} {self.dtype} " \
+               + f"at {hex(id(self))}>"
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    def _normalize_key(self, key):
+        """Convert `key` to a tuple of slices and a list of squeezed axes"""
+        if Ellipsis in key:
+            idx = key.index(Ellipsis)
+            fill = (slice(None),) * (self.ndim - len(key) + 1)
+            key = key[:idx] + fill + key[idx+1:]
+        if len(key) > self.ndim:
+            raise IndexError(f"Too many indices for {self.ndim}D channel!")
+        key = key + (slice(None),) * (self.ndim - len(key))
+        norm_key = []
+        squeeze = []
+        for kk, size in zip(key, self.shape):
+            if isinstance(kk, numbers.Integral) \
+                    and not isinstance(kk, (bool, np.bool_)):
+                kk = int(kk)
+                if kk < -size or kk >= size:
+                    raise IndexError(f"Index {kk} out of bounds for axis "
+                                     + f"with size {size}!")
+                kk %= size
+                norm_key.append(slice(kk, kk + 1))
+                squeeze.append(True)
+            elif isinstance(kk, slice) and (kk.step is None or kk.step > 0):
+                norm_key.append(slice(*kk.indices(size)))
+                squeeze.append(False)
+            else:
+                raise TypeError(f"Unsupported index type '{type(kk)}'!")
+        return tuple(norm_key), squeeze if any(squeeze) else []
+
+    @abc.abstractmethod
+    def read(self, key):
+        """Read the data for a tuple of slices (one for each axis)"""
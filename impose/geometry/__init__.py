@@ -3,6 +3,22 @@ import pyqtgraph as pg
 
 from . import mask
 from . import shapes
+from .store import ShapeArrayStore
+
+
+def get_pg_roi_transform(roi, image_item):
+    """Return the transform from ROI to image data coordinates
+
+    The data coordinates are pixel indices of the full-resolution
+    image. Downsampled previews are displayed with a scale of
+    the preview level along x (see
+    :func:`impose.gui.visualize.Visualize.show_image`), which is
+    undone here.
+    """
+    tr = roi.sceneTransform() * pg.functions.invertQTransform(
+        image_item.sceneTransform())
+    preview = image_item.transform().m11()
+    return tr * pg.QtGui.QTransform.fromScale(preview, preview)
 
 
 def pg_roi_to_impose_shape(roi, tr, point_um):
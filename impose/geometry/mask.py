@@ -1,31 +1,516 @@
 import numpy as np
-from skimage.draw import polygon2mask
 
 
-def ellipse(x, y, a, b, phi, shape, scale_x=1, scale_y=1):
-    xv = np.arange(shape[1]).reshape(1, -1) * scale_x
-    yv = np.arange(shape[0]).reshape(-1, 1) * scale_y
+class SparseMask:
+    def __init__(self, shape, offset=(0, 0), mask=None):
+        """Boolean mask stored as a bounding box
 
-    cos_angle = np.cos(np.pi - phi)
-    sin_angle = np.sin(np.pi - phi)
-    xc = (xv - x + .5)
-    yc = (yv - y + .5)
+        All pixels outside of the bounding box are False. This
+        representation allows to extract data points from small
+        structures in large images without creating full-frame
+        arrays.
 
-    xct = xc * cos_angle - yc * sin_angle
-    yct = xc * sin_angle + yc * cos_angle
-    rad_cc = (xct ** 2 / a ** 2) + (yct ** 2 / b ** 2)
+        Parameters
+        ----------
+        shape: tuple of int
+            Shape of the full mask
+        offset: tuple of int
+            Position (row, column) of the bounding box in the full mask
+        mask: 2d boolean ndarray
+            Mask within the bounding box; If set to None, the mask
+            is empty.
+        """
+        #: Shape of the full mask
+        self.shape = tuple(shape)
+        #: Position (row, column) of the bounding box
+        self.offset = tuple(offset)
+        if mask is None:
+            mask = np.zeros((0, 0), dtype=bool)
+        #: Boolean mask within the bounding box
+        self.mask = mask
+
+    def __repr__(self):
+        return f"<SparseMask {self.shape} with bbox {self.bbox} " \
+               + f"at {hex(id(self))}>"
+
+    @property
+    def bbox(self):
+        """Bounding box (slices for rows and columns) in the full mask"""
+        return (slice(self.offset[0], self.offset[0] + self.mask.shape[0]),
+                slice(self.offset[1], self.offset[1] + self.mask.shape[1]))
+
+    def cropped(self):
+        """Return a SparseMask with the smallest possible bounding box"""
+        rows = np.flatnonzero(np.any(self.mask, axis=1))
+        cols = np.flatnonzero(np.any(self.mask, axis=0))
+        if rows.size == 0:
+            return SparseMask(self.shape)
+        return SparseMask(
+            self.shape,
+            offset=(self.offset[0] + rows[0], self.offset[1] + cols[0]),
+            mask=self.mask[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1])
+
+    def flat_indices(self):
+        """Return the indices of the True pixels in the flattened mask
+
+        The indices are sorted (same order as in `full_mask.flatten()`).
+        """
+        ii, jj = np.nonzero(self.mask)
+        return (ii + self.offset[0]) * self.shape[1] + jj + self.offset[1]
+
+    def gather(self, data):
+        """Return the data points of a 2D image within the mask
+
+        This is equivalent to `data[self.to_dense()]`.
+        """
+        assert tuple(data.shape) == self.shape
+        return data[self.bbox][self.mask]
+
+    def gather_all(self, images):
+        """Return the data points of several 2D images within the mask
+
+        The indices of the mask pixels are computed once and the
+        data points of all images are gathered with `np.take`.
+        This is equivalent to `[self.gather(im) for im in images]`.
+
+        Parameters
+        ----------
+        images: iterable of 2d ndarrays
+            Images with the shape of the full mask; The images are
+            only accessed one at a time, so this may be a generator.
+
+        Returns
+        -------
+        data: list of 1d ndarrays
+            Data points of each image
+        """
+        indices = self.flat_indices()
+        rows, cols = np.nonzero(self.mask)
+        local = rows * self.mask.shape[1] + cols
+        data = []
+        for image in images:
+            image = np.asarray(image)
+            assert tuple(image.shape) == self.shape
+            if image.flags.c_contiguous:
+                # flat view of the full image
+                data.append(np.take(image.reshape(-1), indices))
+            else:
+                # strided views (e.g. memory-mapped stacks): only copy
+                # the bounding box
+                data.append(np.take(image[self.bbox], local))
+        return data
+
+    def shifted(self, drow, dcol):
+        """Return the mask shifted by an integer number of pixels
+
+        Pixels that are shifted out of the full mask are removed.
+        """
+        r0 = self.offset[0] + drow
+        c0 = self.offset[1] + dcol
+        r1 = r0 + self.mask.shape[0]
+        c1 = c0 + self.mask.shape[1]
+        # crop to the full mask
+        cr0 = min(max(r0, 0), self.shape[0])
+        cc0 = min(max(c0, 0), self.shape[1])
+        cr1 = max(min(r1, self.shape[0]), cr0)
+        cc1 = max(min(c1, self.shape[1]), cc0)
+        return SparseMask(self.shape,
+                          offset=(cr0, cc0),
+                          mask=self.mask[cr0 - r0:cr1 - r0, cc0 - c0:cc1 - c0])
+
+    def sum(self):
+        """Number of True pixels"""
+        return int(np.sum(self.mask))
+
+    def to_dense(self):
+        """Return the full boolean mask"""
+        full = np.zeros(self.shape, dtype=bool)
+        full[self.bbox] = self.mask
+        return full
+
+
+def accumulate(mask, shape, accumulator=None, factor=1, bbox=None,
+               region=None):
+    """Add a mask to an accumulator
+
+    Parameters
+    ----------
+    mask: 2d boolean ndarray
+        The mask (covering `bbox` or the entire image)
+    shape: tuple
+        shape of the full mask
+    accumulator: 2d ndarray
+        If given, `mask * factor` is added to this array in-place;
+        Otherwise a full boolean mask is returned.
+    factor: int
+        Factor with which `mask` is added to `accumulator`
+    bbox: tuple of slice
+        Bounding box (rows, columns) of `mask` in the full mask;
+        If set to None, `mask` covers the entire image.
+    region: tuple of slice
+        Region (rows, columns) of the full mask that `accumulator`
+        covers; If set to None, `accumulator` covers the entire
+        image.
+
+    Returns
+    -------
+    mask: 2d ndarray
+        The full boolean mask or `accumulator`
+    """
+    if bbox is None:
+        bbox = full_bounding_box(shape)
+    if accumulator is None:
+        full = np.zeros(shape, dtype=bool)
+        full[bbox] = mask
+        return full
+    else:
+        if region is None:
+            region = full_bounding_box(shape)
+        # intersection of `bbox` and `region`
+        r0 = max(bbox[0].start, region[0].start)
+        r1 = min(bbox[0].stop, region[0].stop)
+        c0 = max(bbox[1].start, region[1].start)
+        c1 = min(bbox[1].stop, region[1].stop)
+        if r1 > r0 and c1 > c0:
+            src = mask[r0 - bbox[0].start:r1 - bbox[0].start,
+                       c0 - bbox[1].start:c1 - bbox[1].start]
+            dst = (slice(r0 - region[0].start, r1 - region[0].start),
+                   slice(c0 - region[1].start, c1 - region[1].start))
+            if factor == 1:
+                accumulator[dst] += src
+            else:
+                accumulator[dst] += src * factor
+        return accumulator
+
+
+def ellipse(x, y, a, b, phi, shape, scale_x=1, scale_y=1,
+            accumulator=None, factor=1, region=None):
+    """Rasterize an ellipse
+
+    Only the bounding box of the ellipse is evaluated (see
+    :func:`ellipse_bounding_box`).
+
+    Parameters
+    ----------
+    x, y: float
+        center coordinates
+    a, b: float
+        major and minor radii
+    phi: float
+        rotation angle [rad]
+    shape: tuple
+        shape of the mask
+    scale_x, scale_y: float
+        scaling factors
+    accumulator: 2d ndarray
+        see :func:`accumulate`
+    factor: int
+        see :func:`accumulate`
+    region: tuple of slice
+        see :func:`accumulate`
+    """
+    bbox = ellipse_bounding_box(x, y, a, b, phi, shape,
+                                scale_x=scale_x, scale_y=scale_y)
+    rad_cc = _ellipse_radius(x, y, a, b, phi, bbox, scale_x, scale_y)
     mask = rad_cc <= 1
-    return mask
+    return accumulate(mask, shape, accumulator, factor, bbox, region)
+
+
+def ellipse_bounding_box(x, y, a, b, phi, shape, scale_x=1, scale_y=1):
+    """Return the pixel bounding box of an ellipse
+
+    The box contains all pixels for which :func:`ellipse` could
+    be True (including a margin of one pixel for rounding) and
+    is clipped to `shape`.
+
+    Returns
+    -------
+    bbox: tuple of slice
+        Slices for the rows and columns of a mask
+    """
+    angle = np.pi - phi
+    # half extent of the rotated ellipse
+    hx = np.sqrt((a * np.cos(angle))**2 + (b * np.sin(angle))**2)
+    hy = np.sqrt((a * np.sin(angle))**2 + (b * np.cos(angle))**2)
+    # bounds in pixel coordinates
+    with np.errstate(invalid="ignore", divide="ignore"):
+        bounds = np.array([(x - .5 - hx) / scale_x,
+                           (x - .5 + hx) / scale_x,
+                           (y - .5 - hy) / scale_y,
+                           (y - .5 + hy) / scale_y])
+    return pixel_bounding_box(bounds, shape)
+
+
+def ellipse_slack(x, y, a, b, phi, shape, scale_x=1, scale_y=1):
+    """Return the distance by which an ellipse can be moved freely
+
+    Translating the ellipse by (dx, dy) pixels with
+    `hypot(dx - round(dx), dy - round(dy))` smaller than the slack
+    shifts the mask of :func:`ellipse` within `shape` by
+    (round(dx), round(dy)) pixels without changing it otherwise.
+    The slack is a lower bound computed from the distance of the
+    pixel centers to the boundary of the ellipse; It is at most one
+    pixel (the margin of :func:`ellipse_bounding_box`).
+    """
+    bbox = ellipse_bounding_box(x, y, a, b, phi, shape,
+                                scale_x=scale_x, scale_y=scale_y)
+    rad_cc = _ellipse_radius(x, y, a, b, phi, bbox, scale_x, scale_y)
+    slack = 1.
+    if rad_cc.size:
+        # The distance to the ellipse in normalized coordinates
+        # multiplied by the minor radius is a lower bound for the
+        # distance in scaled coordinates.
+        dist = np.min(np.abs(np.sqrt(rad_cc) - 1)) * min(a, b)
+        slack = min(slack, dist / max(scale_x, scale_y))
+    return slack if np.isfinite(slack) else 0
+
+
+def full_bounding_box(shape):
+    """Return the bounding box covering the entire image"""
+    return slice(0, shape[0]), slice(0, shape[1])
+
+
+def pixel_bounding_box(bounds, shape):
+    """Convert bounds in pixel coordinates to a bounding box
 
+    Parameters
+    ----------
+    bounds: list of float
+        Bounds (xmin, xmax, ymin, ymax) in pixel coordinates
+    shape: tuple
+        shape of the mask
 
-def polygon(points, shape, scale_x=1, scale_y=1):
+    Returns
+    -------
+    bbox: tuple of slice
+        Slices for the rows and columns of a mask, including a
+        margin of one pixel and clipped to `shape`
+    """
+    if not np.all(np.isfinite(bounds)):
+        # nothing to rasterize (e.g. invalid pixel size)
+        return slice(0, 0), slice(0, 0)
+    x0 = min(max(int(np.floor(bounds[0])) - 1, 0), shape[1])
+    x1 = min(max(int(np.ceil(bounds[1])) + 2, x0), shape[1])
+    y0 = min(max(int(np.floor(bounds[2])) - 1, 0), shape[0])
+    y1 = min(max(int(np.ceil(bounds[3])) + 2, y0), shape[0])
+    return slice(y0, y1), slice(x0, x1)
+
+
+def polygon(points, shape, scale_x=1, scale_y=1, accumulator=None,
+            factor=1, region=None):
+    """Rasterize a polygon
+
+    The polygon is rasterized within its bounding box with
+    :func:`polygon_scanline`.
+
+    Parameters
+    ----------
+    points: 2d ndarray of shape (N, 2)
+        polygon points (x, y)
+    shape: tuple
+        shape of the mask
+    scale_x, scale_y: float
+        scaling factors
+    accumulator: 2d ndarray
+        see :func:`accumulate`
+    factor: int
+        see :func:`accumulate`
+    region: tuple of slice
+        see :func:`accumulate`
+    """
+    points = polygon_pixel_points(points, scale_x=scale_x, scale_y=scale_y)
+    mask, bbox = polygon_scanline(points, shape)
+    return accumulate(mask, shape, accumulator, factor, bbox, region)
+
+
+def polygon_bounding_box(points, shape, scale_x=1, scale_y=1):
+    """Return the pixel bounding box of a polygon
+
+    See :func:`ellipse_bounding_box` for more information.
+    """
+    points = polygon_pixel_points(points, scale_x=scale_x, scale_y=scale_y)
+    with np.errstate(invalid="ignore"):
+        bounds = [np.min(points[:, 0]), np.max(points[:, 0]),
+                  np.min(points[:, 1]), np.max(points[:, 1])]
+    return pixel_bounding_box(bounds, shape)
+
+
+def polygon_pixel_points(points, scale_x=1, scale_y=1):
+    """Convert polygon points (x, y) to pixel coordinates"""
     points = np.array(points, dtype=float, copy=True)
-    points[:, 0] = points[:, 0] / scale_x - .5
-    points[:, 1] = points[:, 1] / scale_y - .5
-    return polygon2mask(shape, points[:, ::-1])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        points[:, 0] = points[:, 0] / scale_x - .5
+        points[:, 1] = points[:, 1] / scale_y - .5
+    return points
+
+
+def polygon_scanline(points, shape):
+    """Rasterize a polygon in pixel coordinates with an edge table
+
+    The result is identical to :func:`skimage.draw.polygon2mask`
+    (the point-in-polygon test of scikit-image is reproduced,
+    including pixels on edges and vertices), but only the
+    bounding box of the polygon is rasterized. For each image row,
+    the crossings of the ray with the polygon edges are computed
+    once; the scikit-image test is only evaluated for the pixels
+    next to the crossings. The runtime thus scales with the number
+    of edges and the size of the bounding box instead of with their
+    product.
+
+    Parameters
+    ----------
+    points: 2d ndarray of shape (N, 2)
+        polygon points (x, y) in pixel coordinates
+    shape: tuple
+        shape of the full mask
+
+    Returns
+    -------
+    mask: 2d boolean ndarray
+        The mask within `bbox`
+    bbox: tuple of slice
+        Bounding box (rows, columns) of `mask` in the full mask
+    """
+    points = np.asarray(points, dtype=float)
+    if points.size == 0 or not np.all(np.isfinite(points)):
+        return np.zeros((0, 0), dtype=bool), (slice(0, 0), slice(0, 0))
+    xp = points[:, 0]
+    yp = points[:, 1]
+    # same pixel range as in scikit-image
+    r0 = min(int(max(0, yp.min())), shape[0])
+    r1 = max(min(shape[0] - 1, int(np.ceil(yp.max()))) + 1, r0)
+    c0 = min(int(max(0, xp.min())), shape[1])
+    c1 = max(min(shape[1] - 1, int(np.ceil(xp.max()))) + 1, c0)
+    nrows = r1 - r0
+    ncols = c1 - c0
+    # edges from the previous vertex (x1, y1) to the vertex (x0, y0)
+    x1 = np.roll(xp, 1)
+    y1 = np.roll(yp, 1)
+    ylo = np.minimum(yp, y1)
+    yhi = np.maximum(yp, y1)
+    # difference arrays for the number of right and left crossings
+    cross_r = np.zeros((nrows, ncols + 1), dtype=np.int64)
+    cross_l = np.zeros((nrows, ncols + 1), dtype=np.int64)
+    # The ray from a pixel crosses an edge to the right if the
+    # edge straddles the row, i.e. y in [ylo, yhi), and to the
+    # left if y in (ylo, yhi].
+    for cross, start, stop in [
+            (cross_r, np.ceil(ylo), np.ceil(yhi)),
+            (cross_l, np.floor(ylo) + 1, np.floor(yhi) + 1)]:
+        start = np.clip(start, r0, r1).astype(np.int64)
+        stop = np.clip(stop, r0, r1).astype(np.int64)
+        edge, row = _edge_table(start, stop)
+        if edge.size == 0:
+            continue
+        rr = row - r0
+        y = row.astype(float)
+        dy0 = yp[edge] - y
+        dy1 = y1[edge] - y
+        # approximate crossing position of the edge with the row
+        with np.errstate(invalid="ignore", divide="ignore"):
+            xc = (xp[edge] * dy1 - x1[edge] * dy0) / (dy1 - dy0)
+        # evaluate the exact crossing test around the crossing
+        wstart = np.floor(xc).astype(np.int64) - 1
+        xw = wstart.reshape(-1, 1) + np.arange(4).reshape(1, -1)
+        dx0 = xp[edge].reshape(-1, 1) - xw
+        dx1 = x1[edge].reshape(-1, 1) - xw
+        dy0 = dy0.reshape(-1, 1)
+        dy1 = dy1.reshape(-1, 1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            pos = (dx0 * dy1 - dx1 * dy0) / (dy1 - dy0)
+        if cross is cross_r:
+            # all pixels left of the window cross the edge
+            np.add.at(cross, (rr, 0), 1)
+            np.add.at(cross, (rr, np.clip(wstart - c0, 0, ncols)), -1)
+            inwin = pos > 0
+        else:
+            # all pixels right of the window cross the edge
+            np.add.at(cross, (rr, np.clip(wstart + 4 - c0, 0, ncols)), 1)
+            np.add.at(cross, (rr, ncols), -1)
+            inwin = pos < 0
+        ii, jj = np.nonzero(inwin)
+        cols = xw[ii, jj] - c0
+        valid = (cols >= 0) & (cols < ncols)
+        np.add.at(cross, (rr[ii][valid], cols[valid]), 1)
+        np.add.at(cross, (rr[ii][valid], cols[valid] + 1), -1)
+    odd_r = np.cumsum(cross_r, axis=1)[:, :ncols] & 1
+    odd_l = np.cumsum(cross_l, axis=1)[:, :ncols] & 1
+    # pixels on edges have an odd number of right or left crossings
+    mask = (odd_r | odd_l).astype(bool)
+    # pixels on vertices
+    eps = 1e-12
+    xv = np.rint(xp)
+    yv = np.rint(yp)
+    vert = ((np.abs(xp - xv) < eps) & (np.abs(yp - yv) < eps)
+            & (xv >= c0) & (xv < c1) & (yv >= r0) & (yv < r1))
+    mask[yv[vert].astype(int) - r0, xv[vert].astype(int) - c0] = True
+    return mask, (slice(r0, r1), slice(c0, c1))
+
+
+def polygon_slack(points, shape, scale_x=1, scale_y=1):
+    """Return the distance by which a polygon can be moved freely
+
+    See :func:`ellipse_slack` for more information. The slack is a
+    lower bound computed from the distance of the pixel centers in
+    the rows spanned by each edge to the line through that edge and
+    from the distance of the vertices to the closest rows.
+    """
+    points = polygon_pixel_points(points, scale_x=scale_x, scale_y=scale_y)
+    if points.size == 0 or not np.all(np.isfinite(points)):
+        return 0
+    xp = points[:, 0]
+    yp = points[:, 1]
+    # vertical distance of the vertices to the closest rows
+    slack = min(1., np.min(np.abs(yp - np.rint(yp))))
+    x1 = np.roll(xp, 1)
+    y1 = np.roll(yp, 1)
+    start = np.clip(np.ceil(np.minimum(yp, y1)), 0, shape[0])
+    stop = np.clip(np.floor(np.maximum(yp, y1)) + 1, 0, shape[0])
+    edge, row = _edge_table(start.astype(np.int64), stop.astype(np.int64))
+    dx = x1[edge] - xp[edge]
+    dy = y1[edge] - yp[edge]
+    valid = dy != 0
+    if not np.all(valid):
+        # a horizontal edge on a row of pixel centers
+        return 0
+    if edge.size:
+        # horizontal distance to the pixel centers in each row
+        xc = xp[edge] + (row - yp[edge]) * dx / dy
+        dist = np.abs(xc - np.rint(xc))
+        # perpendicular distance to the line through the edge
+        sin = np.abs(dy) / np.hypot(dx, dy)
+        slack = min(slack, np.min(dist * sin))
+    return slack
+
+
+def rectangle(x, y, a, b, phi, shape, scale_x=1, scale_y=1,
+              accumulator=None, factor=1, region=None):
+    points = rectangle_points(x, y, a, b, phi)
+    return polygon(points, shape, scale_x=scale_x, scale_y=scale_y,
+                   accumulator=accumulator, factor=factor, region=region)
+
 
+def rectangle_slack(x, y, a, b, phi, shape, scale_x=1, scale_y=1):
+    """Return the distance by which a rectangle can be moved freely
 
-def rectangle(x, y, a, b, phi, shape, scale_x=1, scale_y=1):
+    See :func:`polygon_slack`.
+    """
+    points = rectangle_points(x, y, a, b, phi)
+    return polygon_slack(points, shape, scale_x=scale_x, scale_y=scale_y)
+
+
+def rectangle_bounding_box(x, y, a, b, phi, shape, scale_x=1, scale_y=1):
+    """Return the pixel bounding box of a rectangle
+
+    See :func:`ellipse_bounding_box` for more information.
+    """
+    points = rectangle_points(x, y, a, b, phi)
+    return polygon_bounding_box(points, shape, scale_x=scale_x,
+                                scale_y=scale_y)
+
+
+def rectangle_points(x, y, a, b, phi):
+    """Return the corner points (x, y) of a rotated rectangle"""
     dx = a / 2
     dy = b / 2
     xv = np.array([dx, dx, -dx, -dx])
@@ -33,6 +518,44 @@ def rectangle(x, y, a, b, phi, shape, scale_x=1, scale_y=1):
     xr = xv * np.cos(phi) - yv * np.sin(phi)
     yr = xv * np.sin(phi) + yv * np.cos(phi)
     points = np.zeros((4, 2), dtype=float)
-    points[:, 0] = (x + xr) / scale_x - .5
-    points[:, 1] = (y + yr) / scale_y - .5
-    return polygon2mask(shape, points[:, ::-1])
+    points[:, 0] = x + xr
+    points[:, 1] = y + yr
+    return points
+
+
+def _edge_table(start, stop):
+    """Return all pairs of edge index and row of an edge table
+
+    Parameters
+    ----------
+    start, stop: 1d ndarrays of int
+        first row and stop row (exclusive) of each edge
+
+    Returns
+    -------
+    edge, row: 1d ndarrays of int
+        edge index and row of each pair
+    """
+    num = np.maximum(stop - start, 0)
+    edge = np.repeat(np.arange(num.size), num)
+    offset = np.arange(edge.size) - np.repeat(np.cumsum(num) - num, num)
+    return edge, start[edge] + offset
+
+
+def _ellipse_radius(x, y, a, b, phi, bbox, scale_x, scale_y):
+    """Normalized squared radius of the pixels in `bbox`
+
+    Pixels with a value smaller than or equal to one are inside
+    the ellipse.
+    """
+    xv = np.arange(bbox[1].start, bbox[1].stop).reshape(1, -1) * scale_x
+    yv = np.arange(bbox[0].start, bbox[0].stop).reshape(-1, 1) * scale_y
+
+    cos_angle = np.cos(np.pi - phi)
+    sin_angle = np.sin(np.pi - phi)
+    xc = (xv - x + .5)
+    yc = (yv - y + .5)
+
+    xct = xc * cos_angle - yc * sin_angle
+    yct = xc * sin_angle + yc * cos_angle
+    return (xct ** 2 / a ** 2) + (yct ** 2 / b ** 2)
@@ -3,6 +3,8 @@ import copy
 
 import numpy as np
 
+from .. import mask
+
 
 class BaseShape(abc.ABC):
     def __eq__(self, other):
@@ -55,12 +57,42 @@ class BaseShape(abc.ABC):
         setting initial size of a shape).
         """
 
+    def bounding_box(self, shape, scale_x=1, scale_y=1):
+        """Return the pixel bounding box of the mask of the shape
+
+        Parameters
+        ----------
+        shape: tuple
+            shape of the mask
+        scale_x, scale_y: float
+            scaling factors
+
+        Returns
+        -------
+        bbox: tuple of slice
+            slices (rows, columns) that contain all True pixels of
+            :func:`BaseShape.to_mask`; Defaults to the entire mask.
+        """
+        return mask.full_bounding_box(shape)
+
+    def translation_slack(self, shape, scale_x=1, scale_y=1):
+        """Return the distance by which the shape can be moved freely
+
+        Translating the shape by (dx, dy) pixels with
+        `hypot(dx - round(dx), dy - round(dy))` smaller than the
+        slack only shifts the mask by (round(dx), round(dy)) pixels
+        (see :func:`impose.geometry.mask.ellipse_slack`). Defaults
+        to zero (mask must be recomputed).
+        """
+        return 0
+
     @abc.abstractmethod
     def set_scale(self, point_um):
         """Set the point size in um"""
 
     @abc.abstractmethod
-    def to_mask(self, shape, scale_x=1, scale_y=1):
+    def to_mask(self, shape, scale_x=1, scale_y=1, accumulator=None,
+                factor=1, region=None):
         """Convert shape to mask
 
         Parameters
@@ -69,6 +101,14 @@ class BaseShape(abc.ABC):
             shape of the mask
         scale_x, scale_y: float
             scaling factors
+        accumulator: 2d ndarray
+            If given, the mask multiplied by `factor` is added
+            to this array in-place and the array is returned
+        factor: int
+            masking factor used for `accumulator`
+        region: tuple of slice
+            region of the mask that `accumulator` covers (see
+            :func:`impose.geometry.mask.accumulate`)
         """
 
     @abc.abstractmethod
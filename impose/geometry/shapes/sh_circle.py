@@ -1,3 +1,5 @@
+import numpy as np
+
 from .sh_ellipse import Ellipse
 
 
@@ -29,6 +31,9 @@ class Circle(Ellipse):
                     point_um=self.point_um)
 
     def __setstate__(self, state):
+        if "_pose" not in self.__dict__:
+            # instance created without __init__ (e.g. `copy.deepcopy`)
+            self._pose = np.zeros(3)
         self.x = state["x"]
         self.y = state["y"]
         self.r = state["r"]
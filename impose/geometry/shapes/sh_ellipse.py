@@ -23,11 +23,11 @@ class Ellipse(BaseShape):
         point_um: float
             point size in microns
         """
-        self.x = float(x)
-        self.y = float(y)
+        #: center coordinates and rotation angle; This array may be a
+        #: view of an :class:`impose.geometry.store.ShapeArrayStore`.
+        self._pose = np.array([x, y, phi % (2 * np.pi)], dtype=float)
         self.a = float(a)
         self.b = float(b)
-        self.phi = phi % (2 * np.pi)
         self.point_um = float(point_um)
         assert isinstance(point_um, numbers.Number)
 
@@ -40,6 +40,9 @@ class Ellipse(BaseShape):
                     point_um=self.point_um)
 
     def __setstate__(self, state):
+        if "_pose" not in self.__dict__:
+            # instance created without __init__ (e.g. `copy.deepcopy`)
+            self._pose = np.zeros(3)
         self.x = state["x"]
         self.y = state["y"]
         self.a = state["a"]
@@ -78,6 +81,44 @@ class Ellipse(BaseShape):
                       )
         return ell
 
+    @property
+    def x(self):
+        """x-coordinate of the center"""
+        return float(self._pose[0])
+
+    @x.setter
+    def x(self, x):
+        self._pose[0] = x
+
+    @property
+    def y(self):
+        """y-coordinate of the center"""
+        return float(self._pose[1])
+
+    @y.setter
+    def y(self, y):
+        self._pose[1] = y
+
+    @property
+    def phi(self):
+        """rotation angle [rad]"""
+        return float(self._pose[2])
+
+    @phi.setter
+    def phi(self, phi):
+        self._pose[2] = phi
+
+    def bounding_box(self, shape, scale_x=1, scale_y=1):
+        return mask.ellipse_bounding_box(x=self.x,
+                                         y=self.y,
+                                         a=self.a,
+                                         b=self.b,
+                                         phi=self.phi,
+                                         shape=shape,
+                                         scale_x=scale_x,
+                                         scale_y=scale_y,
+                                         )
+
     def set_scale(self, point_um):
         fact = point_um / self.point_um
         self.x /= fact
@@ -92,7 +133,8 @@ class Ellipse(BaseShape):
         self.a *= fact
         self.b *= fact
 
-    def to_mask(self, shape, scale_x=1, scale_y=1):
+    def to_mask(self, shape, scale_x=1, scale_y=1, accumulator=None,
+                factor=1, region=None):
         return mask.ellipse(x=self.x,
                             y=self.y,
                             a=self.a,
@@ -101,6 +143,9 @@ class Ellipse(BaseShape):
                             shape=shape,
                             scale_x=scale_x,
                             scale_y=scale_y,
+                            accumulator=accumulator,
+                            factor=factor,
+                            region=region,
                             )
 
     def to_pg_roi(self, roi, tr):
@@ -129,6 +174,17 @@ class Ellipse(BaseShape):
         points[:, 1] += self.y
         return points * self.point_um
 
+    def translation_slack(self, shape, scale_x=1, scale_y=1):
+        return mask.ellipse_slack(x=self.x,
+                                  y=self.y,
+                                  a=self.a,
+                                  b=self.b,
+                                  phi=self.phi,
+                                  shape=shape,
+                                  scale_x=scale_x,
+                                  scale_y=scale_y,
+                                  )
+
     def translate(self, dx, dy):
         """Translate center coordinates
 
@@ -67,6 +67,13 @@ class Polygon(BaseShape):
     def y(self):
         return np.mean(self.points[:, 1])
 
+    def bounding_box(self, shape, scale_x=1, scale_y=1):
+        return mask.polygon_bounding_box(points=self.points,
+                                         shape=shape,
+                                         scale_x=scale_x,
+                                         scale_y=scale_y,
+                                         )
+
     def set_scale(self, point_um):
         fact = point_um / self.point_um
         self.points /= fact
@@ -89,11 +96,15 @@ class Polygon(BaseShape):
         points[:, 1] += y0
         self.points[:] = points
 
-    def to_mask(self, shape, scale_x=1, scale_y=1):
+    def to_mask(self, shape, scale_x=1, scale_y=1, accumulator=None,
+                factor=1, region=None):
         return mask.polygon(points=self.points,
                             shape=shape,
                             scale_x=scale_x,
                             scale_y=scale_y,
+                            accumulator=accumulator,
+                            factor=factor,
+                            region=region,
                             )
 
     def to_pg_roi(self, roi, tr):
@@ -112,6 +123,13 @@ class Polygon(BaseShape):
         """Return shape as representative point cloud"""
         return self.points * self.point_um
 
+    def translation_slack(self, shape, scale_x=1, scale_y=1):
+        return mask.polygon_slack(points=self.points,
+                                  shape=shape,
+                                  scale_x=scale_x,
+                                  scale_y=scale_y,
+                                  )
+
     def translate(self, dx, dy):
         """Translate center coordinates
 
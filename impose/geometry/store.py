@@ -0,0 +1,129 @@
+import numpy as np
+
+from .shapes import Ellipse, Polygon, Rectangle
+
+
+class ShapeArrayStore:
+    def __init__(self, shapes):
+        """Struct-of-arrays storage for the geometry of many shapes
+
+        The center coordinates and rotation angles of all ellipses,
+        circles, and rectangles are stored in one array `poses` and
+        the vertices of all polygons are stored in one array
+        `vertices`. The shapes become views of these arrays, such
+        that rigid transformations of all shapes are computed with
+        a few array operations.
+
+        Parameters
+        ----------
+        shapes: list of impose.geometry.shapes.BaseShape
+            The shapes to store; Use :func:`ShapeArrayStore.supports`
+            to check whether a shape can be stored.
+        """
+        #: The stored shapes
+        self.shapes = list(shapes)
+        for sh in self.shapes:
+            if not self.supports(sh):
+                raise ValueError(f"Unsupported shape: {sh}")
+        is_poly = np.array([isinstance(sh, Polygon) for sh in self.shapes],
+                           dtype=bool)
+        posed = [sh for sh in self.shapes if not isinstance(sh, Polygon)]
+        polys = [sh for sh in self.shapes if isinstance(sh, Polygon)]
+        self._posed_index = np.flatnonzero(~is_poly)
+        self._poly_index = np.flatnonzero(is_poly)
+        self._poly_sizes = np.array([len(sh.points) for sh in polys],
+                                    dtype=int)
+        #: Center coordinates and rotation angles (x, y, phi) of
+        #: all ellipses, circles, and rectangles
+        self.poses = np.zeros((len(posed), 3), dtype=float)
+        #: Vertices (x, y) of all polygons
+        self.vertices = np.zeros((sum(len(sh.points) for sh in polys), 2),
+                                 dtype=float)
+        for ii, sh in enumerate(posed):
+            self.poses[ii] = sh._pose
+            sh._pose = self.poses[ii]
+        start = 0
+        for sh in polys:
+            stop = start + len(sh.points)
+            self.vertices[start:stop] = sh.points
+            sh.points = self.vertices[start:stop]
+            start = stop
+
+    def __len__(self):
+        return len(self.shapes)
+
+    def __repr__(self):
+        return f"<ShapeArrayStore: ({len(self)} shapes) at {hex(id(self))}>"
+
+    def get_centers(self):
+        """Return the center coordinates (x, y) of all shapes
+
+        The center of a polygon is the mean of its vertices.
+        """
+        centers = np.zeros((len(self.shapes), 2), dtype=float)
+        centers[self._posed_index] = self.poses[:, :2]
+        if self._poly_index.size:
+            starts = np.cumsum(self._poly_sizes) - self._poly_sizes
+            sums = np.add.reduceat(self.vertices, starts, axis=0)
+            centers[self._poly_index] = sums / self._poly_sizes[:, None]
+        return centers
+
+    @staticmethod
+    def supports(shape):
+        """Whether `shape` can be stored in a ShapeArrayStore"""
+        return isinstance(shape, (Ellipse, Polygon, Rectangle))
+
+    def matches(self, shapes):
+        """Whether the store holds exactly `shapes`
+
+        Returns False if the list of shapes changed or if a shape
+        does not view the store anymore (e.g. because the points
+        of a polygon were replaced).
+        """
+        if len(shapes) != len(self.shapes):
+            return False
+        for sh, ref in zip(shapes, self.shapes):
+            if sh is not ref:
+                return False
+            elif isinstance(sh, Polygon):
+                if sh.points.base is not self.vertices:
+                    return False
+            elif sh._pose.base is not self.poses:
+                return False
+        return True
+
+    def rotate(self, dphi, origin):
+        """Rotate all shapes around a common origin
+
+        This is equivalent to calling `rotate(dphi, origin)`
+        for every shape.
+
+        Parameters
+        ----------
+        dphi: float
+            Amount of radians to rotate
+        origin: tuple of float
+            Center coordinate around which to rotate
+        """
+        self.poses[:, 2] = (self.poses[:, 2] + dphi) % (2 * np.pi)
+        for points in [self.poses[:, :2], self.vertices]:
+            # same operations as in `rotate_around_point`
+            ox, oy = origin
+            px, py = points[:, 0], points[:, 1]
+            qx = ox + np.cos(dphi) * (px - ox) - np.sin(dphi) * (py - oy)
+            qy = oy + np.sin(dphi) * (px - ox) + np.cos(dphi) * (py - oy)
+            points[:, 0] = qx
+            points[:, 1] = qy
+
+    def translate(self, dx, dy):
+        """Translate all shapes
+
+        Parameters
+        ----------
+        dx, dy: float
+            Amount of points to translate the shapes
+        """
+        self.poses[:, 0] += dx
+        self.poses[:, 1] += dy
+        self.vertices[:, 0] += dx
+        self.vertices[:, 1] += dy
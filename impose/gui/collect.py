@@ -7,6 +7,7 @@ from PyQt6 import uic, QtCore, QtWidgets
 from skimage.color import hsv2rgb
 
 from .. import formats
+from ..data import load_data_sources
 from ..geometry import shapes
 from ..session import JSONEncoderFromNumpy
 from ..structure import StructureLayer
@@ -14,6 +15,7 @@ from .._version import version
 
 from .collect_pgrois import StructureCompositeROIs
 from .collect_shape_controls import CollectShapeControls
+from .widgets import ShowWaitCursor
 
 
 class Collect(QtWidgets.QWidget):
@@ -82,15 +84,23 @@ class Collect(QtWidgets.QWidget):
         return sc
 
     def add_paths(self, paths):
-        for pp in paths:
-            try:
-                self.session_scheme.append(pp)
-            except FileNotFoundError as e:
+        # load all data sources concurrently
+        with ShowWaitCursor():
+            data_sources = load_data_sources(
+                paths,
+                workers=self.session_scheme.workers,
+                return_exceptions=True)
+        for pp, ds in zip(paths, data_sources):
+            if isinstance(ds, FileNotFoundError):
                 QtWidgets.QMessageBox.critical(
                     self,
                     "Associated data file missing or invalid",
-                    e.strerror
+                    ds.strerror
                 )
+            elif isinstance(ds, BaseException):
+                raise ds
+            else:
+                self.session_scheme.append(pp, data_source=ds)
         self.update_table_paths()
 
     def add_shape(self, shape_cls):
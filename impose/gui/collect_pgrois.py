@@ -1,8 +1,7 @@
-import numpy as np
 from PyQt6 import QtCore
 import pyqtgraph as pg
 
-from ..geometry import pg_roi_to_impose_shape
+from ..geometry import get_pg_roi_transform, pg_roi_to_impose_shape
 
 
 class StructureCompositeROIs(QtCore.QObject):
@@ -45,13 +44,7 @@ class StructureCompositeROIs(QtCore.QObject):
 
     def get_roi_transform(self, roi):
         """Return transform from ROI to data coordinates"""
-        # get the image item
-        img = self.image_view.getImageItem()
-        # get the raw data
-        data = np.array(self.image_view.image)[:, :, 0]
-        # transform for mapping from geometry to data coordinates
-        _, tr = roi.getArraySlice(data, img)
-        return tr
+        return get_pg_roi_transform(roi, self.image_view.getImageItem())
 
     @QtCore.pyqtSlot(object)
     def on_layer_roi_changed(self, roi):
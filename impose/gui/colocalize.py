@@ -1,13 +1,15 @@
-import json
 import pathlib
 import pkg_resources
 
 import numpy as np
 from PyQt6 import uic, QtCore, QtWidgets
 
-from .. import formats
+from .. import export, formats
+from ..data import load_data_sources
 
 from .colocalize_pgrois import StructureCompositeGroupedROIs
+from .widgets import (
+    BackgroundComputationError, LatestRequestWorker, ShowWaitCursor)
 
 
 class Colocalize(QtWidgets.QWidget):
@@ -32,6 +34,22 @@ class Colocalize(QtWidgets.QWidget):
         self.settings = QtCore.QSettings()
 
         self._prev_rotate = 0
+
+        #: Background computation of the structure layer statistics
+        self.statistics_worker = LatestRequestWorker(parent=self)
+        self.statistics_worker.finished.connect(self.on_statistics_computed)
+        self.statistics_worker.failed.connect(self.on_worker_failed)
+        #: Pairs of layers and the copies passed to the latest
+        #: statistics request (see `on_statistics_computed`)
+        self._statistics_layers = []
+        #: Background computation of the structure layer view
+        self.layer_view_worker = LatestRequestWorker(parent=self)
+        self.layer_view_worker.finished.connect(
+            self.on_structure_layer_view_computed)
+        self.layer_view_worker.failed.connect(self.on_worker_failed)
+        #: Pairs of layers and the copies passed to the latest
+        #: layer view request
+        self._layer_view_layers = []
         self._prev_translate_x = 0
         self._prev_translate_y = 0
 
@@ -52,6 +70,17 @@ class Colocalize(QtWidgets.QWidget):
         # menu = QtWidgets.QMenu()
         # menu.addAction('label name', self.on_structure_add)
 
+        # export button menu (binary formats)
+        menu = QtWidgets.QMenu(self.toolButton_export)
+        menu.addAction("Export structure data to .tsv", self.on_export_tsv)
+        menu.addAction("Export structure data to HDF5 (.h5)",
+                       self.on_export_hdf5)
+        menu.addAction("Export structure data to NumPy (.npz)",
+                       self.on_export_npz)
+        self.toolButton_export.setMenu(menu)
+        self.toolButton_export.setPopupMode(
+            QtWidgets.QToolButton.ToolButtonPopupMode.MenuButtonPopup)
+
         # signals
         # user wants to add new dataset(s)
         self.toolButton_add_data.clicked.connect(self.on_add_data)
@@ -68,6 +97,8 @@ class Colocalize(QtWidgets.QWidget):
         self.dial_translatex.valueChanged.connect(self.on_translate_x)
         self.dial_translatey.valueChanged.connect(self.on_translate_y)
         self.dial_rotate.valueChanged.connect(self.on_rotate)
+        for dial in self.get_transform_dials():
+            dial.sliderReleased.connect(self.rois.update_roi_geometry)
         # signal for image update
         self.vis.image_changed.connect(self.on_image_changed)
 
@@ -104,15 +135,23 @@ class Colocalize(QtWidgets.QWidget):
         return self.vis.imageView.getView()
 
     def add_paths(self, paths):
-        for pp in paths:
-            try:
-                self.session_scheme.append(pp)
-            except FileNotFoundError as e:
+        # load all data sources concurrently
+        with ShowWaitCursor():
+            data_sources = load_data_sources(
+                paths,
+                workers=self.session_scheme.workers,
+                return_exceptions=True)
+        for pp, ds in zip(paths, data_sources):
+            if isinstance(ds, FileNotFoundError):
                 QtWidgets.QMessageBox.critical(
                     self,
                     "Associated data file missing or invalid",
-                    e.strerror
+                    ds.strerror
                 )
+            elif isinstance(ds, BaseException):
+                raise ds
+            else:
+                self.session_scheme.append(pp, data_source=ds)
         self.update_table_paths()
         if paths:
             # Display the first dataset
@@ -120,6 +159,10 @@ class Colocalize(QtWidgets.QWidget):
             self.on_dataset_selected()
 
     def clear(self):
+        self.statistics_worker.cancel()
+        self.layer_view_worker.cancel()
+        self._statistics_layers = []
+        self._layer_view_layers = []
         self.session_scheme.clear()
         self.rois.clear()
 
@@ -133,6 +176,10 @@ class Colocalize(QtWidgets.QWidget):
         self.comboBox_channel.blockSignals(False)
         self.vis.clear()
 
+    def get_transform_dials(self):
+        """Dials for rotating and translating the structure composite"""
+        return [self.dial_rotate, self.dial_translatex, self.dial_translatey]
+
     def get_structure_layer_data(self, structure_layer=None, flatten=True):
         """Return the data points enclosed by the ROI
 
@@ -146,33 +193,13 @@ class Colocalize(QtWidgets.QWidget):
             set to nan. If True (default), return a flattened array
             of the ROI data points.
         """
-        # obtain the current (sliced) 2D raw data from the data source
-        channel = self.comboBox_channel.currentData()
-        data = self.current_data_source.get_channel_data(channel)
-        # obtain the image mask using
-        # - the current data_source shape and pixel sizes and
-        # - the currently active structure layer
         if structure_layer is None:
             structure_layer = self.rois.active_structure_layer
-        mask = structure_layer.to_mask(self.current_data_source)
-        if flatten:
-            return data[mask]
-        else:
-            # Remove all zeros from the mask that are not essential
-            # for visualization.
-            if np.sum(mask):
-                ii, jj = np.where(mask)
-                indices = np.meshgrid(np.arange(min(ii), max(ii) + 1),
-                                      np.arange(min(jj), max(jj) + 1),
-                                      indexing='ij')
-                # get subimage
-                data_roi = np.array(data[tuple(indices)], dtype=float)
-                mask_roi = mask[tuple(indices)]
-                # apply mask to subimage
-                data_roi[~mask_roi] = np.nan
-            else:
-                data_roi = np.nan * np.zeros((2, 2))
-            return data_roi
+        self.rois.apply_transform()
+        return get_layer_data(data_source=self.current_data_source,
+                              channel=self.comboBox_channel.currentData(),
+                              structure_layer=structure_layer,
+                              flatten=flatten)
 
     @QtCore.pyqtSlot()
     def on_add_data(self):
@@ -211,44 +238,47 @@ class Colocalize(QtWidgets.QWidget):
             self.vis.setEnabled(False)
             self.rois.clear()
 
-    @QtCore.pyqtSlot()
-    def on_export_tsv(self):
-        # file open dialog
+    def get_export_directory(self):
+        """Ask the user for an export directory (None if aborted)"""
         path = QtWidgets.QFileDialog.getExistingDirectory(
             self, "Export directory", self.settings.value("path/export_tsv"))
         if not path:
-            return
+            return None
         self.settings.setValue("path/export_tsv", path)
-        # data save stem
-        ds = self.current_data_source
-        sc = self.current_structure_composite
-        stem = ds.path.stem
-        data = sc.extract_data(ds)
-        for ll in data:
-            layd = data[ll]
-            # export all channel data as a text file
-            lp = pathlib.Path(path) / "{}_{}.tsv".format(stem, ll)
-            channels = sorted(layd.keys())
-            # data
-            layarr = np.zeros((layd[channels[0]].size, len(channels)),
-                              dtype=float)
-            for ii, chn in enumerate(channels):
-                layarr[:, ii] = layd[chn]
-            np.savetxt(lp, layarr,
-                       fmt="%.5g",
-                       delimiter="\t",
-                       header="\t".join(channels),
-                       newline="\r\n",
-                       encoding="utf-8",
-                       )
-        # also save the structure composite
-        pc = pathlib.Path(path) / "{}.impose-composite".format(stem)
-        with pc.open("w") as fd:
-            json.dump(sc.__getstate__(), fd,
-                      ensure_ascii=False,
-                      allow_nan=True,
-                      indent=1,
-                      sort_keys=False)
+        self.rois.apply_transform()
+        return path
+
+    @QtCore.pyqtSlot()
+    def on_export_hdf5(self):
+        path = self.get_export_directory()
+        if path:
+            with ShowWaitCursor():
+                export.export_data(
+                    path=path,
+                    data_source=self.current_data_source,
+                    structure_composite=self.current_structure_composite,
+                    fmt="hdf5")
+
+    @QtCore.pyqtSlot()
+    def on_export_npz(self):
+        path = self.get_export_directory()
+        if path:
+            with ShowWaitCursor():
+                export.export_data(
+                    path=path,
+                    data_source=self.current_data_source,
+                    structure_composite=self.current_structure_composite,
+                    fmt="npz")
+
+    @QtCore.pyqtSlot()
+    def on_export_tsv(self):
+        path = self.get_export_directory()
+        if path:
+            with ShowWaitCursor():
+                export.export_tsv(
+                    path=path,
+                    data_source=self.current_data_source,
+                    structure_composite=self.current_structure_composite)
 
     @QtCore.pyqtSlot(np.ndarray)
     def on_image_changed(self, image):
@@ -259,13 +289,21 @@ class Colocalize(QtWidgets.QWidget):
             self.groupBox_struct.setEnabled(True)
             self.update_ui_from_scheme()
 
+    @QtCore.pyqtSlot(str)
+    def on_worker_failed(self, trace):
+        """Raise errors of background computations in the GUI thread
+
+        The error is shown by the exception hook of the application.
+        """
+        raise BackgroundComputationError(trace)
+
     @QtCore.pyqtSlot(int)
     def on_rotate(self, phi_int):
         dphi = (phi_int / 5000 - .5) * 2 * np.pi
         rotate_diff = dphi - self._prev_rotate
         self._prev_rotate = dphi
         self.current_structure_composite.rotate(rotate_diff)
-        self.rois.update_roi_geometry()
+        self.update_rois()
 
     @QtCore.pyqtSlot(int)
     def on_translate_x(self, trx_int):
@@ -278,7 +316,7 @@ class Colocalize(QtWidgets.QWidget):
         self._prev_translate_x = trlx
         self.current_structure_composite.translate(
             (-trlx_diff/self.current_point_um*42, 0))
-        self.rois.update_roi_geometry()
+        self.update_rois()
 
     @QtCore.pyqtSlot(int)
     def on_translate_y(self, try_int):
@@ -291,23 +329,82 @@ class Colocalize(QtWidgets.QWidget):
         self._prev_translate_y = trly
         self.current_structure_composite.translate(
             (0, trly_diff/self.current_point_um*42))
-        self.rois.update_roi_geometry()
+        self.update_rois()
+
+    @QtCore.pyqtSlot(object)
+    def on_statistics_computed(self, means):
+        """Show the layer means computed in `update_statistics`
+
+        The masks that were computed in the background are added
+        to the mask caches of the layers.
+        """
+        for sl, sl_copy in self._statistics_layers:
+            sl.update_caches(sl_copy)
+        for row, mean in enumerate(means):
+            wmean = self.tableWidget_structures.item(row, 1)
+            if wmean is not None:
+                wmean.setText("{:.4g}".format(mean))
+
+    @QtCore.pyqtSlot(object)
+    def on_structure_layer_view_computed(self, data):
+        """Show the layer image computed in `update_structure_layer_view`"""
+        for sl, sl_copy in self._layer_view_layers:
+            sl.update_caches(sl_copy)
+        if data.size == 0 or np.all(np.isnan(data)):
+            data = np.zeros((2, 2))
+        self.imageViewROI.setImage(data)
+        self.imageViewROI.autoRange()
+
+    def update_rois(self):
+        """Show the rotated or translated structure composite
+
+        While the user is dragging a dial, the transformation is
+        only previewed (see `self.rois.preview_transform`) and the
+        geometry is updated when the dial is released.
+        """
+        if any(dial.isSliderDown() for dial in self.get_transform_dials()):
+            self.rois.preview_transform()
+        else:
+            self.rois.update_roi_geometry()
 
     @QtCore.pyqtSlot()
     def update_statistics(self):
+        """Compute the layer means in the background
+
+        The table is updated in `on_statistics_computed`.
+        """
         if self.session_scheme.data_sources:
-            for row, sl in enumerate(self.current_structure_composite):
-                data = self.get_structure_layer_data(sl, flatten=True)
-                wmean = self.tableWidget_structures.item(row, 1)
-                wmean.setText("{:.4g}".format(np.nanmean(data)))
+            self.rois.apply_transform()
+            sc = self.current_structure_composite
+            # The copies start with the mask caches of the layers and
+            # the view of the data source is not affected by changes
+            # in the GUI during the computation.
+            sc_copy = sc.copy(caches=True)
+            self._statistics_layers = list(zip(sc, sc_copy))
+            self.statistics_worker.submit(
+                get_layer_means,
+                data_source=self.current_data_source.get_view(),
+                channel=self.comboBox_channel.currentData(),
+                structure_composite=sc_copy)
 
     @QtCore.pyqtSlot()
     def update_structure_layer_view(self):
-        data = self.get_structure_layer_data(flatten=False)
-        if data.size == 0 or np.all(np.isnan(data)):
-            data = np.zeros((2, 2))
-        self.imageViewROI.setImage(data)
-        self.imageViewROI.autoRange()
+        """Compute the image of the active layer in the background
+
+        The image is shown in `on_structure_layer_view_computed`.
+        """
+        if (self.session_scheme.data_sources
+                and self.rois.active_structure_layer is not None):
+            self.rois.apply_transform()
+            sl = self.rois.active_structure_layer
+            sl_copy = sl.copy(caches=True)
+            self._layer_view_layers = [(sl, sl_copy)]
+            self.layer_view_worker.submit(
+                get_layer_data,
+                data_source=self.current_data_source.get_view(),
+                channel=self.comboBox_channel.currentData(),
+                structure_layer=sl_copy,
+                flatten=False)
 
     def update_structure_table(self):
         """Updates tableWidget_structures"""
@@ -364,3 +461,44 @@ class Colocalize(QtWidgets.QWidget):
                 point_um=self.current_point_um)
             self.rois.set_structure_composite(self.current_structure_composite,
                                               self.vis)
+
+
+def get_layer_data(data_source, channel, structure_layer, flatten=True):
+    """Return the data points of a data source enclosed by a layer
+
+    See :func:`Colocalize.get_structure_layer_data`. In background
+    computations, pass a view of the data source (see
+    :func:`impose.data.DataSource.get_view`) and a copy of the
+    layer (see :func:`impose.structure.StructureLayer.copy`).
+    """
+    # obtain the current (sliced) 2D raw data from the data source
+    data = data_source.get_channel_data(channel)
+    # obtain the image mask using
+    # - the current data_source shape and pixel sizes and
+    # - the structure layer
+    mask = structure_layer.to_sparse_mask(data_source)
+    if flatten:
+        return mask.gather(data)
+    else:
+        # Remove all zeros from the mask that are not essential
+        # for visualization.
+        mask = mask.cropped()
+        if mask.sum():
+            # get subimage
+            data_roi = np.array(data[mask.bbox], dtype=float)
+            # apply mask to subimage
+            data_roi[~mask.mask] = np.nan
+        else:
+            data_roi = np.nan * np.zeros((2, 2))
+        return data_roi
+
+
+def get_layer_means(data_source, channel, structure_composite):
+    """Return the mean of `channel` for all layers of a composite
+
+    NaN values are ignored (see
+    :func:`impose.structure.StructureComposite.reduce_data`).
+    """
+    # compute the mean of all layers in one pass
+    stats = structure_composite.reduce_data(data_source, channels=[channel])
+    return [lstats[channel]["mean"] for lstats in stats.values()]
@@ -3,11 +3,11 @@ import time
 import traceback
 
 import numpy as np
-from PyQt6 import QtCore
+from PyQt6 import QtCore, QtGui
 import pyqtgraph as pg
 from pyqtgraph import functions as fn
 
-from ..geometry import pg_roi_to_impose_shape
+from ..geometry import get_pg_roi_transform, pg_roi_to_impose_shape
 from ..geometry.shapes import rotate_around_point
 from ..structure import StructureComposite
 
@@ -31,9 +31,13 @@ class StructureCompositeGroupedROIs(QtCore.QObject):
         self._scene_transforms = []  # transforms for all ROIs during rotation
         #: currently active StructureLayer (used in colocalize)
         self.active_structure_layer = None
+        #: currently visualized StructureComposite
+        self.structure_composite = None
         self._point_um = None  # for debugging
         self._structur_layer_rois = []  # keeps track of ROIs for each SL
         self._last_roi_change = time.perf_counter()  # user changed ROI
+        #: item transforms of the ROIs before `preview_transform`
+        self._preview_transforms = []
 
     def __getitem__(self, index):
         return self.rois[index]
@@ -81,6 +85,15 @@ class StructureCompositeGroupedROIs(QtCore.QObject):
                 hh["item"].hide()
         roi.blockSignals(False)
 
+    def apply_transform(self):
+        """Apply pending transformations of the structure composite
+
+        This must be called before accessing the geometry of the
+        structure layers in `self._structur_layer_rois`.
+        """
+        if self.structure_composite is not None:
+            self.structure_composite.apply_transform()
+
     def clear(self):
         for roi in self.rois:
             self.viewbox.removeItem(roi)
@@ -90,17 +103,13 @@ class StructureCompositeGroupedROIs(QtCore.QObject):
         self._initial_states.clear()
         self._rotation_center = None
         self.active_structure_layer = None
+        self.structure_composite = None
         self._structur_layer_rois.clear()
+        self._preview_transforms.clear()
 
     def get_roi_transform(self, roi):
         """Return transform from ROI to data coordinates"""
-        # get the image item
-        img = self.image_view.getImageItem()
-        # get the raw data
-        data = np.array(self.image_view.image)[:, :, 0]
-        # transform for mapping from geometry to data coordinates
-        _, tr = roi.getArraySlice(data, img)
-        return tr
+        return get_pg_roi_transform(roi, self.image_view.getImageItem())
 
     @QtCore.pyqtSlot(object)
     def on_change_finished(self, roi):
@@ -176,11 +185,49 @@ class StructureCompositeGroupedROIs(QtCore.QObject):
             logger.error(traceback.format_exc())
             raise ValueError("Could not find active structure!")
 
+    def preview_transform(self):
+        """Show pending transformations without updating the geometry
+
+        The pending rotation and translation of the structure
+        composite (see :func:`StructureComposite.apply_transform`)
+        are only applied to the item transforms of the pyqtgraph
+        ROIs, which does not depend on the number of shapes and
+        vertices. Use this while the user is still rotating or
+        translating the composite and call `update_roi_geometry`
+        when done.
+        """
+        if self.structure_composite is None or not self.rois:
+            return
+        if not self._preview_transforms:
+            for roi in self.rois:
+                full, _ = roi.itemTransform(roi.parentItem())
+                self._preview_transforms.append(
+                    (QtGui.QTransform(roi.transform()), full))
+        angle, shift = self.structure_composite.get_pending_transform()
+        # The ROI coordinates are the shape coordinates divided by `sy`
+        # (see `to_pg_roi` of the shapes).
+        tr = self.get_roi_transform(self.rois[0])
+        sy = np.sqrt(tr.m22()**2 + tr.m12()**2)
+        (m11, m12), (m21, m22) = rotate_around_point(
+            (0, 0), np.array([[1., 0], [0, 1]]), angle)
+        pending = QtGui.QTransform(m11, m12, m21, m22,
+                                   shift[0] / sy, shift[1] / sy)
+        for roi, (base, full) in zip(self.rois, self._preview_transforms):
+            # apply `pending` in the parent coordinates of the ROI
+            roi.setTransform(full * pending * full.inverted()[0] * base)
+
+    def _reset_preview(self):
+        """Restore the ROI item transforms changed in `preview_transform`"""
+        for roi, (base, _) in zip(self.rois, self._preview_transforms):
+            roi.setTransform(base)
+        self._preview_transforms.clear()
+
     def set_structure_composite(self, cs, vis):
         """Visualize a specific structure composite"""
         assert isinstance(cs, StructureComposite)
         # remove all ROIs and structure information
         self.clear()
+        self.structure_composite = cs
         if cs and vis.has_data():
             self.active_structure_layer = cs[0]
             # add new ROIs
@@ -207,6 +254,8 @@ class StructureCompositeGroupedROIs(QtCore.QObject):
 
     def update_roi_geometry(self):
         """Update all pyqtgraph ROIs with their corresponding geometry data"""
+        self.apply_transform()
+        self._reset_preview()
         for sl, gid, roi in self._structur_layer_rois:
             tr = self.get_roi_transform(roi)
             sl.geometry[gid][0].to_pg_roi(roi, tr)
@@ -215,6 +264,11 @@ class StructureCompositeGroupedROIs(QtCore.QObject):
     @QtCore.pyqtSlot()
     def update_structure_geometry(self):
         """Update the strucure layer of the all pyqtgraph ROIs"""
+        if self._preview_transforms:
+            # the ROIs do not reflect the geometry
+            self.update_roi_geometry()
+            return
+        self.apply_transform()
         for sl, gid, roi in self._structur_layer_rois:
             tr = self.get_roi_transform(roi)
             ishape = pg_roi_to_impose_shape(roi, tr, point_um=sl.point_um)
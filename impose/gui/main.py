@@ -8,6 +8,7 @@ from PyQt6 import uic, QtCore, QtWidgets
 import pyqtgraph as pg
 
 from .widgets import ShowWaitCursor
+from ..file_index import FileSignatureIndex
 from ..session import ImposeDataFileNotFoundError, ImposeSession
 from .._version import version as __version__
 
@@ -73,10 +74,18 @@ class Impose(QtWidgets.QMainWindow):
             self.on_session_clear()
             initial_dialog_shown = False
             search_paths = []
+            # The index is shared between attempts, so directories
+            # are only walked once and signatures are reused.
+            cache_dir = QtCore.QStandardPaths.writableLocation(
+                QtCore.QStandardPaths.StandardLocation.CacheLocation)
+            file_index = FileSignatureIndex(
+                pathlib.Path(cache_dir) / "file_signature_index.json")
             while True:
                 try:
                     with ShowWaitCursor():
-                        self.session.load(path, search_paths=search_paths)
+                        self.session.load(path,
+                                          search_paths=search_paths,
+                                          file_index=file_index)
                 except ImposeDataFileNotFoundError as e:
                     if not initial_dialog_shown:
                         QtWidgets.QMessageBox.warning(
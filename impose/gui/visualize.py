@@ -5,6 +5,11 @@ import pkg_resources
 import numpy as np
 from PyQt6 import uic, QtCore, QtWidgets
 
+from ..data import SlicePrefetcher
+from ..geometry import get_pg_roi_transform
+
+from .widgets import BackgroundComputationError, LatestRequestWorker
+
 
 class Visualize(QtWidgets.QWidget):
     image_changed = QtCore.pyqtSignal(np.ndarray)
@@ -18,6 +23,18 @@ class Visualize(QtWidgets.QWidget):
         # current data source
         self._data_source = None
 
+        #: Background rendering of images; Intermediate requests
+        #: are dropped while the user is still changing the view.
+        self.render_worker = LatestRequestWorker(debounce_ms=0, parent=self)
+        self.render_worker.finished.connect(self.on_image_rendered)
+        self.render_worker.failed.connect(self.on_render_failed)
+        #: Maximum number of pixels blended for previews while a
+        #: slider is being dragged (see :func:`get_preview_level`)
+        self.preview_pixels = 2**18
+        #: Renders neighboring slices of stacks into the snapshot cache
+        self.prefetcher = SlicePrefetcher(radius=2, dtype=np.float32)
+        self.destroyed.connect(self.prefetcher.shutdown)
+
         # initially hide bar (rest is done via ui file)
         self.widget_bar.setHidden(True)
 
@@ -39,6 +56,10 @@ class Visualize(QtWidgets.QWidget):
         self.slider_brightness.valueChanged.connect(self.update_image)
         # user changed contrast
         self.slider_contrast.valueChanged.connect(self.update_image)
+        # render the full-resolution image when the user releases a
+        # slider (previews are shown while sliders are dragged)
+        for slider in self.get_preview_sliders():
+            slider.sliderReleased.connect(self.update_image)
 
     def __getstate__(self):
         """Get metadata from UI, compatible with DataSource.metadata"""
@@ -139,6 +160,8 @@ class Visualize(QtWidgets.QWidget):
 
     def clear(self):
         """Reset to initial state"""
+        self.render_worker.cancel()
+        self.prefetcher.cancel()
         self._data_source = None
         self.listWidget_chan.clear()
         self.imageView.clear()
@@ -146,13 +169,26 @@ class Visualize(QtWidgets.QWidget):
 
     def get_roi_transform(self, roi):
         """Return transform from ROI to data coordinates"""
-        # get the image item
-        img = self.imageView.getImageItem()
-        # get the raw data
-        data = np.array(self.imageView.image)[:, :, 0]
-        # transform for mapping from geometry to data coordinates
-        _, tr = roi.getArraySlice(data, img)
-        return tr
+        return get_pg_roi_transform(roi, self.imageView.getImageItem())
+
+    def get_preview_sliders(self):
+        """Sliders for which previews are shown while dragging"""
+        return [self.slider_slice,
+                self.slider_hue,
+                self.slider_brightness,
+                self.slider_contrast]
+
+    def get_preview_level(self):
+        """Return the preview level for the current interaction
+
+        Returns 1 (full resolution) unless a slider is being
+        dragged (see :func:`impose.data.DataSource.get_image`).
+        """
+        for slider in self.get_preview_sliders():
+            if slider.isSliderDown():
+                return get_preview_level(self.data_source.get_image_shape(),
+                                         max_pixels=self.preview_pixels)
+        return 1
 
     def has_data(self):
         """Whether there is an image currently displayed"""
@@ -181,6 +217,21 @@ class Visualize(QtWidgets.QWidget):
         self.slider_contrast.setValue(item["contrast"])
         self.slider_contrast.blockSignals(False)
 
+    @QtCore.pyqtSlot(object)
+    def on_image_rendered(self, rendered):
+        """Display an image rendered in the background"""
+        data_source, image, preview = rendered
+        if data_source is self.data_source:
+            self.show_image(image, preview=preview)
+
+    @QtCore.pyqtSlot(str)
+    def on_render_failed(self, trace):
+        """Raise errors of background rendering in the GUI thread
+
+        The error is shown by the exception hook of the application.
+        """
+        raise BackgroundComputationError(trace)
+
     @QtCore.pyqtSlot()
     def on_view_plane_changed(self):
         """The user changed the view plane
@@ -209,28 +260,23 @@ class Visualize(QtWidgets.QWidget):
             self._data_source = data_source
             # set the metadata in the UI
             self.__setstate__(data_source.metadata)
-            # finally update the image
-            self.update_image(override_metadata=False)
+            # finally update the image (synchronously, so that
+            # ROIs can be placed on it right away)
+            self.update_image(override_metadata=False, background=False)
             # hide slicing options if 2d source
             if len(self.data_source.shape) == 2:
                 self.groupBox_slicing.setVisible(False)
             else:
                 self.groupBox_slicing.setVisible(True)
 
-    @QtCore.pyqtSlot()
-    def update_image(self, override_metadata=True):
-        """Redraw the image
+    def show_image(self, image, preview=1):
+        """Display a blended image and emit `image_changed`
 
-        If `override_metadata` is True (default), then the
-        metadata of the underlying DataSource is modified
-        (This is a convenience method so that this function
-        can be a slot for the various controls).
+        Preview images (see :func:`Visualize.get_preview_level`) are
+        scaled by the preview level, so that they are displayed
+        with the geometry of the full-resolution image.
         """
-        ds = self.data_source
-        if override_metadata:
-            ds.update_metadata(self.__getstate__())
-        image = ds.get_image()
-        sx, sy = ds.get_pixel_size()
+        sx, sy = self.data_source.get_pixel_size()
         if (np.isnan(image).all()
                 or np.any(np.array([sx, sy]) == 0)):
             # If the image contains *only* nans or zero-sized data,
@@ -239,11 +285,62 @@ class Visualize(QtWidgets.QWidget):
         else:
             # Scaling/Normalization to the x-axis pixel size (y is scaled).
             self.imageView.setImage(image,
-                                    scale=[1, sx/sy],
+                                    scale=[preview, preview * sx/sy],
                                     autoRange=False,
                                     autoLevels=False)
         self.image_changed.emit(image)
 
+    @QtCore.pyqtSlot()
+    def update_image(self, override_metadata=True, background=True):
+        """Redraw the image
+
+        If `override_metadata` is True (default), then the
+        metadata of the underlying DataSource is modified
+        (This is a convenience method so that this function
+        can be a slot for the various controls).
+
+        If `background` is True (default), images that are not
+        cached are rendered in `self.render_worker` and displayed
+        when rendering is done. Only the latest request is
+        rendered, so intermediate images are dropped while the
+        user is still changing the view.
+
+        While a slider is being dragged, a downsampled preview is
+        rendered instead of the full-resolution image (see
+        :func:`Visualize.get_preview_level`).
+        """
+        ds = self.data_source
+        if override_metadata:
+            ds.update_metadata(self.__getstate__())
+        preview = self.get_preview_level() if background else 1
+        # float32 is sufficient for display and halves memory traffic
+        # (cached full-resolution images are always preferred)
+        image = ds.get_image(dtype=np.float32, cache_only=background)
+        level = 1
+        if image is None and preview > 1:
+            image = ds.get_image(dtype=np.float32, cache_only=True,
+                                 preview=preview)
+            level = preview
+        # The metadata are copied, because they may be modified
+        # during rendering.
+        metadata = copy.deepcopy(ds.metadata)
+        if image is None:
+            self.render_worker.submit(
+                render_image,
+                data_source=ds,
+                metadata=metadata,
+                preview=preview)
+        else:
+            # discard pending requests for outdated images
+            self.render_worker.cancel()
+            self.show_image(image, preview=level)
+        if preview == 1:
+            # render the neighboring slices in the background
+            self.prefetcher.update(ds, metadata)
+        else:
+            # the user is still changing the view
+            self.prefetcher.cancel()
+
     def update_label_slice(self, state=None):
         """Update label_slice"""
         if state is None:
@@ -269,3 +366,35 @@ class Visualize(QtWidgets.QWidget):
         self.slider_slice.blockSignals(True)
         self.slider_slice.setMaximum(cut_axis_size-1)
         self.slider_slice.blockSignals(False)
+
+
+def get_preview_level(shape, max_pixels, levels=(1, 2, 4, 8)):
+    """Return the smallest preview level that blends at most `max_pixels`
+
+    Parameters
+    ----------
+    shape: tuple of int
+        Full-resolution image shape
+    max_pixels: int
+        Maximum number of pixels in the preview image
+    levels: tuple of int
+        Allowed preview levels (the largest level is returned if
+        none of the levels meets `max_pixels`)
+    """
+    for level in levels:
+        if np.prod(-(-np.array(shape) // level)) <= max_pixels:
+            return level
+    return levels[-1]
+
+
+def render_image(data_source, metadata, preview=1):
+    """Blend the image of a data source for given metadata
+
+    Returns
+    -------
+    rendered: tuple
+        The data source, the image, and the preview level
+    """
+    image = data_source.get_image(dtype=np.float32, metadata=metadata,
+                                  preview=preview)
+    return data_source, image, preview
@@ -1,3 +1,4 @@
 # flake8: noqa: F401
+from .latest_request import BackgroundComputationError, LatestRequestWorker
 from .simple_image_view import SimpleImageView
 from .wait_cursor import ShowWaitCursor, show_wait_cursor
@@ -0,0 +1,132 @@
+import traceback
+
+from PyQt6 import QtCore
+
+
+class BackgroundComputationError(Exception):
+    """Error of a background computation, raised in the GUI thread
+
+    The message contains the traceback of the background thread.
+    """
+    pass
+
+
+class _RequestSignals(QtCore.QObject):
+    #: emitted with (request id, result, traceback or None)
+    done = QtCore.pyqtSignal(int, object, object)
+
+
+class _RequestRunnable(QtCore.QRunnable):
+    def __init__(self, request_id, func, args, kwargs, signals):
+        super(_RequestRunnable, self).__init__()
+        self.request_id = request_id
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = signals
+
+    def run(self):
+        try:
+            result = self.func(*self.args, **self.kwargs)
+        except BaseException:
+            self.signals.done.emit(self.request_id, None,
+                                   traceback.format_exc())
+        else:
+            self.signals.done.emit(self.request_id, result, None)
+
+
+class LatestRequestWorker(QtCore.QObject):
+    #: emitted with the result of the latest request
+    finished = QtCore.pyqtSignal(object)
+    #: emitted with the traceback when the latest request failed
+    failed = QtCore.pyqtSignal(str)
+
+    def __init__(self, debounce_ms=50, parent=None):
+        """Run computations in a background thread (latest request wins)
+
+        Requests (see :func:`LatestRequestWorker.submit`) are only
+        started after no new request was submitted for `debounce_ms`
+        milliseconds. At most one computation runs at a time and
+        only the most recent request is kept pending. Results of
+        requests that were superseded by a newer request are
+        discarded, so `finished` is only emitted for the latest
+        request.
+
+        Parameters
+        ----------
+        debounce_ms: int
+            Time to wait for new requests before starting a
+            computation [ms]
+        parent: QtCore.QObject
+            Parent object
+        """
+        super(LatestRequestWorker, self).__init__(parent)
+        self._request_id = 0
+        self._pending = None
+        self._running = False
+        self._pool = QtCore.QThreadPool(self)
+        self._pool.setMaxThreadCount(1)
+        # lives in the thread of the worker, so that results are
+        # delivered via queued connections
+        self._signals = _RequestSignals(self)
+        self._signals.done.connect(self._on_done)
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(debounce_ms)
+        self._timer.timeout.connect(self._start_pending)
+
+    @property
+    def busy(self):
+        """Whether a request is pending or being computed"""
+        return self._running or self._pending is not None
+
+    def cancel(self):
+        """Discard all pending and running requests"""
+        self._request_id += 1
+        self._pending = None
+        self._timer.stop()
+
+    def submit(self, func, *args, **kwargs):
+        """Request the computation `func(*args, **kwargs)`
+
+        `func` is called in a background thread, so it must not
+        access any Qt widgets and its arguments must not be
+        modified in the meantime (pass copies instead).
+        """
+        self._request_id += 1
+        self._pending = (self._request_id, func, args, kwargs)
+        self._timer.start()
+
+    def wait(self, timeout_ms=10000):
+        """Process events until all requests are done (for testing)"""
+        timer = QtCore.QElapsedTimer()
+        timer.start()
+        while self.busy and timer.elapsed() < timeout_ms:
+            QtCore.QCoreApplication.processEvents(
+                QtCore.QEventLoop.ProcessEventsFlag.AllEvents, 50)
+            QtCore.QThread.msleep(1)
+        return not self.busy
+
+    @QtCore.pyqtSlot(int, object, object)
+    def _on_done(self, request_id, result, error):
+        self._running = False
+        if request_id == self._request_id:
+            if error is None:
+                self.finished.emit(result)
+            else:
+                self.failed.emit(error)
+        # else: stale result
+        if self._pending is not None and not self._timer.isActive():
+            # a request came in during the computation
+            self._start_pending()
+
+    @QtCore.pyqtSlot()
+    def _start_pending(self):
+        if self._running or self._pending is None:
+            # started in `_on_done` once the current computation is done
+            return
+        request_id, func, args, kwargs = self._pending
+        self._pending = None
+        self._running = True
+        self._pool.start(_RequestRunnable(
+            request_id, func, args, kwargs, self._signals))
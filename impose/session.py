@@ -6,8 +6,8 @@ import errno
 import numpy as np
 
 from .structure import StructureComposite, StructureCompositeStack
-from .data import DataSource
-from .formats import get_signature
+from .data import DataSource, load_data_sources
+from .file_index import FileSignatureIndex
 from .util import equal_states
 from ._version import version
 
@@ -20,19 +20,24 @@ class ImposeDataFileNotFoundError(FileNotFoundError):
 class ImposeSessionSchemeCollect:
     """Holds all session information about collection"""
 
-    def __init__(self, structure_composite_stack):
+    def __init__(self, structure_composite_stack, workers=None):
         """
 
         Parameters
         ----------
         structure_composite_stack: impose.structure.StrucureCompositeStack
             Empty structure composite stack
+        workers: int
+            Number of threads for loading data sources concurrently
+            (see :func:`impose.data.load_data_sources`)
         """
         #: All open :class:`impose.data.DataSource` instances
         self.data_sources = []
         #: All :class:`impose.structure.StrucureComposite` instances
         #: in one :class:`impose.structure.StrucureCompositeStack`
         self.scs = structure_composite_stack
+        #: Number of threads for loading data sources
+        self.workers = workers
 
     def __getstate__(self):
         """Serialize the current state of the session"""
@@ -45,10 +50,10 @@ class ImposeSessionSchemeCollect:
     def __setstate__(self, state):
         """Deserialize a state and apply it to this session"""
         self.data_sources.clear()
-        for ss in state["data sources"]:
-            ds = DataSource(ss["path"])
-            ds.__setstate__(ss)
-            self.data_sources.append(ds)
+        self.data_sources.extend(load_data_sources(
+            paths=[ss["path"] for ss in state["data sources"]],
+            states=state["data sources"],
+            workers=self.workers))
 
     @property
     def paths(self):
@@ -95,18 +100,23 @@ class ImposeSessionSchemeCollect:
 class ImposeSessionSchemeColocalize:
     """Holds all session information about colocalization"""
 
-    def __init__(self, structure_composite_stack):
+    def __init__(self, structure_composite_stack, workers=None):
         """
 
         Parameters
         ----------
         structure_composite_stack: impose.structure.StrucureCompositeStack
             Empty structure composite stack
+        workers: int
+            Number of threads for loading data sources concurrently
+            (see :func:`impose.data.load_data_sources`)
         """
         #: Input data images
         self.data_sources = []
         self.scs = structure_composite_stack
         self.strucure_composites_manual = []
+        #: Number of threads for loading data sources
+        self.workers = workers
 
     def __getstate__(self):
         """Serialize the current state of the session"""
@@ -122,10 +132,10 @@ class ImposeSessionSchemeColocalize:
     def __setstate__(self, state):
         """Deserialize a state and apply it to this session"""
         self.clear()
-        for ss in state["data sources"]:
-            ds = DataSource(ss["path"])
-            ds.__setstate__(ss)
-            self.data_sources.append(ds)
+        self.data_sources.extend(load_data_sources(
+            paths=[ss["path"] for ss in state["data sources"]],
+            states=state["data sources"],
+            workers=self.workers))
         for sscm in state["structure composites manual"]:
             sc = StructureComposite()
             sc.__setstate__(sscm)
@@ -196,7 +206,16 @@ class ImposeSessionSchemeColocalize:
 class ImposeSession:
     """Holds all session information about an impose session"""
 
-    def __init__(self):
+    def __init__(self, workers=None):
+        """
+
+        Parameters
+        ----------
+        workers: int
+            Number of threads for loading data sources concurrently
+            (see :func:`impose.data.load_data_sources`); If set to
+            None, the number of CPUs is used.
+        """
         #: :class:`impose.structure.StructureCompositeStack`;
         #: contains all the user-defined instances of
         #: :class:`impose.structure.StructureComposite`.
@@ -206,12 +225,13 @@ class ImposeSession:
         #: :class:`impose.session.ImposeSessionSchemeCollect`;
         #: contains relevant information about user-defined
         #: datasets and -generated `StructureComposite`s.
-        self.collect = ImposeSessionSchemeCollect(self.scs)
+        self.collect = ImposeSessionSchemeCollect(self.scs, workers=workers)
         #: :class:`impose.session.ImposeSessionSchemeColocalize`;
         #: contains information about applying the stack in
         #: :const:`impose.session.ImposeSession.scs` to new
         #: data.
-        self.colocalize = ImposeSessionSchemeColocalize(self.scs)
+        self.colocalize = ImposeSessionSchemeColocalize(self.scs,
+                                                        workers=workers)
 
     def __eq__(self, other):
         return equal_states(self.__getstate__(), other.__getstate__())
@@ -232,24 +252,41 @@ class ImposeSession:
         self.colocalize.__setstate__(state["colocalization"])
 
     @staticmethod
-    def check_json_paths(odict, search_paths=None):
-        """Try to retrieve non-existent paths in a session"""
+    def check_json_paths(odict, search_paths=None, file_index=None):
+        """Try to retrieve non-existent paths in a session
+
+        Parameters
+        ----------
+        odict: dict
+            Dictionary from the session file (JSON object hook)
+        search_paths: list of pathlib.Path
+            Directories where to search for missing files
+        file_index: impose.file_index.FileSignatureIndex
+            Index for looking up signatures and directory listings;
+            Pass the same instance for all calls so that every
+            search path is only walked once.
+        """
         if search_paths is None:
             sps = []
         else:
             sps = [pathlib.Path(sp) for sp in search_paths]
+        if file_index is None:
+            file_index = FileSignatureIndex()
         if "path" in odict:
             # Path in a DataSource state
             sig = odict["metadata"].get("signature")
             path = pathlib.Path(odict["path"])
-            odict["path"] = ImposeSession.find_file(
-                name=path.name,
-                search_paths=[path.parent] + sps,
-                signature=sig)
+            if not path.is_file() or (
+                    sig is not None and sig != file_index.get_signature(path)):
+                odict["path"] = ImposeSession.find_file(
+                    name=path.name,
+                    search_paths=[path.parent] + sps,
+                    signature=sig,
+                    file_index=file_index)
         return odict
 
     @staticmethod
-    def find_file(name, search_paths, signature=None):
+    def find_file(name, search_paths, signature=None, file_index=None):
         """Find a data file
 
         Parameters
@@ -261,20 +298,22 @@ class ImposeSession:
         signature: str
             Optional data file signature (defined in the `formats`
             submodule)
+        file_index: impose.file_index.FileSignatureIndex
+            Index for looking up signatures and directory listings;
+            If not set, a temporary index is used.
 
         Returns
         -------
         new_path: pathlib.Path
             The actual path
         """
-        for sp in search_paths:
-            for pp in sp.rglob(name):
-                if signature is None:
-                    # signature check not possible
-                    return pp
-                elif signature == get_signature(pp):
-                    # only return signature if we have a match
-                    return pp
+        if file_index is None:
+            file_index = FileSignatureIndex()
+        new_path = file_index.find(name=name,
+                                   search_paths=search_paths,
+                                   signature=signature)
+        if new_path is not None:
+            return new_path
         else:
             raise ImposeDataFileNotFoundError(
                 errno.ENOENT,
@@ -290,18 +329,67 @@ class ImposeSession:
         self.collect.clear()
         self.colocalize.clear()
 
-    def load(self, path, search_paths=None):
-        """Replace the current session with a session stored on disk"""
+    def load(self, path, search_paths=None, file_index=None):
+        """Replace the current session with a session stored on disk
+
+        Parameters
+        ----------
+        path: str or pathlib.Path
+            Path to the session file
+        search_paths: list of pathlib.Path
+            Directories where to search for data files that are
+            not at their original location; The directory of the
+            session file is appended to this list.
+        file_index: impose.file_index.FileSignatureIndex
+            Index for looking up signatures and directory listings;
+            If not set, a temporary index is used. If the index
+            is persistent, it is saved after loading.
+        """
+        if file_index is None:
+            file_index = FileSignatureIndex()
+        try:
+            state = ImposeSession.load_state(path,
+                                             search_paths=search_paths,
+                                             file_index=file_index)
+            self.__setstate__(state)
+        finally:
+            file_index.save()
+
+    @staticmethod
+    def load_state(path, search_paths=None, file_index=None):
+        """Read the state of a session file without loading any data
+
+        The paths of the data sources are resolved with
+        :func:`ImposeSession.check_json_paths`.
+
+        Parameters
+        ----------
+        path: str or pathlib.Path
+            Path to the session file
+        search_paths: list of pathlib.Path
+            Directories where to search for data files that are not
+            at their original location; The directory of the session
+            file is appended to this list.
+        file_index: impose.file_index.FileSignatureIndex
+            Index for looking up signatures and directory listings;
+            If not set, a temporary index is used.
+
+        Returns
+        -------
+        state: dict
+            Session state (see :func:`ImposeSession.__getstate__`)
+        """
         if search_paths is None:
             search_paths = []
+        if file_index is None:
+            file_index = FileSignatureIndex()
         path = pathlib.Path(path)
         search_paths.append(path.parent)
-        with pathlib.Path(path).open("r") as fd:
-            state = json.load(
+        with path.open("r") as fd:
+            return json.load(
                 fd,
-                object_hook=lambda x:
-                    ImposeSession.check_json_paths(x, search_paths))
-            self.__setstate__(state)
+                object_hook=lambda x: ImposeSession.check_json_paths(
+                    x, search_paths, file_index))
 
     def save(self, path):
         """Save the current session to a file on disk"""
@@ -3,14 +3,28 @@ from collections import OrderedDict
 import numpy as np
 
 from ..geometry import shapes as gshapes
+from ..geometry.store import ShapeArrayStore
 from ..util import equal_states
 
 from .layer import StructureLayer
+from .statistics import (
+    DEFAULT_QUANTILES, StreamingStatistics, compute_statistics)
 
 
 class StructureComposite:
+    #: Whether to rotate and translate all shapes at once via a
+    #: :class:`impose.geometry.store.ShapeArrayStore`
+    use_geometry_store = True
+
     def __init__(self):
-        self.layers = []
+        self._layers = []
+        self._geometry_store = None
+        #: Pending rotation angle [rad] (see `apply_transform`)
+        self._transform_angle = 0.
+        #: Pending translation (dx, dy) [pt] (see `apply_transform`)
+        self._transform_shift = np.zeros(2)
+        #: Position of the untransformed composite [µm]
+        self._base_position = None
 
     def __contains__(self, sl):
         if isinstance(sl, str):
@@ -44,7 +58,7 @@ class StructureComposite:
         return iter(self.layers)
 
     def __len__(self):
-        return len(self.layers)
+        return len(self._layers)
 
     def __getstate__(self):
         layers = []
@@ -53,7 +67,8 @@ class StructureComposite:
         return dict(layers=layers)
 
     def __setstate__(self, state):
-        self.layers.clear()
+        self._reset_transform()
+        self._layers.clear()
         for lstate in state["layers"]:
             self.append(StructureLayer.from_state(lstate))
 
@@ -62,15 +77,26 @@ class StructureComposite:
         return "StructureComposite:{}".format(lstr)
 
     def __repr__(self):
-        rpr = f"<StructureComposite: ({len(self.layers)} layers) " \
+        rpr = f"<StructureComposite: ({len(self._layers)} layers) " \
             + f"at {hex(id(self))}>"
         return rpr
 
+    @property
+    def layers(self):
+        """List of structure layers
+
+        Pending rotations and translations are applied to the
+        shapes of the layers when they are accessed (see
+        :func:`StructureComposite.apply_transform`).
+        """
+        self.apply_transform()
+        return self._layers
+
     @property
     def point_um(self):
         """Point size in microns"""
-        if self.layers:
-            return self.layers[0].point_um
+        if self._layers:
+            return self._layers[0].point_um
         else:
             return None
 
@@ -81,9 +107,33 @@ class StructureComposite:
         The center is computed from the center of the underlying
         structures layers.
         """
+        if self.has_pending_transform():
+            # transform the position of the untransformed composite
+            if self._base_position is None:
+                self._base_position = self._get_base_position()
+            pos = np.array([self._base_position]) / self.point_um
+            pos = gshapes.rotate_around_point((0, 0), pos,
+                                              self._transform_angle)[0]
+            pos += self._transform_shift
+            return pos[0] * self.point_um, pos[1] * self.point_um
+        return self._get_base_position()
+
+    def _get_base_position(self):
+        """Position of the composite without pending transformations"""
+        store = self.get_geometry_store()
+        if store is not None:
+            # mean of the shape centers of each layer
+            index = np.repeat(np.arange(len(self._layers)),
+                              [len(sl.geometry) for sl in self._layers])
+            centers = store.get_centers()
+            counts = np.bincount(index)
+            cx = np.bincount(index, weights=centers[:, 0]) / counts
+            cy = np.bincount(index, weights=centers[:, 1]) / counts
+            return (np.mean(cx) * self.point_um,
+                    np.mean(cy) * self.point_um)
         cx = []
         cy = []
-        for sl in self.layers:
+        for sl in self._layers:
             cxi, cyi = sl.position_um
             cx.append(cxi)
             cy.append(cyi)
@@ -92,6 +142,8 @@ class StructureComposite:
     def append(self, sl):
         """Append a structure layer"""
         assert isinstance(sl, StructureLayer)
+        # pending transformations must not be applied to `sl`
+        self.apply_transform()
         if self.layers:
             if self.layers[0].point_um != sl.point_um:
                 raise ValueError("All StructureLayers in a StructureComposite "
@@ -102,6 +154,34 @@ class StructureComposite:
                                  + "'{}' already exists!".format(sl.label))
         self.layers.append(sl)
 
+    def apply_transform(self):
+        """Apply pending rotations and translations to all shapes
+
+        :func:`StructureComposite.rotate` and
+        :func:`StructureComposite.translate` only accumulate a
+        rigid transformation, which is applied to the shapes
+        (in one pass via :func:`StructureComposite.get_geometry_store`)
+        when the layers are accessed, e.g. for computing masks,
+        updating ROIs, or saving. Code that keeps references to
+        the layers of a composite must call this method before
+        using them.
+        """
+        if not self.has_pending_transform():
+            return
+        angle = self._transform_angle
+        shift = self._transform_shift
+        self._reset_transform()
+        store = self.get_geometry_store()
+        if store is None:
+            for ll in self._layers:
+                ll.rotate(angle, origin_um=(0, 0))
+                ll.translate(shift * ll.point_um)
+        else:
+            store.rotate(angle, origin=(0, 0))
+            store.translate(shift[0], shift[1])
+            for ll in self._layers:
+                ll._mask_cache.clear()
+
     def change_layer_label(self, old_label, new_label, force=False):
         """Change the label of a StructureLayer"""
         if old_label == new_label:
@@ -117,10 +197,14 @@ class StructureComposite:
             # update the private StructureLayer label property
             sl._label = new_label
 
-    def copy(self):
+    def copy(self, caches=False):
+        """Return a copy of the composite
+
+        See :func:`StructureLayer.copy` for `caches`.
+        """
         sc = StructureComposite()
         for sl in self.layers:
-            sc.append(sl.copy())
+            sc.append(sl.copy(caches=caches))
         return sc
 
     def extract_data(self, data_source, channels=None):
@@ -141,11 +225,178 @@ class StructureComposite:
             dictionary has DataSource channel names as
             keys.
         """
-        data = OrderedDict()
-        for sl in self.layers:
-            data[sl.label] = sl.extract_data(data_source, channels)
+        if channels is None:
+            channels = sorted(data_source.data_channels.keys())
+        indices = self.get_flat_indices(data_source)
+        data = OrderedDict((sl.label, {}) for sl in self.layers)
+        for chn in channels:
+            # the channel data are only read once for all layers
+            chdata = np.ravel(data_source[chn])
+            for sl, idx in zip(self.layers, indices):
+                data[sl.label][chn] = np.take(chdata, idx)
         return data
 
+    def get_flat_indices(self, data_source):
+        """Return the indices of the pixels of each layer
+
+        Returns
+        -------
+        indices: list of 1d ndarrays
+            Sorted indices in the flattened image for each layer
+        """
+        if get_label_dtype(len(self)) is None:
+            # too many layers for a label image
+            return [sl.to_sparse_mask(data_source).flat_indices()
+                    for sl in self.layers]
+        flat, codes = self.get_label_codes(data_source)
+        return [flat[(codes & bit) != 0] for bit in self.get_label_bits()]
+
+    def get_geometry_store(self):
+        """Return the array storage of the shapes of all layers
+
+        The :class:`impose.geometry.store.ShapeArrayStore` is
+        (re-)created if the shapes of the layers changed. Returns
+        None if :const:`StructureComposite.use_geometry_store` is
+        False, if there are no shapes, if a shape is not supported,
+        or if the layers have different point sizes.
+        """
+        shapes = [sh for ll in self._layers for sh, _ in ll.geometry]
+        store = self._geometry_store
+        if (not self.use_geometry_store
+                or len(set(ll.point_um for ll in self._layers)) != 1):
+            store = None
+        elif store is None or not store.matches(shapes):
+            if all(ShapeArrayStore.supports(sh) for sh in shapes):
+                store = ShapeArrayStore(shapes)
+            else:
+                store = None
+        self._geometry_store = store
+        return store
+
+    def get_pending_transform(self):
+        """Return the rotation and translation not applied yet
+
+        Returns
+        -------
+        angle: float
+            Rotation angle around (0, 0) [rad]
+        shift: np.ndarray
+            Translation (dx, dy) after the rotation [pt]
+
+        See :func:`StructureComposite.apply_transform`.
+        """
+        return self._transform_angle, self._transform_shift.copy()
+
+    def get_stack_statistics(self, data_source, channels=None,
+                             quantiles=DEFAULT_QUANTILES, sample_size=100000):
+        """Compute statistics of each layer for a slice stack
+
+        In addition to the tables of
+        :func:`StructureComposite.iter_slice_statistics`, the
+        statistics of the entire stack are accumulated (see
+        :class:`impose.structure.statistics.StreamingStatistics`).
+
+        Returns
+        -------
+        tables: list of lists of dict
+            Tidy table for each slice
+        totals: list of dict
+            Tidy table for the entire stack (one row per layer and
+            channel with the keys "layer" and "channel" and the
+            statistics)
+        """
+        accumulators = OrderedDict()
+        tables = []
+        for table, values in self._iter_slice_values(data_source, channels,
+                                                     quantiles):
+            tables.append(table)
+            for row, vals in zip(table, values):
+                key = (row["layer"], row["channel"])
+                if key not in accumulators:
+                    accumulators[key] = StreamingStatistics(
+                        quantiles=quantiles, sample_size=sample_size)
+                accumulators[key].update(vals)
+        totals = []
+        for (label, chn), acc in accumulators.items():
+            row = {"layer": label, "channel": chn}
+            row.update(acc.get_statistics())
+            totals.append(row)
+        return tables, totals
+
+    def iter_slice_statistics(self, data_source, channels=None,
+                              quantiles=DEFAULT_QUANTILES):
+        """Compute statistics of each layer for all slices of a stack
+
+        The slices along the cut axis of `data_source` are read one
+        at a time and the layer masks are only computed once, so
+        that the memory usage does not depend on the stack size.
+
+        Parameters
+        ----------
+        data_source: impose.data.DataSource
+            Data source from which to extract data
+        channels: list of str
+            List of channel names for which to compute statistics
+        quantiles: list of float
+            Quantiles to compute (between 0 and 1)
+
+        Yields
+        ------
+        table: list of dict
+            Tidy table for one slice with one row per layer and
+            channel; Each row contains the keys "slice", "layer",
+            and "channel" and the statistics (see
+            :func:`impose.structure.statistics.compute_statistics`).
+        """
+        for table, _ in self._iter_slice_values(data_source, channels,
+                                                quantiles):
+            yield table
+
+    def _iter_slice_values(self, data_source, channels, quantiles):
+        """Yield the statistics table and layer data of each slice"""
+        if channels is None:
+            channels = sorted(data_source.data_channels.keys())
+        indices = self.get_flat_indices(data_source)
+        labels = [sl.label for sl in self.layers]
+        for view_slice in range(data_source.get_slice_count()):
+            table = []
+            values = []
+            for chn in channels:
+                chdata = np.ravel(
+                    data_source.get_channel_data(chn, view_slice=view_slice))
+                for label, idx in zip(labels, indices):
+                    vals = np.take(chdata, idx)
+                    row = {"slice": view_slice, "layer": label,
+                           "channel": chn}
+                    row.update(compute_statistics(vals, quantiles))
+                    table.append(row)
+                    values.append(vals)
+            yield table, values
+
+    def get_label_bits(self):
+        """Return the bit of each layer in the label image
+
+        See :func:`StructureComposite.to_label_image`.
+        """
+        dtype = get_label_dtype(len(self))
+        return [dtype.type(1) << dtype.type(ii) for ii in range(len(self))]
+
+    def get_label_codes(self, data_source):
+        """Return flat indices and codes of all labeled pixels
+
+        Returns
+        -------
+        flat: 1d ndarray
+            Sorted indices of all pixels in the flattened label image
+            that belong to at least one layer
+        codes: 1d ndarray
+            The corresponding values of the label image (see
+            :func:`StructureComposite.to_label_image`)
+        """
+        label = self.to_label_image(data_source)
+        flat = np.flatnonzero(label)
+        return flat, label.ravel()[flat]
+
     def geometry_identical_to(self, other) -> bool:
         """Return `True` if the StrucureComposite has the same geometry"""
         assert isinstance(other, StructureComposite)
@@ -178,6 +429,58 @@ class StructureComposite:
         else:
             raise KeyError(f"Could not find layer '{sl}'!")
 
+    def has_pending_transform(self):
+        """Whether rotations or translations have not been applied yet
+
+        See :func:`StructureComposite.apply_transform`.
+        """
+        return bool(self._transform_angle or np.any(self._transform_shift))
+
+    def reduce_data(self, data_source, channels=None):
+        """Compute statistics of the data in each layer
+
+        The statistics of all layers are computed in one pass with
+        :func:`numpy.bincount` over the unique codes of the label
+        image (see :func:`StructureComposite.to_label_image`).
+        NaN values are ignored.
+
+        Parameters
+        ----------
+        data_source: impose.data.DataSource
+            Data source from which to extract data
+        channels: list of str
+            List of channel names for which to compute statistics
+
+        Returns
+        -------
+        stats: OrderedDict of dicts {str: dict}
+            Nested dictionary (layer label and channel name) with
+            "size" (number of pixels), "count" (number of non-NaN
+            pixels), "sum", and "mean" of the data points
+        """
+        if channels is None:
+            channels = sorted(data_source.data_channels.keys())
+        stats = OrderedDict((sl.label, {}) for sl in self.layers)
+        if get_label_dtype(len(self)) is None:
+            # too many layers for a label image
+            for sl, ldata in zip(self.layers,
+                                 self.extract_data(data_source,
+                                                   channels).values()):
+                for chn in channels:
+                    ustats = _reduce(ldata[chn],
+                                     np.zeros(ldata[chn].size, dtype=int))
+                    stats[sl.label][chn] = _summarize(ustats, slice(None))
+            return stats
+        flat, codes = self.get_label_codes(data_source)
+        uniq, inverse = np.unique(codes, return_inverse=True)
+        selections = [(uniq & bit) != 0 for bit in self.get_label_bits()]
+        for chn in channels:
+            values = np.take(np.ravel(data_source[chn]), flat)
+            ustats = _reduce(values, inverse, minlength=uniq.size)
+            for sl, sel in zip(self.layers, selections):
+                stats[sl.label][chn] = _summarize(ustats, sel)
+        return stats
+
     def remove(self, sl):
         """Remove a StructureLayer
 
@@ -201,13 +504,20 @@ class StructureComposite:
         origin_um: tuple of floats
             x-y-coordinates of the center of rotation [µm]
         """
+        if not self._layers:
+            return
         if origin_um is None:
             origin_um = self.position_um
-        for ll in self.layers:
-            ll.rotate(dphi, origin_um)
+        origin = np.array(origin_um) / self.point_um
+        # compose the pending transformation with the rotation
+        shift = gshapes.rotate_around_point(
+            origin, np.array([self._transform_shift]), dphi)[0]
+        self._transform_angle += dphi
+        self._transform_shift = shift
 
     def set_scale(self, point_um):
         """Scale to new point size in microns"""
+        self._base_position = None
         for ls in self.layers:
             ls.set_scale(point_um)
 
@@ -242,7 +552,71 @@ class StructureComposite:
         signature[:, :2] = rotated
         return signature
 
+    def to_label_image(self, data_source):
+        """Rasterize all layers into one label image
+
+        Bit `i` of a pixel value is set if the pixel belongs to the
+        `i`-th layer (see :func:`StructureComposite.get_label_bits`),
+        so that overlapping layers are supported.
+
+        Returns
+        -------
+        label: 2d ndarray of unsigned int
+            Label image with the shape of the data source image
+        """
+        dtype = get_label_dtype(len(self))
+        if dtype is None:
+            raise ValueError(f"Label images support at most 64 layers, "
+                             f"got {len(self)}!")
+        label = np.zeros(data_source.get_image_shape(), dtype=dtype)
+        for sl, bit in zip(self.layers, self.get_label_bits()):
+            smask = sl.to_sparse_mask(data_source)
+            sub = label[smask.bbox]
+            sub[smask.mask] |= bit
+        return label
+
     def translate(self, dr_um):
         """Translate the composite by dr_um = (dx, dy) [µm]"""
-        for ll in self.layers:
-            ll.translate(dr_um)
+        if not self._layers:
+            return
+        self._transform_shift = (self._transform_shift
+                                 + np.array(dr_um) / self.point_um)
+
+    def _reset_transform(self):
+        self._transform_angle = 0.
+        self._transform_shift = np.zeros(2)
+        self._base_position = None
+
+
+def get_label_dtype(num_layers):
+    """Return the smallest unsigned integer type for a label image
+
+    Returns None if there are more than 64 layers.
+    """
+    for dtype in [np.uint8, np.uint16, np.uint32, np.uint64]:
+        if num_layers <= np.iinfo(dtype).bits:
+            return np.dtype(dtype)
+    return None
+
+
+def _reduce(values, inverse, minlength=1):
+    """Compute size, count and sum of `values` grouped by `inverse`"""
+    valid = ~np.isnan(values)
+    return {
+        "size": np.bincount(inverse, minlength=minlength),
+        "count": np.bincount(inverse, weights=valid, minlength=minlength),
+        "sum": np.bincount(inverse, weights=np.where(valid, values, 0),
+                           minlength=minlength),
+    }
+
+
+def _summarize(ustats, selection):
+    """Combine the selected groups of :func:`_reduce` to statistics"""
+    count = int(np.sum(ustats["count"][selection]))
+    vsum = np.sum(ustats["sum"][selection])
+    return {
+        "size": int(np.sum(ustats["size"][selection])),
+        "count": count,
+        "sum": vsum,
+        "mean": vsum / count if count else np.nan,
+    }
@@ -1,12 +1,20 @@
+from collections import OrderedDict
 import copy
 import numbers
 
 import numpy as np
 
 from ..geometry import shapes as gshapes
+from ..geometry.mask import SparseMask
 
 
 class StructureLayer:
+    #: Maximum number of masks cached per layer
+    mask_cache_size = 16
+    #: Tolerance [pt] for comparing the relative positions of the
+    #: shapes when reusing the masks of translated layers
+    translation_tolerance = 1e-6
+
     def __init__(self, label, point_um, geometry, color=(255, 255, 255)):
         """Structure layer
 
@@ -37,6 +45,11 @@ class StructureLayer:
         self.point_um = point_um
         #: Layer color
         self.color = color
+        #: Cache of sparse masks (see `StructureLayer.to_sparse_mask`)
+        self._mask_cache = OrderedDict()
+        #: Reference masks for translated layers (see
+        #: `StructureLayer.get_translation_key`)
+        self._translation_cache = OrderedDict()
 
     def __getstate__(self):
         gstate = []
@@ -61,6 +74,8 @@ class StructureLayer:
         # option for now.
         self.geometry.clear()
         self.geometry += StructureLayer._geometry_from_dict(state["geometry"])
+        self._mask_cache.clear()
+        self._translation_cache.clear()
 
     def __str__(self):
         return "StructureLayer: {} with {}".format(self.label, self.geometry)
@@ -108,7 +123,16 @@ class StructureLayer:
         y = np.mean([g[0].y for g in self.geometry])
         return np.array([x, y]) * self.point_um
 
-    def copy(self):
+    def copy(self, caches=False):
+        """Return a copy of the layer
+
+        Parameters
+        ----------
+        caches: bool
+            Whether to copy the mask caches (see
+            :func:`StructureLayer.to_sparse_mask`); The cached
+            masks are read-only and shared with the copy.
+        """
         geometry = copy.deepcopy(self.geometry)
         assert isinstance(geometry, list)
         sl = StructureLayer(
@@ -117,6 +141,9 @@ class StructureLayer:
             point_um=self.point_um,
             color=copy.deepcopy(self.color),
         )
+        if caches:
+            sl._mask_cache.update(self._mask_cache)
+            sl._translation_cache.update(self._translation_cache)
         return sl
 
     def extract_data(self, data_source, channels=None):
@@ -137,11 +164,9 @@ class StructureLayer:
         """
         if channels is None:
             channels = sorted(data_source.data_channels.keys())
-        mask = self.to_mask(data_source)
-        data = {}
-        for chn in channels:
-            data[chn] = data_source[chn][mask]
-        return data
+        mask = self.to_sparse_mask(data_source)
+        values = mask.gather_all(data_source[chn] for chn in channels)
+        return dict(zip(channels, values))
 
     def rotate(self, dphi, origin_um=None):
         """Rotate the layer
@@ -158,28 +183,149 @@ class StructureLayer:
         origin = np.array(origin_um) / self.point_um
         for sh, _ in self.geometry:
             sh.rotate(dphi=dphi, origin=origin)
+        self._mask_cache.clear()
+        self._translation_cache.clear()
 
     def set_scale(self, point_um):
         """Scale to new point size in microns"""
         self.point_um = point_um
         for (sh, _) in self.geometry:
             sh.set_scale(point_um)
+        self._mask_cache.clear()
+        self._translation_cache.clear()
 
     def to_mask(self, data_source):
         """Create a binary mask from this structure layer"""
+        return self.to_sparse_mask(data_source).to_dense()
+
+    def get_mask_key(self, data_source):
+        """Return a key that identifies the mask for a data source
+
+        The key is computed from the geometry of the layer and from
+        the image shape, pixel size, and view plane of `data_source`.
+        """
+        return _geometry_key(self.geometry), _image_key(data_source)
+
+    def get_translation_key(self, data_source):
+        """Return a key that identifies the mask up to a translation
+
+        In contrast to :func:`StructureLayer.get_mask_key`, the
+        positions of the shapes are taken relative to the position
+        of the first shape (rounded to `translation_tolerance`).
+
+        Returns
+        -------
+        key: tuple
+            The key
+        reference: np.ndarray
+            The position (x, y) of the first shape [pt]
+        """
+        reference = np.array([self.geometry[0][0].x, self.geometry[0][0].y])
+        key = _geometry_key(self.geometry,
+                            reference=reference,
+                            tolerance=self.translation_tolerance)
+        return (key, _image_key(data_source)), reference
+
+    def to_sparse_mask(self, data_source):
+        """Create a sparse binary mask from this structure layer
+
+        Only the bounding box of the shapes with positive masking
+        factors is rasterized. Masks are cached (see
+        :func:`StructureLayer.get_mask_key`) and are therefore
+        read-only. If the layer was only translated, a previous
+        mask is shifted instead, unless the translation could
+        change the rasterized pixels (see
+        :func:`impose.geometry.shapes.BaseShape.translation_slack`).
+
+        Returns
+        -------
+        mask: impose.geometry.mask.SparseMask
+            Sparse mask with the same True pixels as
+            :func:`StructureLayer.to_mask`
+        """
+        key = self.get_mask_key(data_source)
+        if key in self._mask_cache:
+            self._mask_cache.move_to_end(key)
+        else:
+            tkey, reference = self.get_translation_key(data_source)
+            mask = self._get_translated_mask(data_source, tkey, reference)
+            if mask is None:
+                mask = self._compute_sparse_mask(data_source)
+                mask.mask.flags.writeable = False
+                self._set_translated_mask(data_source, tkey, reference,
+                                          mask)
+            self._mask_cache[key] = mask
+            while len(self._mask_cache) > self.mask_cache_size:
+                self._mask_cache.popitem(last=False)
+        return self._mask_cache[key]
+
+    def _compute_sparse_mask(self, data_source):
         sx, sy = data_source.get_pixel_size()
         dshape = data_source.get_image_shape()
-        accmask = np.zeros(dshape, dtype=int)
-        for ii, (gshape, masking_factor) in enumerate(self.geometry):
-            # The shape is defined with a pixel height (y) of 1.
-            # Since pixel width and height are not equal, we have to
-            # scale the x-value.
-            maski = gshape.to_mask(shape=dshape,
-                                   scale_x=sy/sx,
-                                   scale_y=1,
-                                   )
-            accmask += maski * masking_factor
-        return accmask > 0
+        # The shape is defined with a pixel height (y) of 1.
+        # Since pixel width and height are not equal, we have to
+        # scale the x-value.
+        scale_x = sy / sx
+        # Only shapes with positive masking factors can add pixels.
+        bboxes = [gshape.bounding_box(dshape, scale_x=scale_x, scale_y=1)
+                  for gshape, masking_factor in self.geometry
+                  if masking_factor > 0]
+        bboxes = [bb for bb in bboxes
+                  if bb[0].stop > bb[0].start and bb[1].stop > bb[1].start]
+        if not bboxes:
+            return SparseMask(dshape)
+        region = (slice(min(bb[0].start for bb in bboxes),
+                        max(bb[0].stop for bb in bboxes)),
+                  slice(min(bb[1].start for bb in bboxes),
+                        max(bb[1].stop for bb in bboxes)))
+        accmask = np.zeros((region[0].stop - region[0].start,
+                            region[1].stop - region[1].start),
+                           dtype=int)
+        for gshape, masking_factor in self.geometry:
+            gshape.to_mask(shape=dshape,
+                           scale_x=scale_x,
+                           scale_y=1,
+                           accumulator=accmask,
+                           factor=masking_factor,
+                           region=region,
+                           )
+        return SparseMask(dshape,
+                          offset=(region[0].start, region[1].start),
+                          mask=accmask > 0)
+
+    def _get_translated_mask(self, data_source, tkey, reference):
+        """Shift a reference mask (None if it cannot be used)"""
+        if tkey not in self._translation_cache:
+            return None
+        self._translation_cache.move_to_end(tkey)
+        ref_pos, ref_mask, slack = self._translation_cache[tkey]
+        sx, sy = data_source.get_pixel_size()
+        scale_x = sy / sx
+        # translation in pixels (see `_compute_sparse_mask`)
+        shift = (reference - ref_pos) / np.array([scale_x, 1])
+        ishift = np.rint(shift)
+        # the relative positions of the shapes may differ slightly
+        tol = 2 * self.translation_tolerance / min(scale_x, 1)
+        if np.hypot(*(shift - ishift)) + tol < slack:
+            return ref_mask.shifted(int(ishift[1]), int(ishift[0]))
+        return None
+
+    def _set_translated_mask(self, data_source, tkey, reference, mask):
+        """Use `mask` as reference for translations of this layer"""
+        dshape = data_source.get_image_shape()
+        bbox = mask.bbox
+        if (bbox[0].start <= 0 or bbox[1].start <= 0
+                or bbox[0].stop >= dshape[0] or bbox[1].stop >= dshape[1]):
+            # the mask could be clipped at the image border
+            return
+        sx, sy = data_source.get_pixel_size()
+        slack = min(gshape.translation_slack(dshape, scale_x=sy / sx,
+                                             scale_y=1)
+                    for gshape, _ in self.geometry)
+        if slack > 0:
+            self._translation_cache[tkey] = (reference, mask, slack)
+            while len(self._translation_cache) > self.mask_cache_size:
+                self._translation_cache.popitem(last=False)
 
     def to_point_signature(self):
         """Return geometry as representative points
@@ -198,8 +344,60 @@ class StructureLayer:
         signature = np.array(signature)
         return signature
 
+    def update_caches(self, other):
+        """Add the cached masks of another layer to the mask caches
+
+        This is used to keep the masks that were computed for a
+        copy of this layer (see :func:`StructureLayer.copy`) in a
+        background thread. The cache keys are computed from the
+        geometry (see :func:`StructureLayer.get_mask_key`), so the
+        masks remain valid if this layer was modified in the
+        meantime.
+        """
+        for cache, other_cache in [
+                (self._mask_cache, other._mask_cache),
+                (self._translation_cache, other._translation_cache)]:
+            for key, value in other_cache.items():
+                if key not in cache:
+                    cache[key] = value
+            while len(cache) > self.mask_cache_size:
+                cache.popitem(last=False)
+
     def translate(self, dr_um):
         """Translate the layer by dr_um = (dx, dy) [µm]"""
         dr = np.array(dr_um) / self.point_um
         for sh, _ in self.geometry:
             sh.translate(dr[0], dr[1])
+        self._mask_cache.clear()
+
+
+def _geometry_key(geometry, reference=None, tolerance=None):
+    """Return a hashable key that identifies a layer geometry
+
+    If `reference` is given, the positions of the shapes are taken
+    relative to `reference` and rounded to `tolerance`.
+    """
+    key = []
+    for sh, fact in geometry:
+        if isinstance(sh, gshapes.Polygon):
+            # avoid converting large polygons to lists
+            points = np.asarray(sh.points, dtype=float)
+            if reference is not None:
+                points = np.rint((points - reference) / tolerance)
+            state = {"points": (points.shape, points.tobytes()),
+                     "point_um": float(sh.point_um)}
+        else:
+            state = {kk: float(vv) for kk, vv in sh.__getstate__().items()}
+            if reference is not None:
+                state["x"] = np.rint((state["x"] - reference[0]) / tolerance)
+                state["y"] = np.rint((state["y"] - reference[1]) / tolerance)
+        key.append((sh.__class__.__name__, tuple(sorted(state.items())),
+                    fact))
+    return tuple(key)
+
+
+def _image_key(data_source):
+    """Return a hashable key for the image geometry of a data source"""
+    return (tuple(data_source.get_image_shape()),
+            tuple(float(ps) for ps in data_source.get_pixel_size()),
+            tuple(data_source.metadata["slice"]["view plane"]))
@@ -0,0 +1,157 @@
+import numpy as np
+
+#: Default quantiles computed for the data points of structure layers
+DEFAULT_QUANTILES = (0.25, 0.5, 0.75)
+
+
+class StreamingStatistics:
+    def __init__(self, quantiles=DEFAULT_QUANTILES, sample_size=100000,
+                 seed=42):
+        """Statistics of data points that are added in chunks
+
+        Count, sum, sum of squares, minimum, and maximum are exact.
+        The standard deviation is accumulated from the squared
+        deviations of each chunk from its mean (pairwise update of
+        Chan et al.), which does not suffer from cancellation like
+        the sum of squares. Quantiles are computed from a uniform
+        random sample of the data points (bottom-k sampling with
+        random keys), so they are exact as long as no more than
+        `sample_size` data points were added.
+
+        Parameters
+        ----------
+        quantiles: list of float
+            Quantiles to compute (between 0 and 1)
+        sample_size: int
+            Maximum number of data points kept for quantiles
+        seed: int
+            Seed for the random sample
+        """
+        #: Quantiles to compute
+        self.quantiles = tuple(quantiles)
+        #: Maximum number of data points kept for quantiles
+        self.sample_size = sample_size
+        self.size = 0
+        self.count = 0
+        self.sum = 0.
+        self.sum_sq = 0.
+        #: Sum of squared deviations from the mean
+        self.m2 = 0.
+        self.min = np.inf
+        self.max = -np.inf
+        self._rng = np.random.default_rng(seed)
+        self._sample = np.zeros(0)
+        self._keys = np.zeros(0)
+
+    def get_statistics(self):
+        """Return the statistics as a dictionary
+
+        See :func:`compute_statistics` for the keys.
+        """
+        if self.count and self.quantiles:
+            qvalues = np.quantile(self._sample, self.quantiles)
+        else:
+            qvalues = [np.nan] * len(self.quantiles)
+        return _get_statistics(size=self.size,
+                               count=self.count,
+                               vsum=self.sum,
+                               vsum_sq=self.sum_sq,
+                               m2=self.m2,
+                               vmin=self.min,
+                               vmax=self.max,
+                               quantiles=self.quantiles,
+                               qvalues=qvalues)
+
+    def update(self, values):
+        """Add data points (NaN values are counted, but ignored)"""
+        values = np.ravel(values)
+        valid = values[~np.isnan(values)]
+        self.size += values.size
+        if valid.size == 0:
+            return
+        # combine the mean and squared deviations with those of `valid`
+        vsum = float(np.sum(valid, dtype=float))
+        vmean = vsum / valid.size
+        vm2 = float(np.sum(np.square(np.subtract(valid, vmean,
+                                                 dtype=float))))
+        if self.count:
+            delta = vmean - self.sum / self.count
+            self.m2 += vm2 + delta**2 * (self.count * valid.size
+                                         / (self.count + valid.size))
+        else:
+            self.m2 = vm2
+        self.count += valid.size
+        self.sum += vsum
+        self.sum_sq += float(np.sum(np.square(valid, dtype=float)))
+        self.min = min(self.min, float(np.min(valid)))
+        self.max = max(self.max, float(np.max(valid)))
+        if self.quantiles:
+            sample = np.concatenate([self._sample, valid])
+            keys = np.concatenate([self._keys, self._rng.random(valid.size)])
+            if sample.size > self.sample_size:
+                keep = np.argpartition(keys, self.sample_size)
+                keep = keep[:self.sample_size]
+                sample = sample[keep]
+                keys = keys[keep]
+            self._sample = sample
+            self._keys = keys
+
+
+def compute_statistics(values, quantiles=DEFAULT_QUANTILES):
+    """Compute statistics of data points
+
+    NaN values are ignored.
+
+    Returns
+    -------
+    stats: dict
+        Dictionary with the keys "size" (number of data points),
+        "count" (number of non-NaN data points), "sum", "sum of
+        squares", "min", "max", "mean", "std", and "quantile q"
+        for every q in `quantiles`
+    """
+    values = np.ravel(values)
+    valid = values[~np.isnan(values)]
+    if valid.size:
+        # two-pass computation of the squared deviations
+        m2 = float(np.sum(np.square(
+            np.subtract(valid, np.mean(valid, dtype=float), dtype=float))))
+        vmin = float(np.min(valid))
+        vmax = float(np.max(valid))
+        qvalues = np.quantile(valid, quantiles) if quantiles else []
+    else:
+        m2 = vmin = vmax = np.nan
+        qvalues = [np.nan] * len(quantiles)
+    return _get_statistics(size=values.size,
+                           count=valid.size,
+                           vsum=float(np.sum(valid, dtype=float)),
+                           vsum_sq=float(np.sum(np.square(valid,
+                                                          dtype=float))),
+                           m2=m2,
+                           vmin=vmin,
+                           vmax=vmax,
+                           quantiles=quantiles,
+                           qvalues=qvalues)
+
+
+def _get_statistics(size, count, vsum, vsum_sq, m2, vmin, vmax, quantiles,
+                    qvalues):
+    if count:
+        mean = vsum / count
+        # population standard deviation
+        std = np.sqrt(m2 / count)
+    else:
+        mean = std = vmin = vmax = np.nan
+    stats = {
+        "size": int(size),
+        "count": int(count),
+        "sum": vsum,
+        "sum of squares": vsum_sq,
+        "min": vmin,
+        "max": vmax,
+        "mean": mean,
+        "std": std,
+    }
+    for qq, qv in zip(quantiles, qvalues):
+        stats[f"quantile {qq:g}"] = float(qv)
+    return stats
@@ -0,0 +1,183 @@
+import copy
+import json
+import pathlib
+import shutil
+import tempfile
+
+import numpy as np
+
+from impose import batch, data, session
+
+
+data_path = pathlib.Path(__file__).parent / "data"
+
+
+def get_session():
+    td = pathlib.Path(tempfile.mkdtemp(prefix="impose_batch_"))
+    for name in ["brillouin.impose-session", "brillouin.h5"]:
+        shutil.copy2(data_path / name, td / name)
+    return td / "brillouin.impose-session"
+
+
+def test_batch_run():
+    spath = get_session()
+    out = spath.parent / "output"
+    progress = []
+    summary = batch.run_batch(
+        spath, out, workers=1,
+        callback=lambda job, done, total, error: progress.append(
+            (job.name, done, total, error)))
+    assert summary == {"completed": ["brillouin"],
+                       "skipped": [],
+                       "failed": []}
+    assert progress == [("brillouin", 1, 1, None)]
+    assert (out / "brillouin.impose-composite").exists()
+    assert (out / batch.PROGRESS_FILE).exists()
+    # compare with the session
+    ses = session.ImposeSession()
+    ses.load(spath)
+    ds = ses.colocalize.data_sources[0]
+    sc = ses.colocalize.strucure_composites_manual[0]
+    ed = sc.extract_data(ds)
+    for sl in sc:
+        arr = np.loadtxt(out / f"brillouin_{sl.label}.tsv", ndmin=2)
+        assert arr.shape[0] == ed[sl.label]["BrillouinShift"].size
+
+
+def test_batch_resume():
+    spath = get_session()
+    out = spath.parent / "output"
+    summary = batch.run_batch(spath, out, workers=1)
+    assert summary["completed"] == ["brillouin"]
+    # resume
+    summary = batch.run_batch(spath, out, workers=1)
+    assert summary == {"completed": [],
+                       "skipped": ["brillouin"],
+                       "failed": []}
+    # disable resume
+    summary = batch.run_batch(spath, out, workers=1, resume=False)
+    assert summary["completed"] == ["brillouin"]
+    # missing output files are recomputed
+    (out / "brillouin.impose-composite").unlink()
+    summary = batch.run_batch(spath, out, workers=1)
+    assert summary["completed"] == ["brillouin"]
+    assert (out / "brillouin.impose-composite").exists()
+
+
+def test_batch_job_key():
+    with (data_path / "brillouin.impose-session").open() as fd:
+        state = json.load(fd)
+    key = batch.get_jobs(state)[0].key
+    # the path does not change the key
+    dss = state["colocalization"]["data sources"][0]
+    dss["path"] = "/moved/brillouin.h5"
+    assert batch.get_jobs(state)[0].key == key
+    # the view slice changes the key
+    dss["metadata"]["slice"]["view slice"] += 1
+    assert batch.get_jobs(state)[0].key != key
+    # the key is not changed by running the job
+    spath = get_session()
+    job = batch.get_jobs(session.ImposeSession.load_state(spath))[0]
+    key = job.key
+    job.run(spath.parent)
+    assert job.key == key
+
+
+def test_batch_process_pool():
+    spath = get_session()
+    out = spath.parent / "output"
+    assert batch.main([str(spath), str(out), "-j", "2"]) == 0
+    ref = spath.parent / "ref"
+    batch.run_batch(spath, ref, workers=1)
+    names = sorted(pp.name for pp in ref.glob("brillouin*"))
+    assert names == sorted(pp.name for pp in out.glob("brillouin*"))
+    for name in names:
+        assert (ref / name).read_bytes() == (out / name).read_bytes()
+
+
+def test_batch_failed(monkeypatch):
+    spath = get_session()
+    out = spath.parent / "output"
+
+    def export_tsv(*args, **kwargs):
+        raise ValueError("export failed")
+
+    monkeypatch.setattr(batch.export, "export_tsv", export_tsv)
+    errors = []
+    summary = batch.run_batch(
+        spath, out, workers=1,
+        callback=lambda job, done, total, error: errors.append(error))
+    assert summary == {"completed": [],
+                       "skipped": [],
+                       "failed": ["brillouin"]}
+    assert "export failed" in errors[0]
+    assert batch.load_progress(out) == {}
+    # failed jobs are run again
+    monkeypatch.undo()
+    summary = batch.run_batch(spath, out, workers=1)
+    assert summary["completed"] == ["brillouin"]
+
+
+def test_batch_missing_file():
+    spath = get_session()
+    out = spath.parent / "output"
+    # add a data source whose data file does not exist
+    with spath.open() as fd:
+        state = json.load(fd)
+    coloc = state["colocalization"]
+    dss = copy.deepcopy(coloc["data sources"][0])
+    dss["path"] = str(spath.parent / "missing" / "other.h5")
+    coloc["data sources"].append(dss)
+    coloc["structure composites manual"].append(
+        coloc["structure composites manual"][0])
+    with spath.open("w") as fd:
+        json.dump(state, fd)
+    progress = []
+    summary = batch.run_batch(
+        spath, out, workers=1,
+        callback=lambda job, done, total, error: progress.append(
+            (job.name, done, total, error)))
+    assert summary == {"completed": ["brillouin"],
+                       "skipped": [],
+                       "failed": ["other"]}
+    assert progress[0][:3] == ("other", 1, 2)
+    assert "Could not find file 'other.h5'" in progress[0][3]
+    assert progress[1] == ("brillouin", 2, 2, None)
+
+
+def test_batch_format():
+    spath = get_session()
+    out = spath.parent / "output"
+    assert batch.main([str(spath), str(out), "-j", "1", "-f", "hdf5"]) == 0
+    assert (out / "brillouin.impose-data.h5").exists()
+    assert not (out / "brillouin.impose-composite").exists()
+    # a different format is not skipped
+    summary = batch.run_batch(spath, out, fmt="npz", workers=1)
+    assert summary["completed"] == ["brillouin"]
+    assert (out / "brillouin.impose-data.npz").exists()
+
+
+def test_batch_no_data_in_parent(monkeypatch):
+    spath = get_session()
+    out = spath.parent / "output"
+
+    def initialize(*args, **kwargs):
+        raise AssertionError("data must only be loaded by the workers")
+
+    # the worker processes do not inherit this patch ("spawn")
+    monkeypatch.setattr(data.DataSource, "_initialize_from_path", initialize)
+    summary = batch.run_batch(spath, out, workers=2)
+    assert summary["completed"] == ["brillouin"]
+
+
+def test_batch_process_pool_traceback():
+    spath = get_session()
+    out = spath.parent / "output"
+    errors = []
+    summary = batch.run_batch(
+        spath, out, fmt="unknown", workers=2,
+        callback=lambda job, done, total, error: errors.append(error))
+    assert summary["failed"] == ["brillouin"]
+    # the traceback of the worker process is included
+    assert "in export_data" in errors[0]
+    assert "Unknown export format 'unknown'" in errors[0]
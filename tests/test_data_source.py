@@ -1,3 +1,4 @@
+import copy
 import pathlib
 import shutil
 import tempfile
@@ -6,7 +7,7 @@ import h5py
 import numpy as np
 import pytest
 
-from impose import data
+from impose import data, flblend, formats
 
 
 data_path = pathlib.Path(__file__).parent / "data"
@@ -30,6 +31,27 @@ def test_ds_base():
     assert ds.data_channels["BrillouinShift"][0, 10, 20] == 44.53328501973178
 
 
+def test_ds_lazy_channel_data():
+    path = data_path / "brillouin.h5"
+    ds = data.DataSource(path)
+    cdat = ds.data_channels["BrillouinShift"]
+    # data are read from disk on demand
+    assert isinstance(cdat, formats.lazy.LazyChannel)
+    with h5py.File(path) as h5:
+        axes = np.bytes_(h5["BrillouinShift"].attrs["axisOrder"]).decode()
+        ref = h5["BrillouinShift"][:].transpose(
+            [axes.index(ax) for ax in "XYZ"])
+    assert cdat.shape == ref.shape
+    assert np.all(np.asarray(cdat) == ref)
+    assert np.all(cdat[0, 3:10, ::2] == ref[0, 3:10, ::2])
+    assert np.all(cdat[..., -1] == ref[..., -1])
+    # only the current view slice is returned
+    assert np.all(ds.get_channel_data("BrillouinShift") == ref[0])
+    assert np.all(ds.get_channel_data("BrillouinShift", step=3)
+                  == ref[0, ::3, ::3])
+    assert ds.get_image_shape() == (51, 71)
+
+
 def test_ds_equal():
     path = data_path / "brillouin.h5"
     ds = data.DataSource(path)
@@ -61,6 +83,19 @@ def test_ds_get_voxel_depth():
     assert np.isnan(vd), "because it is 2D"
 
 
+def test_ds_get_view():
+    path = data_path / "brillouin.h5"
+    ds = data.DataSource(path)
+    view = ds.get_view()
+    assert view == ds
+    assert view.data_channels is ds.data_channels
+    assert view._snapshot_cache is ds._snapshot_cache
+    # changes of the metadata do not affect the view
+    ds.update_metadata({"stack": {"pixel size y": 3}})
+    assert view.metadata["stack"]["pixel size y"] == 2
+    assert np.allclose(view.get_pixel_size(), [2, 2])
+
+
 def test_update_metadata():
     path = data_path / "brillouin.h5"
     ds = data.DataSource(path)
@@ -86,6 +121,318 @@ def test_ds_with_nans():
     assert np.allclose(img[0][1][0], 0.14016421516699523, atol=0)
 
 
+def test_load_data_sources():
+    """Load multiple data sources concurrently"""
+    tmp = pathlib.Path(tempfile.mkdtemp(prefix="impose_tests_"))
+    paths = []
+    for ii in range(5):
+        pi = tmp / f"brillouin_{ii}.h5"
+        shutil.copy2(data_path / "brillouin.h5", pi)
+        paths.append(pi)
+    dss = data.load_data_sources(paths, workers=3)
+    assert [ds.path for ds in dss] == [pp.resolve() for pp in paths]
+    assert dss[0] == data.DataSource(paths[0])
+
+
+def test_load_data_sources_exceptions():
+    """Errors are raised or returned in the order of the paths"""
+    paths = [data_path / "brillouin.h5",
+             data_path / "does-not-exist.h5",
+             data_path / "brillouin.h5"]
+    with pytest.raises(FileNotFoundError, match="does-not-exist.h5"):
+        data.load_data_sources(paths, workers=2)
+    dss = data.load_data_sources(paths, workers=2, return_exceptions=True)
+    assert isinstance(dss[0], data.DataSource)
+    assert isinstance(dss[1], FileNotFoundError)
+    assert isinstance(dss[2], data.DataSource)
+
+
+def test_load_data_sources_states():
+    """States are applied to the loaded data sources"""
+    path = data_path / "brillouin.h5"
+    ds = data.DataSource(path)
+    ds.update_metadata({"blend": {"mode": "rgb"}})
+    state = ds.__getstate__()
+    dss = data.load_data_sources([path, path], states=[state, None])
+    assert dss[0] == ds
+    assert dss[1].metadata["blend"]["mode"] == "hsv"
+
+
+def test_ds_snapshot_cache():
+    """Blended images are only computed once"""
+    path = data_path / "brillouin.h5"
+    ds = data.DataSource(path)
+    img1 = ds.get_image()
+    assert not img1.flags.writeable
+    assert ds.get_image() is img1
+    # changing the visualization yields a new image
+    ds.metadata["channels"]["BrillouinShift"]["brightness"] = 50
+    img2 = ds.get_image()
+    assert img2 is not img1
+    assert not np.allclose(img1, img2, equal_nan=True)
+    # going back to the original settings uses the cache
+    ds.metadata["channels"]["BrillouinShift"]["brightness"] = 128
+    assert ds.get_image() is img1
+    assert len(ds._snapshot_cache) == 2
+
+
+def test_ds_snapshot_cache_budget():
+    cache = data.SnapshotCache(max_bytes=250)
+    for ii in range(4):
+        cache.put(ii, np.zeros(10))  # 80 bytes each
+    assert cache.nbytes == 240
+    assert 0 not in cache
+    assert cache.get(1) is not None
+    cache.put(4, np.zeros(10))
+    # 1 was used recently, so 2 is removed
+    assert 1 in cache
+    assert 2 not in cache
+    # images larger than the budget are not cached
+    cache.put(5, np.zeros(100))
+    assert 5 not in cache
+    assert len(cache) == 3
+
+
+def test_ds_snapshot_cache_keep():
+    cache = data.SnapshotCache(max_bytes=250)
+    for ii in range(3):
+        cache.put(ii, np.zeros(10))  # 80 bytes each
+    # 0 is the least-recently used snapshot, but it is kept
+    cache.put(3, np.zeros(10), keep=[0])
+    assert 0 in cache
+    assert 1 not in cache
+    # images are not added if there is no room besides the kept images
+    cache.put(4, np.zeros(20), keep=[0, 2, 3])
+    assert 4 not in cache
+    assert cache.nbytes == 240
+
+
+def test_ds_contrast_range_cache(monkeypatch):
+    """Autocontrast ranges are only computed once per slice"""
+    path = data_path / "brillouin.h5"
+    ds = data.DataSource(path)
+    calls = []
+
+    def get_contrast_range(image):
+        calls.append(image.shape)
+        return np.nanmin(image), np.nanmax(image)
+
+    def get_contrast_range_stack(get_slices):
+        calls.append("stack")
+        return get_contrast_range(np.array(list(get_slices())))
+    monkeypatch.setattr(data, "get_contrast_range", get_contrast_range)
+    monkeypatch.setattr(data, "get_contrast_range_stack",
+                        get_contrast_range_stack)
+    ds.get_image()
+    ds.metadata["channels"]["BrillouinShift"]["brightness"] = 50
+    ds.get_image()
+    assert calls == [(51, 71)]
+    # stack mode uses the entire channel
+    ds.metadata["blend"]["autocontrast"] = "stack"
+    ds.get_image()
+    ds.metadata["channels"]["BrillouinShift"]["hue"] = 10
+    ds.get_image()
+    assert calls == [(51, 71), "stack", (1, 51, 71)]
+
+
+def test_ds_contrast_range_stack():
+    """The stack autocontrast range is computed slice by slice"""
+    ds = get_stack_data_source(size=5)
+    stacks = {name: np.array(ds.data_channels[name])
+              for name in ds.data_channels}
+
+    class NoFullRead:
+        def __init__(self, data):
+            self.data = data
+            self.shape = data.shape
+
+        def __array__(self, *args, **kwargs):
+            raise AssertionError("the entire stack must not be read")
+
+        def __getitem__(self, item):
+            return self.data[item]
+
+    for name in ds.data_channels:
+        ds.data_channels[name] = NoFullRead(stacks[name])
+    ds.metadata["blend"]["autocontrast"] = "stack"
+    for name in ds.data_channels:
+        assert np.allclose(ds.get_contrast_range(name),
+                           flblend.get_contrast_range(stacks[name]))
+    # a subsample of the slices is used for large stacks
+    ds._contrast_cache.clear()
+    ds.contrast_stack_slices = 2
+    name = list(ds.data_channels.keys())[0]
+    assert np.allclose(ds.get_contrast_range(name),
+                       flblend.get_contrast_range(stacks[name][[0, 4]]))
+
+
+def test_ds_snapshot_dtype():
+    path = data_path / "brillouin.h5"
+    ds = data.DataSource(path)
+    img64 = ds.get_image()
+    img32 = ds.get_image(dtype=np.float32)
+    assert img64.dtype == np.float64
+    assert img32.dtype == np.float32
+    assert np.allclose(img64, img32, atol=1e-6, rtol=0, equal_nan=True)
+    # both images are cached
+    assert ds.get_image() is img64
+    assert ds.get_image(dtype=np.float32) is img32
+
+
+def test_ds_snapshot_metadata():
+    """Images can be rendered for a copy of the metadata"""
+    path = data_path / "brillouin.h5"
+    ds = data.DataSource(path)
+    img1 = ds.get_image()
+    meta = copy.deepcopy(ds.metadata)
+    meta["channels"]["BrillouinShift"]["brightness"] = 50
+    assert ds.get_image(metadata=meta, cache_only=True) is None
+    img2 = ds.get_image(metadata=meta)
+    assert not np.allclose(img1, img2, equal_nan=True)
+    # the metadata and the current snapshot are not modified
+    assert ds.metadata["channels"]["BrillouinShift"]["brightness"] == 128
+    assert ds.snapshot is img1
+    # the image is cached
+    ds.metadata["channels"]["BrillouinShift"]["brightness"] = 50
+    assert ds.get_image(cache_only=True) is img2
+    assert ds.snapshot is img2
+
+
+def test_ds_snapshot_preview():
+    path = data_path / "brillouin.h5"
+    ds = data.DataSource(path)
+    full = ds.get_image()
+    prev = ds.get_image(preview=2)
+    assert prev.shape == (26, 36, 3)
+    # same autocontrast as the full-resolution image
+    assert np.allclose(prev, full[::2, ::2], equal_nan=True)
+    assert ds.snapshot is full
+    assert ds.get_image(preview=2, cache_only=True) is prev
+    assert ds.get_image(preview=4, cache_only=True) is None
+    with pytest.raises(ValueError, match="Invalid preview level"):
+        ds.get_image(preview=0)
+
+
+def test_ds_snapshot_preview_strided(monkeypatch):
+    path = data_path / "brillouin.h5"
+    ds = data.DataSource(path)
+    keys = []
+    read_orig = formats.fmt_bm_bmlab.LazyChannelH5.read
+
+    def read(self, key):
+        keys.append(key)
+        return read_orig(self, key)
+
+    monkeypatch.setattr(formats.fmt_bm_bmlab.LazyChannelH5, "read", read)
+    # only every 4th pixel is read for previews
+    prev = ds.get_image(preview=4)
+    assert prev.shape == (13, 18, 3)
+    assert keys
+    assert all(kk[1].step == 4 and kk[2].step == 4 for kk in keys)
+    # the autocontrast range was estimated from the preview
+    assert not ds._contrast_cache
+
+
+def get_stack_data_source(size=5):
+    """Brillouin data source with a synthetic stack along the cut axis"""
+    ds = data.DataSource(data_path / "brillouin.h5")
+    for name in ds.data_channels:
+        image = ds.get_channel_data(name)
+        ds.data_channels[name] = np.stack(
+            [image + ii for ii in range(size)], axis=0)
+    ds.metadata["stack"]["shape"] = ds.data_channels[name].shape
+    ds.metadata["slice"]["view slice"] = 2
+    return ds
+
+
+def test_ds_prefetch_slices():
+    assert data.get_prefetch_slices(5, 10) == [6, 4, 7, 3]
+    assert data.get_prefetch_slices(5, 10, direction=1) == [6, 7, 4]
+    assert data.get_prefetch_slices(5, 10, direction=-1,
+                                    radius=3) == [4, 3, 2, 6]
+    assert data.get_prefetch_slices(0, 3, direction=-1) == [1]
+    assert data.get_prefetch_slices(0, 1) == []
+
+
+def test_ds_prefetcher():
+    ds = get_stack_data_source(size=8)
+    pf = data.SlicePrefetcher(radius=2, dtype=np.float32)
+
+    def cached(view_slice):
+        meta = copy.deepcopy(ds.metadata)
+        meta["slice"]["view slice"] = view_slice
+        image = ds.get_image(dtype=np.float32, metadata=meta,
+                             cache_only=True)
+        return image is not None
+
+    pf.update(ds, copy.deepcopy(ds.metadata))
+    pf.wait()
+    assert pf.direction == 0
+    assert [cached(ii) for ii in range(8)] == \
+        [True, True, False, True, True, False, False, False]
+    # moving forward prefetches slices ahead
+    ds.metadata["slice"]["view slice"] = 3
+    pf.update(ds, copy.deepcopy(ds.metadata))
+    pf.wait()
+    assert pf.direction == 1
+    assert cached(5)
+    assert not cached(6)
+    # the prefetched images are the same as the rendered images
+    meta = copy.deepcopy(ds.metadata)
+    meta["slice"]["view slice"] = 5
+    image = ds.get_image(dtype=np.float32, metadata=meta)
+    ds.metadata["slice"]["view slice"] = 5
+    assert ds.get_image(dtype=np.float32) is image
+    # changing the visualization resets the direction
+    ds.metadata["channels"]["BrillouinShift"]["brightness"] = 50
+    pf.update(ds, copy.deepcopy(ds.metadata))
+    pf.wait()
+    assert pf.direction == 0
+    assert cached(6)
+    assert cached(7)
+    pf.shutdown()
+
+
+def test_ds_prefetcher_budget():
+    ds = get_stack_data_source(size=8)
+    current = ds.get_image(dtype=np.float32)
+    # room for three images
+    ds._snapshot_cache.max_bytes = 3 * current.nbytes
+    pf = data.SlicePrefetcher(radius=2, dtype=np.float32)
+    pf.update(ds, copy.deepcopy(ds.metadata))
+    pf.wait()
+    # only two slices are prefetched and the current image is kept
+    assert len(ds._snapshot_cache) == 3
+    assert ds.get_image(dtype=np.float32, cache_only=True) is current
+    for view_slice, cached in [(1, True), (3, True), (0, False),
+                               (4, False)]:
+        meta = copy.deepcopy(ds.metadata)
+        meta["slice"]["view slice"] = view_slice
+        image = ds.get_image(dtype=np.float32, metadata=meta,
+                             cache_only=True)
+        assert (image is not None) == cached
+    pf.shutdown()
+
+
+def test_ds_prefetcher_cancel(monkeypatch):
+    ds = get_stack_data_source(size=8)
+    pf = data.SlicePrefetcher(radius=3)
+    calls = []
+    get_image = ds.get_image
+
+    def get_image_cancel(*args, **kwargs):
+        calls.append(kwargs["metadata"]["slice"]["view slice"])
+        # cancel prefetching (e.g. channel selection changed)
+        pf.cancel()
+        return get_image(*args, **kwargs)
+
+    monkeypatch.setattr(ds, "get_image", get_image_cancel)
+    pf.update(ds, copy.deepcopy(ds.metadata))
+    pf.wait()
+    assert calls == [3]
+    pf.shutdown()
+
+
 def test_ds_signature_wrong():
     """Test whether bad signature raises warning"""
     path = data_path / "brillouin.h5"
@@ -0,0 +1,80 @@
+import json
+import pathlib
+import tempfile
+
+import numpy as np
+import pytest
+
+from impose import data, export
+from impose.structure import StructureComposite
+
+
+data_path = pathlib.Path(__file__).parent / "data"
+
+
+def get_composite():
+    with (data_path / "brillouin.impose-composite").open() as fd:
+        state = json.load(fd)
+    sc = StructureComposite()
+    sc.__setstate__(state)
+    return sc
+
+
+def test_export_tsv():
+    td = pathlib.Path(tempfile.mkdtemp(prefix="impose_export_"))
+    ds = data.DataSource(data_path / "brillouin.h5")
+    sc = get_composite()
+    paths = export.export_tsv(td, data_source=ds, structure_composite=sc)
+    assert paths[-1] == td / "brillouin.impose-composite"
+    assert len(paths) == len(sc) + 1
+    ed = sc.extract_data(ds)
+    for sl, pp in zip(sc, paths):
+        assert pp == td / f"brillouin_{sl.label}.tsv"
+        with pp.open() as fd:
+            header = fd.readline().strip("# \r\n").split("\t")
+        assert header == sorted(ds.data_channels.keys())
+        arr = np.loadtxt(pp, ndmin=2)
+        assert arr.shape == (ed[sl.label][header[0]].size, len(header))
+        for ii, chn in enumerate(header):
+            assert np.allclose(arr[:, ii], ed[sl.label][chn],
+                               rtol=1e-4, equal_nan=True)
+    with paths[-1].open() as fd:
+        sc2 = StructureComposite()
+        sc2.__setstate__(json.load(fd))
+    assert sc2 == sc
+
+
+@pytest.mark.parametrize("fmt", ["hdf5", "npz"])
+def test_export_data(fmt):
+    td = pathlib.Path(tempfile.mkdtemp(prefix="impose_export_"))
+    ds = data.DataSource(data_path / "brillouin.h5")
+    sc = get_composite()
+    path = export.export_data(td, data_source=ds, structure_composite=sc,
+                              fmt=fmt)
+    assert path == td / f"brillouin{export.EXPORT_SUFFIXES[fmt]}"
+    edata, sc2, meta = export.load_data(path)
+    assert sc2 == sc
+    assert meta["data signature"] == ds.signature
+    assert meta["image shape"] == list(ds.get_image_shape())
+    assert meta["channels"] == sorted(ds.data_channels.keys())
+    assert list(edata.keys()) == [sl.label for sl in sc]
+    ed = sc.extract_data(ds)
+    for sl in sc:
+        # pixel coordinates
+        mask = sl.to_mask(ds)
+        rows, cols = np.nonzero(mask)
+        assert np.all(edata[sl.label]["row"] == rows)
+        assert np.all(edata[sl.label]["column"] == cols)
+        # lossless
+        for chn in meta["channels"]:
+            assert np.array_equal(edata[sl.label][chn], ed[sl.label][chn],
+                                  equal_nan=True)
+
+
+def test_export_data_invalid():
+    ds = data.DataSource(data_path / "brillouin.h5")
+    with pytest.raises(ValueError, match="Unknown export format"):
+        export.export_data(tempfile.mkdtemp(), data_source=ds,
+                           structure_composite=get_composite(), fmt="csv")
+    with pytest.raises(ValueError, match="Unknown export file format"):
+        export.load_data(data_path / "brillouin.h5")
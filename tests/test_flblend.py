@@ -3,6 +3,8 @@ import pathlib
 import numpy as np
 import pytest
 
+from skimage.color import rgb2hsv
+
 from impose import flblend
 
 
@@ -16,6 +18,33 @@ def test_flb_shape():
     assert fb.shape == (10, 100)
 
 
+def test_flb_contrast_range():
+    image = np.linspace(0, 1, 1000).reshape(10, 100)
+    crange = flblend.get_contrast_range(image)
+    # 31 bins; edges of the bins closest to 1% and 99%
+    assert np.allclose(crange, (0, 30 / 31), atol=1e-15, rtol=0)
+    assert flblend.get_contrast_range(np.full((10, 10), np.nan)) is None
+    # precomputed range yields the same result
+    fb1 = flblend.FlBlend()
+    fb1.add_image(image, hue=150)
+    fb2 = flblend.FlBlend()
+    fb2.add_image(image, hue=150, contrast_range=crange)
+    assert np.all(fb1.blend() == fb2.blend())
+
+
+def test_flb_contrast_range_stack():
+    rng = np.random.default_rng(42)
+    stack = rng.normal(size=(5, 20, 30))
+    stack[1, :5] = np.nan
+    stack[3] = np.nan
+    # same result as for the entire stack
+    assert np.allclose(flblend.get_contrast_range_stack(lambda: iter(stack)),
+                       flblend.get_contrast_range(stack),
+                       atol=1e-12, rtol=0)
+    nans = np.full((2, 10, 10), np.nan)
+    assert flblend.get_contrast_range_stack(lambda: iter(nans)) is None
+
+
 def test_flb_blend_no_image_data():
     fb = flblend.FlBlend()
     with pytest.warns(flblend.NoImageDataWarning, match="No image data"):
@@ -59,6 +88,65 @@ def test_flb_blend_rgb():
     assert (rgb_nan == rgb).all()
 
 
+@pytest.mark.parametrize("mode", ["hsv", "rgb"])
+def test_flb_blend_many_channels(mode):
+    """Compare running-sum blending with single-image HSV conversion"""
+    rng = np.random.default_rng(42)
+    fb = flblend.FlBlend()
+    for ii in range(5):
+        image = rng.random((20, 30))
+        image[rng.random((20, 30)) < .2] = np.nan
+        fb.add_image(image, hue=ii*50, brightness=100 + ii*10)
+    rgb = fb.blend(mode=mode)
+    assert rgb.shape == (20, 30, 3)
+    # reference values from per-channel RGB/HSV stacks
+    stack_rgb = np.array([flim.get_rgb() for flim in fb.images])
+    if mode == "rgb":
+        assert np.allclose(rgb, np.nanmean(stack_rgb, axis=0),
+                           atol=1e-6, rtol=0, equal_nan=True)
+    else:
+        stack_hsv = np.array([flim.get_hsv() for flim in fb.images])
+        stack_v = stack_hsv[:, :, :, 2]
+        # circular mean of the hue weighted with the value
+        angle = stack_hsv[:, :, :, 0] * 2 * np.pi
+        ref_hue = np.arctan2(np.nanmean(np.sin(angle) * stack_v, axis=0),
+                             np.nanmean(np.cos(angle) * stack_v, axis=0)
+                             ) / 2 / np.pi % 1
+        sum_v = np.nansum(stack_v, axis=0)
+        ref_sat = 1 - sum_v / np.nanmax(sum_v)
+        hsv = rgb2hsv(rgb)
+        assert np.allclose(hsv[:, :, 2], np.nanmean(stack_v, axis=0),
+                           atol=1e-6, rtol=0)
+        # the hue is only defined for colored pixels
+        colored = hsv[:, :, 1] > 1e-3
+        assert np.sum(colored) > 500
+        dhue = (hsv[:, :, 0] - ref_hue + .5) % 1 - .5
+        assert np.allclose(dhue[colored], 0, atol=1e-4, rtol=0)
+        assert np.allclose(hsv[:, :, 1][colored], ref_sat[colored],
+                           atol=1e-5, rtol=0)
+
+
+@pytest.mark.parametrize("mode", ["hsv", "rgb"])
+@pytest.mark.parametrize("nimg", [1, 3])
+def test_flb_blend_dtype(mode, nimg):
+    fb = flblend.FlBlend()
+    for ii in range(nimg):
+        image = np.linspace(0, 1, 100).reshape(10, 10)
+        image[0, :] = np.nan
+        fb.add_image(np.roll(image, ii, axis=1), hue=ii*80, brightness=150)
+    rgb64 = fb.blend(mode=mode)
+    rgb32 = fb.blend(mode=mode, dtype=np.float32)
+    rgb8 = fb.blend(mode=mode, dtype=np.uint8)
+    assert rgb64.dtype == np.float64
+    assert rgb32.dtype == np.float32
+    assert rgb8.dtype == np.uint8
+    assert np.allclose(rgb64, rgb32, atol=1e-5, rtol=0, equal_nan=True)
+    # uint8 is clipped and NaN values are zero
+    ref8 = np.rint(np.clip(np.nan_to_num(rgb64), 0, 1) * 255)
+    assert np.max(np.abs(rgb8 - ref8)) <= 1
+    assert np.all(rgb8[0] == 0)
+
+
 def test_fli_get_hsv():
     image = np.linspace(.1, .9, 100).reshape(10, 10)
     fi = flblend.FlImage(image=image, hue=123)
@@ -112,6 +200,26 @@ def test_fli_uint8():
     assert np.all(fi1.get_rgb() == fi2.get_rgb())
 
 
+@pytest.mark.parametrize("dtype", [np.uint8, np.uint16])
+def test_fli_lut(dtype):
+    """Lookup tables yield the same result as float images"""
+    rng = np.random.default_rng(42)
+    image = rng.integers(0, 200, size=(10, 20)).astype(dtype)
+    in_range = (20, 180)
+    fi1 = flblend.FlImage(image=image, hue=30, brightness=100,
+                          in_range=in_range)
+    assert fi1.use_lut
+    fi2 = flblend.FlImage(image=image.astype(float), hue=30, brightness=100,
+                          in_range=in_range)
+    assert not fi2.use_lut
+    assert np.all(fi1.get_intensity() == fi2.get_intensity())
+    assert np.all(fi1.get_rgb() == fi2.get_rgb())
+    assert np.all(fi1.get_rgb(dtype=np.uint8) == fi2.get_rgb(dtype=np.uint8))
+    assert fi1.get_intensity_lut().shape == (np.iinfo(dtype).max + 1,)
+    with pytest.raises(ValueError, match="No lookup table"):
+        fi2.get_intensity_lut()
+
+
 if __name__ == "__main__":
     # Run all tests
     loc = locals()
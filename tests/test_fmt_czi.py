@@ -2,6 +2,7 @@ import pathlib
 import tempfile
 import zipfile
 
+import czifile
 import numpy as np
 
 from impose import formats
@@ -34,3 +35,27 @@ def test_load_czi():
     assert data["mCher"][10, 10, 0] == 1
     assert data["mCher"][205, 227, 0] == 255
     assert data["mCher"][113, 206, 0] == 123
+
+
+def test_signature_czi():
+    path = get_czi()
+    _, meta = formats.load(path)
+    # signature without decoding the data
+    assert formats.get_signature(path) == meta["signature"]
+
+
+def test_load_czi_lazy():
+    """Channel data are only decoded when sliced"""
+    path = get_czi()
+    data, _ = formats.load(path)
+    assert isinstance(data["mCher"], formats.lazy.LazyChannel)
+    # compare with the data decoded by czifile
+    with czifile.CziFile(path) as czi:
+        ref = czi.asarray()
+        cid = czi.axes.index("C")
+    # "mCher" is the first channel
+    ref_mcher = np.take(ref, 0, axis=cid).squeeze().transpose()
+    assert np.all(np.asarray(data["mCher"])[:, :, 0] == ref_mcher)
+    assert np.all(data["mCher"][:, :, 0] == ref_mcher)
+    assert np.all(data["mCher"][100:120, 7, 0] == ref_mcher[100:120, 7])
+    assert np.all(data["mCher"][::3, -5:, 0] == ref_mcher[::3, -5:])
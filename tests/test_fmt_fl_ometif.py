@@ -32,3 +32,10 @@ def test_load_ometif():
     assert data[chan][10, 10] == 246
     assert data[chan][205, 227] == 217
     assert data[chan][113, 206] == 280
+
+
+def test_signature_ometif():
+    path = get_ometif()
+    _, meta = formats.load(path)
+    # signature without reading the data
+    assert formats.get_signature(path) == meta["signature"]
@@ -1,6 +1,6 @@
 import numpy as np
 
-from impose import formats
+from impose import data, formats
 
 from helpers import retrieve_data
 
@@ -54,3 +54,18 @@ def test_load_bmlab_brillouin_signature():
     _, meta1 = formats.load(paths[0])
     _, meta2 = formats.load(paths[1])
     assert meta1["signature"] == meta2["signature"]
+    # signature without loading the data
+    assert formats.get_signature(paths[0]) == meta1["signature"]
+    assert formats.get_signature(paths[1]) == meta1["signature"]
+
+
+def test_load_bmlab_brillouin_concurrent():
+    """The bmlab session singleton must not be shared between threads"""
+    paths1 = retrieve_data("fmt_brillouin-h5_bmlab-session_2022_water.zip")
+    paths2 = \
+        retrieve_data("fmt_brillouin-h5_bmlab-session_2022_water_2-rep.zip")
+    dss = data.load_data_sources([paths1[0], paths2[0]] * 2, workers=4)
+    for ds in dss[::2]:
+        assert "brillouin_peak_position_f" in ds.data_channels
+    for ds in dss[1::2]:
+        assert "rep-1_brillouin_peak_position_f" in ds.data_channels
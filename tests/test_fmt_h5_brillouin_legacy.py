@@ -30,6 +30,13 @@ def test_load_brillouin():
     assert meta["signature"] == "627ccaa50d2b7447ebf64796e10f8794"
 
 
+def test_load_brillouin_signature():
+    path = data_path / "brillouin.h5"
+    _, meta = formats.load(path)
+    # signature without loading the data
+    assert formats.get_signature(path) == meta["signature"]
+
+
 def test_load_brillouin_invalid():
     path = data_path / "brillouin-invalid.h5"
     with pytest.raises(ValueError):
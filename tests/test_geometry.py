@@ -1,6 +1,8 @@
 import numpy as np
+import pytest
+from skimage.draw import polygon2mask
 
-from impose.geometry import shapes
+from impose.geometry import mask, shapes
 
 
 def test_getstate_circle():
@@ -36,6 +38,76 @@ def test_getstate_rectangle():
     assert shp.__getstate__()["point_um"] == 0.25
 
 
+def ellipse_mask_full_grid(x, y, a, b, phi, shape, scale_x=1, scale_y=1):
+    """Reference implementation evaluating the entire grid"""
+    xv = np.arange(shape[1]).reshape(1, -1) * scale_x
+    yv = np.arange(shape[0]).reshape(-1, 1) * scale_y
+    cos_angle = np.cos(np.pi - phi)
+    sin_angle = np.sin(np.pi - phi)
+    xc = (xv - x + .5)
+    yc = (yv - y + .5)
+    xct = xc * cos_angle - yc * sin_angle
+    yct = xc * sin_angle + yc * cos_angle
+    return (xct ** 2 / a ** 2) + (yct ** 2 / b ** 2) <= 1
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_mask_ellipse_bounding_box(seed):
+    rng = np.random.default_rng(seed)
+    for _ in range(100):
+        shape = tuple(rng.integers(1, 60, size=2))
+        x, y = rng.uniform(-20, 80, size=2)
+        a, b = rng.uniform(.1, 30, size=2)
+        phi = rng.uniform(0, 2 * np.pi)
+        scale_x = rng.uniform(.3, 3)
+        ref = ellipse_mask_full_grid(x, y, a, b, phi, shape, scale_x=scale_x)
+        assert np.all(mask.ellipse(x, y, a, b, phi, shape,
+                                   scale_x=scale_x) == ref)
+        acc = np.ones(shape, dtype=int)
+        mask.ellipse(x, y, a, b, phi, shape, scale_x=scale_x,
+                     accumulator=acc, factor=-2)
+        assert np.all(acc == 1 - 2 * ref)
+
+
+def test_mask_ellipse_invalid_scale():
+    assert not np.any(mask.ellipse(5, 5, 3, 3, 0, (10, 10), scale_x=np.nan))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_mask_polygon_scanline(seed):
+    """Scanline rasterization is identical to skimage's polygon2mask"""
+    rng = np.random.default_rng(seed)
+    for ii in range(200):
+        shape = tuple(rng.integers(1, 40, size=2))
+        points = rng.uniform(-5, 45, size=(rng.integers(3, 12), 2))
+        if ii % 3 == 1:
+            # vertices and edges on pixel centers
+            points = np.round(points)
+        elif ii % 3 == 2:
+            points = np.round(points * 2) / 2
+        ref = polygon2mask(shape, points[:, ::-1])
+        smask, bbox = mask.polygon_scanline(points, shape)
+        full = np.zeros(shape, dtype=bool)
+        full[bbox] = smask
+        assert np.all(full == ref)
+
+
+def test_mask_polygon_many_vertices():
+    phi = np.linspace(0, 2 * np.pi, 3000, endpoint=False)
+    rad = 20 + 3 * np.sin(9 * phi)
+    points = np.stack([50 + rad * np.cos(phi), 40 + rad * np.sin(phi)], axis=1)
+    ref = polygon2mask((80, 100), points[:, ::-1] - .5)
+    assert np.all(mask.polygon(points, (80, 100)) == ref)
+    acc = np.ones((80, 100), dtype=int)
+    mask.polygon(points, (80, 100), accumulator=acc, factor=-1)
+    assert np.all(acc == 1 - ref)
+
+
+def test_mask_polygon_invalid_scale():
+    points = [[4, 8], [12, 8], [12, 10], [4, 10]]
+    assert not np.any(mask.polygon(points, (10, 20), scale_x=np.nan))
+
+
 def test_rotate_circle():
     shp = shapes.Circle(x=11, y=10, r=8, point_um=.25)
     mask1 = shp.to_mask(shape=(20, 20))
@@ -1,6 +1,15 @@
 import pathlib
+import tempfile
+import threading
 
+import numpy as np
 from PyQt6 import QtWidgets
+import pyqtgraph as pg
+
+from impose import export
+from impose.gui import colocalize
+from impose.gui.widgets import BackgroundComputationError
+from impose.structure import StructureLayer
 
 
 data_dir = pathlib.Path(__file__).parent / "data"
@@ -15,3 +24,152 @@ def test_load_session(mw, qtbot, monkeypatch):
 
     # make sure that the path is loaded correctly
     assert mw.tab_coloc.tableWidget_paths.rowCount() == 1
+
+
+def test_export_data(mw, qtbot, monkeypatch):
+    example_session = data_dir / "brillouin.impose-session"
+    monkeypatch.setattr(QtWidgets.QFileDialog, "getOpenFileName",
+                        lambda *args: (str(example_session), None))
+    mw.on_session_open()
+    mw.tab_coloc.tableWidget_paths.setCurrentCell(0, 0)
+    mw.tab_coloc.on_dataset_selected()
+    td = pathlib.Path(tempfile.mkdtemp(prefix="impose_gui_export_"))
+    monkeypatch.setattr(QtWidgets.QFileDialog, "getExistingDirectory",
+                        lambda *args: str(td))
+    mw.tab_coloc.on_export_hdf5()
+    mw.tab_coloc.on_export_npz()
+    mw.tab_coloc.on_export_tsv()
+    assert (td / "brillouin.impose-data.h5").exists()
+    assert (td / "brillouin.impose-data.npz").exists()
+    assert (td / "brillouin.impose-composite").exists()
+    data, sc, _ = export.load_data(td / "brillouin.impose-data.h5")
+    assert sc == mw.tab_coloc.current_structure_composite
+
+
+def test_statistics_background(mw, qtbot, monkeypatch):
+    example_session = data_dir / "brillouin.impose-session"
+    monkeypatch.setattr(QtWidgets.QFileDialog, "getOpenFileName",
+                        lambda *args: (str(example_session), None))
+    mw.on_session_open()
+    tab = mw.tab_coloc
+    tab.tableWidget_paths.setCurrentCell(0, 0)
+    tab.on_dataset_selected()
+    sc = tab.current_structure_composite
+    channel = tab.comboBox_channel.currentData()
+    # only the latest of many requests is computed and shown
+    calls = []
+    get_layer_means_orig = colocalize.get_layer_means
+
+    def get_layer_means(*args, **kwargs):
+        calls.append(1)
+        return get_layer_means_orig(*args, **kwargs)
+
+    monkeypatch.setattr(colocalize, "get_layer_means", get_layer_means)
+    for ii in range(5):
+        tab.dial_translatex.setValue(tab.dial_translatex.value() + 100)
+    assert tab.statistics_worker.wait()
+    assert 0 < len(calls) < 5
+    assert tab.layer_view_worker.wait()
+    stats = sc.reduce_data(tab.current_data_source, channels=[channel])
+    for row, lstats in enumerate(stats.values()):
+        assert tab.tableWidget_structures.item(row, 1).text() == \
+            "{:.4g}".format(lstats[channel]["mean"])
+
+
+def test_statistics_mask_cache(mw, qtbot, monkeypatch):
+    example_session = data_dir / "brillouin.impose-session"
+    monkeypatch.setattr(QtWidgets.QFileDialog, "getOpenFileName",
+                        lambda *args: (str(example_session), None))
+    mw.on_session_open()
+    tab = mw.tab_coloc
+    tab.tableWidget_paths.setCurrentCell(0, 0)
+    tab.on_dataset_selected()
+    tab.update_statistics()
+    assert tab.statistics_worker.wait()
+    # the masks are obtained from the mask caches of the layers
+    computed = []
+    compute_orig = StructureLayer._compute_sparse_mask
+
+    def compute(self, data_source):
+        computed.append(threading.current_thread())
+        return compute_orig(self, data_source)
+
+    monkeypatch.setattr(StructureLayer, "_compute_sparse_mask", compute)
+    for ii in range(3):
+        tab.update_statistics()
+        assert tab.statistics_worker.wait()
+    assert not computed
+    # masks are computed in the background and then cached
+    tab.current_structure_composite.translate((10, 10))
+    tab.rois.update_roi_geometry()
+    for ii in range(3):
+        tab.update_statistics()
+        assert tab.statistics_worker.wait()
+    # (masks of translated layers may be shifted instead)
+    assert 0 < len(computed) <= len(tab.current_structure_composite)
+    assert threading.main_thread() not in computed
+
+
+def test_statistics_failed(mw, qtbot, monkeypatch):
+    example_session = data_dir / "brillouin.impose-session"
+    monkeypatch.setattr(QtWidgets.QFileDialog, "getOpenFileName",
+                        lambda *args: (str(example_session), None))
+    mw.on_session_open()
+    tab = mw.tab_coloc
+    tab.tableWidget_paths.setCurrentCell(0, 0)
+    tab.on_dataset_selected()
+    assert tab.statistics_worker.wait()
+
+    def get_layer_means(*args, **kwargs):
+        raise ValueError("statistics failed")
+
+    monkeypatch.setattr(colocalize, "get_layer_means", get_layer_means)
+    # errors in the background thread are raised in the GUI thread
+    with qtbot.capture_exceptions() as exceptions:
+        tab.update_statistics()
+        assert tab.statistics_worker.wait()
+    assert len(exceptions) == 1
+    assert exceptions[0][0] is BackgroundComputationError
+    assert "statistics failed" in str(exceptions[0][1])
+
+
+def test_transform_preview(mw, qtbot, monkeypatch):
+    example_session = data_dir / "brillouin.impose-session"
+    monkeypatch.setattr(QtWidgets.QFileDialog, "getOpenFileName",
+                        lambda *args: (str(example_session), None))
+    mw.on_session_open()
+    tab = mw.tab_coloc
+    tab.tableWidget_paths.setCurrentCell(0, 0)
+    tab.on_dataset_selected()
+    assert tab.statistics_worker.wait()
+    sc = tab.current_structure_composite
+    changed = []
+    tab.rois.structure_changed.connect(lambda: changed.append(1))
+
+    def get_roi_points():
+        points = []
+        for roi in tab.rois:
+            if isinstance(roi, pg.PolyLineROI):
+                local = [pg.Point(*pp) for pp in roi.getState()["points"]]
+            else:
+                rect = roi.boundingRect()
+                local = [rect.topLeft(), rect.bottomRight()]
+            for pp in local:
+                pt = roi.mapToParent(pp)
+                points.append([pt.x(), pt.y()])
+        return np.array(points)
+
+    # while dragging, the geometry is not updated
+    for dial in [tab.dial_rotate, tab.dial_translatex]:
+        dial.setSliderDown(True)
+        for ii in range(5):
+            dial.setValue(dial.value() + 100)
+        assert sc.has_pending_transform()
+        assert not changed
+    preview = get_roi_points()
+    tab.dial_rotate.setSliderDown(False)
+    tab.dial_translatex.setSliderDown(False)
+    # the geometry is updated when the dials are released
+    assert not sc.has_pending_transform()
+    assert changed
+    assert np.allclose(get_roi_points(), preview, atol=1e-6)
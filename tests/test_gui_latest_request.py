@@ -0,0 +1,66 @@
+import threading
+
+from impose.gui.widgets import LatestRequestWorker
+
+
+def test_latest_request_debounce(qtbot):
+    worker = LatestRequestWorker(debounce_ms=50)
+    calls = []
+    results = []
+    worker.finished.connect(results.append)
+
+    def func(value):
+        calls.append(value)
+        return value * 2
+
+    for ii in range(10):
+        worker.submit(func, ii)
+    assert worker.busy
+    assert worker.wait()
+    # only the latest request was computed
+    assert calls == [9]
+    assert results == [18]
+
+
+def test_latest_request_discard_stale(qtbot):
+    worker = LatestRequestWorker(debounce_ms=0)
+    event = threading.Event()
+    results = []
+    worker.finished.connect(results.append)
+
+    def slow(value):
+        event.wait(5)
+        return value
+
+    worker.submit(slow, 1)
+    qtbot.waitUntil(lambda: worker._running)
+    # the first request is running, these requests are pending
+    worker.submit(slow, 2)
+    worker.submit(slow, 3)
+    event.set()
+    assert worker.wait()
+    assert results == [3]
+
+
+def test_latest_request_failed(qtbot):
+    worker = LatestRequestWorker(debounce_ms=0)
+    errors = []
+    worker.failed.connect(errors.append)
+
+    def fail():
+        raise ValueError("computation failed")
+
+    worker.submit(fail)
+    assert worker.wait()
+    assert "computation failed" in errors[0]
+
+
+def test_latest_request_cancel(qtbot):
+    worker = LatestRequestWorker(debounce_ms=10)
+    results = []
+    worker.finished.connect(results.append)
+    worker.submit(lambda: 1)
+    worker.cancel()
+    assert not worker.busy
+    qtbot.wait(50)
+    assert results == []
@@ -0,0 +1,160 @@
+import pathlib
+
+import numpy as np
+import pyqtgraph as pg
+
+from impose.data import DataSource
+from impose.gui import visualize
+from impose.gui.visualize import Visualize, get_preview_level
+from impose.gui.widgets import BackgroundComputationError
+
+
+data_path = pathlib.Path(__file__).parent / "data"
+
+
+def test_update_image_background(qtbot):
+    vis = Visualize()
+    qtbot.addWidget(vis)
+    ds = DataSource(data_path / "brillouin.h5")
+    frames = []
+    vis.image_changed.connect(frames.append)
+    # the first image of a data source is rendered synchronously
+    vis.set_data_source(ds)
+    assert vis.has_data()
+    assert len(frames) == 1
+    frames.clear()
+    brightness = vis.slider_brightness.value()
+    # intermediate frames are dropped
+    for value in range(10, 60, 10):
+        vis.slider_brightness.setValue(value)
+    assert vis.render_worker.wait()
+    assert 1 <= len(frames) < 5
+    assert ds.metadata["channels"][ds.metadata["blend"]["channels"][0]][
+        "brightness"] == 50
+    assert np.array_equal(frames[-1], ds.get_image(dtype=np.float32),
+                          equal_nan=True)
+    assert np.array_equal(vis.imageView.image, frames[-1], equal_nan=True)
+    # cached images are displayed right away
+    frames.clear()
+    vis.slider_brightness.setValue(brightness)
+    vis.slider_brightness.setValue(50)
+    assert len(frames) == 2
+    assert not vis.render_worker.busy
+
+
+def test_update_image_discard_stale(qtbot):
+    vis = Visualize()
+    qtbot.addWidget(vis)
+    ds = DataSource(data_path / "brillouin.h5")
+    vis.set_data_source(ds)
+    frames = []
+    vis.image_changed.connect(frames.append)
+    vis.slider_brightness.setValue(20)
+    # a cached image supersedes the pending request
+    vis.slider_brightness.setValue(
+        ds.metadata["channels"][ds.metadata["blend"]["channels"][0]][
+            "brightness"])
+    vis.slider_brightness.setValue(128)
+    assert vis.render_worker.wait()
+    assert frames
+    assert np.array_equal(frames[-1], ds.get_image(dtype=np.float32),
+                          equal_nan=True)
+
+
+def test_update_image_failed(qtbot, monkeypatch):
+    vis = Visualize()
+    qtbot.addWidget(vis)
+    ds = DataSource(data_path / "brillouin.h5")
+    vis.set_data_source(ds)
+
+    def render_image(*args, **kwargs):
+        raise ValueError("rendering failed")
+
+    monkeypatch.setattr(visualize, "render_image", render_image)
+    # errors in the background thread are raised in the GUI thread
+    with qtbot.capture_exceptions() as exceptions:
+        vis.slider_brightness.setValue(20)
+        assert vis.render_worker.wait()
+    assert len(exceptions) == 1
+    assert exceptions[0][0] is BackgroundComputationError
+    assert "rendering failed" in str(exceptions[0][1])
+
+
+def test_preview_level():
+    assert get_preview_level((512, 512), max_pixels=2**18) == 1
+    assert get_preview_level((513, 512), max_pixels=2**18) == 2
+    assert get_preview_level((2048, 2048), max_pixels=2**18) == 4
+    assert get_preview_level((10000, 10000), max_pixels=2**18) == 8
+
+
+def test_roi_transform_preview(qtbot):
+    vis = Visualize()
+    qtbot.addWidget(vis)
+    ds = DataSource(data_path / "brillouin.h5")
+    vis.set_data_source(ds)
+    roi = pg.RectROI((10, 20), (30, 15))
+    vis.imageView.view.addItem(roi)
+    tr = vis.get_roi_transform(roi)
+    full = ds.get_image(dtype=np.float32)
+    _, tr_ref = roi.getArraySlice(full[:, :, 0],
+                                  vis.imageView.getImageItem())
+    assert np.allclose(tr.map(5.5, 7), tr_ref.map(5.5, 7))
+    # the transform refers to the full-resolution data also for previews
+    for preview in [2, 4, 8]:
+        vis.show_image(full[::preview, ::preview], preview=preview)
+        tr_prev = vis.get_roi_transform(roi)
+        for pt in [(0, 0), (30, 15), (5.5, 7)]:
+            assert np.allclose(tr.map(*pt), tr_prev.map(*pt))
+
+
+def test_update_image_preview(qtbot):
+    vis = Visualize()
+    qtbot.addWidget(vis)
+    vis.preview_pixels = 300
+    ds = DataSource(data_path / "brillouin.h5")
+    vis.set_data_source(ds)
+    frames = []
+    vis.image_changed.connect(frames.append)
+    # dragging a slider shows previews
+    vis.slider_brightness.setSliderDown(True)
+    assert vis.get_preview_level() == 4
+    vis.slider_brightness.setValue(60)
+    assert vis.render_worker.wait()
+    assert len(frames) == 1
+    # the preview is displayed with the geometry of the full image
+    full = ds.get_image(dtype=np.float32)
+    assert frames[0].shape == (13, 18, 3)
+    assert np.array_equal(frames[0], full[::4, ::4], equal_nan=True)
+    assert vis.imageView.getImageItem().transform().m11() == 4
+    # releasing the slider shows the full-resolution image
+    vis.slider_brightness.setSliderDown(False)
+    assert vis.get_preview_level() == 1
+    assert vis.render_worker.wait()
+    assert len(frames) == 2
+    assert np.array_equal(frames[1], full, equal_nan=True)
+
+
+def test_prefetch_slices(qtbot):
+    vis = Visualize()
+    qtbot.addWidget(vis)
+    ds = DataSource(data_path / "brillouin.h5")
+    # synthetic stack
+    for name in ds.data_channels:
+        image = ds.get_channel_data(name)
+        ds.data_channels[name] = np.stack(
+            [image + ii for ii in range(6)], axis=0)
+    ds.metadata["stack"]["shape"] = ds.data_channels[name].shape
+    ds.metadata["slice"]["view slice"] = 1
+    vis.set_data_source(ds)
+    assert vis.slider_slice.maximum() == 5
+    frames = []
+    vis.image_changed.connect(frames.append)
+    for view_slice in range(2, 6):
+        vis.prefetcher.wait()
+        vis.slider_slice.setValue(view_slice)
+        # prefetched slices are displayed right away
+        assert not vis.render_worker.busy
+        assert len(frames) == view_slice - 1
+        assert np.array_equal(frames[-1], ds.get_image(dtype=np.float32),
+                              equal_nan=True)
+    assert vis.prefetcher.direction == 1
@@ -7,7 +7,7 @@ import pytest
 
 import impose.data
 import impose.structure
-from impose import session
+from impose import file_index, session
 
 
 data_path = pathlib.Path(__file__).parent / "data"
@@ -103,6 +103,81 @@ def test_session_find_file_signature():
     ses2.load(path_s, search_paths=[data_path])
 
 
+def test_session_find_file_index_persistent():
+    tmp1 = pathlib.Path(tempfile.mkdtemp("impose_test"))
+    tmp2 = pathlib.Path(tempfile.mkdtemp("impose_test"))
+    path_d = tmp1 / "brillouin.h5"
+    path_s = tmp2 / "test.impose-session"
+    path_i = tmp2 / "index" / "signatures.json"
+    shutil.copy2(data_path / "brillouin.h5", path_d)
+    ses = session.ImposeSession()
+    ses.collect.append(path_d)
+    ses.save(path_s)
+    newdir = tmp2 / "a" / "nested" / "directory"
+    newdir.mkdir(parents=True)
+    path_d.rename(newdir / path_d.name)
+    ses2 = session.ImposeSession()
+    ses2.load(path_s, file_index=file_index.FileSignatureIndex(path_i))
+    assert ses2.collect.paths[0].samefile(newdir / path_d.name)
+    # the signature is stored in the index file
+    fsi = file_index.FileSignatureIndex(path_i)
+    assert fsi.entries[str(newdir / path_d.name)][2] \
+        == "627ccaa50d2b7447ebf64796e10f8794"
+
+
+def test_session_find_file_index_prune():
+    tmp = pathlib.Path(tempfile.mkdtemp("impose_test"))
+    path_d = tmp / "data" / "brillouin.h5"
+    path_d.parent.mkdir()
+    path_i = tmp / "signatures.json"
+    shutil.copy2(data_path / "brillouin.h5", path_d)
+    fsi = file_index.FileSignatureIndex(path_i)
+    fsi.get_signature(path_d)
+    # entries of files that do not exist are only removed if they
+    # are in a search path that was walked by the index
+    fsi.entries[str(tmp / "other" / "brillouin.h5")] = [1, 2, "sig"]
+    fsi.save()
+    assert len(file_index.FileSignatureIndex(path_i).entries) == 2
+    path_d.unlink()
+    fsi2 = file_index.FileSignatureIndex(path_i)
+    fsi2.save()
+    assert len(file_index.FileSignatureIndex(path_i).entries) == 2
+    # entries of deleted files are removed when saving
+    fsi3 = file_index.FileSignatureIndex(path_i)
+    assert fsi3.find("brillouin.h5", [tmp / "data"]) is None
+    fsi3.save()
+    entries = file_index.FileSignatureIndex(path_i).entries
+    assert list(entries) == [str(tmp / "other" / "brillouin.h5")]
+    # entries are kept if the search path cannot be reached
+    fsi4 = file_index.FileSignatureIndex(path_i)
+    assert fsi4.find("brillouin.h5", [tmp / "other"]) is None
+    fsi4.save()
+    assert file_index.FileSignatureIndex(path_i).entries == entries
+
+
+def test_session_find_file_index_reuse(monkeypatch):
+    tmp = pathlib.Path(tempfile.mkdtemp("impose_test"))
+    path_d = tmp / "brillouin.h5"
+    shutil.copy2(data_path / "brillouin.h5", path_d)
+    fsi = file_index.FileSignatureIndex()
+    sig = fsi.get_signature(path_d)
+    assert sig == "627ccaa50d2b7447ebf64796e10f8794"
+
+    # the signature of an unchanged file is not computed again
+    def get_signature(path):
+        raise AssertionError("signature should have been cached")
+    monkeypatch.setattr(file_index, "get_signature", get_signature)
+    assert fsi.get_signature(path_d) == sig
+    assert fsi.find("brillouin.h5", [tmp], signature=sig) == path_d
+    assert fsi.find("brillouin.h5", [tmp], signature="invalid") is None
+
+    # the directory is only walked once
+    calls = []
+    monkeypatch.setattr(fsi, "walk", lambda sp: calls.append(sp) or {})
+    assert fsi.find("brillouin.h5", [tmp / "subdir", tmp]) == path_d
+    assert not calls
+
+
 def test_session_find_file_signature_recursive_1():
     tmp1 = pathlib.Path(tempfile.mkdtemp("impose_test"))
     tmp2 = pathlib.Path(tempfile.mkdtemp("impose_test"))
@@ -149,6 +224,16 @@ def test_session_load_all(filename):
     ses.load(path)
 
 
+def test_session_load_workers():
+    """Loading a session sequentially or concurrently is equivalent"""
+    path = data_path / "brillouin.impose-session"
+    ses1 = session.ImposeSession(workers=1)
+    ses1.load(path)
+    ses2 = session.ImposeSession(workers=4)
+    ses2.load(path)
+    assert ses1 == ses2
+
+
 def test_session_populate_simple_collect():
     """Create a new session from scratch and populate collect"""
     path = data_path / "brillouin.h5"
@@ -6,6 +6,8 @@ import pytest
 
 from impose import data
 from impose.structure import StructureComposite, StructureLayer
+from impose.structure.statistics import (
+    StreamingStatistics, compute_statistics)
 from impose.geometry import shapes
 
 data_path = pathlib.Path(__file__).parent / "data"
@@ -125,6 +127,120 @@ def test_extract_data():
                        atol=0, rtol=1e-12)
 
 
+def test_extract_data_label_image():
+    """One-pass extraction yields the same data as single layers"""
+    ds = data.DataSource(data_path / "brillouin.h5")
+    with (data_path / "brillouin.impose-composite").open() as fd:
+        state = json.load(fd)
+    sc = StructureComposite()
+    sc.__setstate__(state)
+    channels = sorted(ds.data_channels.keys())
+    ed = sc.extract_data(data_source=ds)
+    label = sc.to_label_image(ds)
+    assert label.dtype == np.uint8
+    assert label.shape == ds.get_image_shape()
+    for sl, bit in zip(sc, sc.get_label_bits()):
+        assert np.all(((label & bit) != 0) == sl.to_mask(ds))
+        ref = sl.extract_data(data_source=ds, channels=channels)
+        for chn in channels:
+            assert np.array_equal(ed[sl.label][chn], ref[chn],
+                                  equal_nan=True)
+
+
+def test_reduce_data():
+    ds = data.DataSource(data_path / "brillouin.h5")
+    with (data_path / "brillouin.impose-composite").open() as fd:
+        state = json.load(fd)
+    sc = StructureComposite()
+    sc.__setstate__(state)
+    ed = sc.extract_data(data_source=ds, channels=["BrillouinShift"])
+    stats = sc.reduce_data(data_source=ds, channels=["BrillouinShift"])
+    assert list(stats.keys()) == [sl.label for sl in sc]
+    for label in stats:
+        ref = ed[label]["BrillouinShift"]
+        st = stats[label]["BrillouinShift"]
+        assert st["size"] == ref.size
+        assert st["count"] == np.sum(~np.isnan(ref))
+        assert np.allclose(st["mean"], np.nanmean(ref), atol=0, rtol=1e-12)
+
+
+def test_geometry_store():
+    def get_composite():
+        sc = StructureComposite()
+        for ii in range(3):
+            geometry = [
+                (shapes.Ellipse(x=ii, y=2, a=5, b=3, phi=.3, point_um=.5), 1),
+                (shapes.Polygon(points=[[0, 0], [10 + ii, 2], [3, 9]],
+                                point_um=.5), 1),
+                (shapes.Rectangle(x=4, y=ii, a=5, b=2, point_um=.5), -1),
+                (shapes.Circle(x=3, y=ii, r=4, point_um=.5), 1),
+            ]
+            sc.append(StructureLayer(label=f"layer {ii}", geometry=geometry,
+                                     point_um=.5))
+        return sc
+
+    sc1 = get_composite()
+    sc2 = get_composite()
+    sc2.use_geometry_store = False
+    for sc in [sc1, sc2]:
+        sc.rotate(.4)
+        sc.translate((1.5, -2))
+        sc.rotate(-1.2, origin_um=(3, 4))
+    assert sc1.get_geometry_store() is not None
+    assert sc2.get_geometry_store() is None
+    assert np.allclose(sc1.position_um, sc2.position_um, atol=1e-12, rtol=0)
+    assert np.allclose(sc1.to_point_signature(), sc2.to_point_signature(),
+                       atol=1e-12, rtol=0)
+    # the shapes are views of the store
+    store = sc1.get_geometry_store()
+    assert sc1[1].geometry[0][0].x == store.poses[3, 0]
+    # replacing shapes invalidates the store
+    sc1[0].geometry[1] = (shapes.Polygon(point_um=.5), 1)
+    sc2[0].geometry[1] = (shapes.Polygon(point_um=.5), 1)
+    sc1.translate((1, 2))
+    sc2.translate((1, 2))
+    assert sc1.get_geometry_store() is not store
+    assert np.allclose(sc1.to_point_signature(), sc2.to_point_signature(),
+                       atol=1e-12, rtol=0)
+
+
+def test_lazy_transform():
+    def get_layer(label):
+        return StructureLayer(
+            label=label,
+            geometry=[(shapes.Ellipse(x=1, y=2, a=5, b=3, point_um=.5), 1),
+                      (shapes.Polygon(points=[[0, 0], [10, 2], [3, 9]],
+                                      point_um=.5), 1)],
+            point_um=.5)
+
+    sc = StructureComposite()
+    sc.append(get_layer("a"))
+    sl = get_layer("a")
+    sc.rotate(.3)
+    sc.translate((1, -2))
+    sc.rotate(-.1, origin_um=(4, 2))
+    assert sc.has_pending_transform()
+    # shapes are not modified yet
+    assert sc._layers[0].geometry[0][0].x == 1
+    position = sc.position_um
+    # eager transformation of the layer
+    sl.rotate(.3)
+    sl.translate((1, -2))
+    sl.rotate(-.1, origin_um=(4, 2))
+    # accessing the layers applies the transformation
+    assert np.allclose(sc[0].to_point_signature(), sl.to_point_signature(),
+                       atol=1e-12, rtol=0)
+    assert not sc.has_pending_transform()
+    assert np.allclose(position, sc.position_um, atol=1e-12, rtol=0)
+    assert np.allclose(position, sl.position_um, atol=1e-12, rtol=0)
+    # appended layers are not transformed
+    sc.translate((5, 5))
+    sc.append(get_layer("b"))
+    assert sc["b"].geometry[0][0].x == 1
+    assert np.allclose(sc["a"].geometry[0][0].x, sl.geometry[0][0].x + 10,
+                       atol=1e-12, rtol=0)
+
+
 def test_index():
     sl1 = StructureLayer(
         label="test layer",
@@ -291,6 +407,67 @@ def test_repr():
     assert repr(sc1).startswith("<StructureComposite: (1 layers)")
 
 
+def test_stack_statistics():
+    ds = data.DataSource(data_path / "brillouin.h5")
+    with (data_path / "brillouin.impose-composite").open() as fd:
+        state = json.load(fd)
+    sc = StructureComposite()
+    sc.__setstate__(state)
+    ed = sc.extract_data(data_source=ds, channels=["BrillouinShift"])
+    # stack of three slices
+    image = ds.get_channel_data("BrillouinShift")
+    stack = np.stack([image, 2 * image, image + 1], axis=0)
+    for name in ds.data_channels:
+        ds.data_channels[name] = stack
+    ds.metadata["stack"]["shape"] = stack.shape
+    assert ds.get_slice_count() == 3
+    tables, totals = sc.get_stack_statistics(data_source=ds,
+                                             channels=["BrillouinShift"],
+                                             quantiles=[0.5])
+    assert len(tables) == 3
+    assert tables == list(sc.iter_slice_statistics(
+        data_source=ds, channels=["BrillouinShift"], quantiles=[0.5]))
+    for ii, func in enumerate([lambda x: x, lambda x: 2 * x,
+                               lambda x: x + 1]):
+        assert [row["layer"] for row in tables[ii]] == \
+            [sl.label for sl in sc]
+        for row in tables[ii]:
+            assert row["slice"] == ii
+            assert row["channel"] == "BrillouinShift"
+            ref = func(ed[row["layer"]]["BrillouinShift"])
+            assert row["size"] == ref.size
+            assert row["count"] == np.sum(~np.isnan(ref))
+            assert np.allclose(row["mean"], np.nanmean(ref))
+            assert np.allclose(row["std"], np.nanstd(ref))
+            assert np.allclose(row["min"], np.nanmin(ref))
+            assert np.allclose(row["max"], np.nanmax(ref))
+            assert np.allclose(row["quantile 0.5"], np.nanmedian(ref))
+    for row in totals:
+        assert "slice" not in row
+        ref = ed[row["layer"]]["BrillouinShift"]
+        ref = np.concatenate([ref, 2 * ref, ref + 1])
+        assert row["size"] == ref.size
+        assert row["count"] == np.sum(~np.isnan(ref))
+        assert np.allclose(row["mean"], np.nanmean(ref))
+        assert np.allclose(row["std"], np.nanstd(ref))
+        assert np.allclose(row["sum of squares"], np.nansum(ref**2))
+        # sample is large enough for exact quantiles
+        assert np.allclose(row["quantile 0.5"], np.nanmedian(ref))
+
+
+def test_statistics_std_precision():
+    # large intensities with a small spread
+    rng = np.random.default_rng(42)
+    values = (1e6 + rng.normal(scale=0.1, size=10000)).astype(np.float32)
+    values[::7] = np.nan
+    ref = np.nanstd(values.astype(float))
+    assert np.isclose(compute_statistics(values)["std"], ref, rtol=1e-9)
+    acc = StreamingStatistics()
+    for chunk in np.array_split(values, 7):
+        acc.update(chunk)
+    assert np.isclose(acc.get_statistics()["std"], ref, rtol=1e-9)
+
+
 def test_str():
     sl1 = StructureLayer(
         label="test layer",
@@ -1,9 +1,30 @@
+import pathlib
+
 import numpy as np
+import pytest
 
+from impose.data import DataSource
 from impose.structure import StructureLayer
 from impose.geometry import shapes
 
 
+data_path = pathlib.Path(__file__).parent / "data"
+
+
+class ImageGeometry:
+    """Provides the image geometry methods of a DataSource"""
+    def __init__(self, shape, pixel_size):
+        self.shape = shape
+        self.pixel_size = pixel_size
+        self.metadata = {"slice": {"view plane": [0, 1]}}
+
+    def get_image_shape(self):
+        return self.shape
+
+    def get_pixel_size(self):
+        return self.pixel_size
+
+
 def test_copy():
     sl = StructureLayer(
         label="test layer",
@@ -20,6 +41,177 @@ def test_copy():
     assert sl.geometry != sl2.geometry
 
 
+def test_extract_data():
+    ds = DataSource(data_path / "brillouin.h5")
+    sl = StructureLayer(
+        label="test layer",
+        geometry=[(shapes.Circle(x=30, y=20, r=8), 1),
+                  (shapes.Rectangle(x=30, y=20, a=4, b=6), -1)],
+        point_um=1,
+    )
+    mask = sl.to_mask(ds)
+    data = sl.extract_data(ds)
+    for ch in ds.data_channels:
+        assert np.all(data[ch] == ds[ch][mask])
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_to_sparse_mask(seed):
+    """Compare sparse masks with full-frame rasterization"""
+    rng = np.random.default_rng(seed)
+    igeom = ImageGeometry(shape=(70, 90), pixel_size=(1.5, 1))
+    geometry = []
+    for ii in range(6):
+        x, y = rng.uniform(-10, 100, size=2)
+        a, b = rng.uniform(1, 20, size=2)
+        phi = rng.uniform(0, 2*np.pi)
+        shape = [shapes.Ellipse(x=x, y=y, a=a, b=b, phi=phi),
+                 shapes.Rectangle(x=x, y=y, a=a, b=b, phi=phi),
+                 shapes.Polygon(points=rng.uniform(-10, 100, size=(5, 2)))
+                 ][ii % 3]
+        geometry.append((shape, int(rng.choice([-1, 1, 2]))))
+    geometry[0] = (geometry[0][0], 1)
+    sl = StructureLayer(label="test", geometry=geometry, point_um=1)
+    # reference
+    accmask = np.zeros(igeom.shape, dtype=int)
+    for sh, fact in geometry:
+        accmask += sh.to_mask(igeom.shape, scale_x=1/1.5) * fact
+    ref = accmask > 0
+    smask = sl.to_sparse_mask(igeom)
+    assert np.all(smask.to_dense() == ref)
+    assert np.all(sl.to_mask(igeom) == ref)
+    assert smask.sum() == np.sum(ref)
+    assert np.all(smask.flat_indices() == np.flatnonzero(ref))
+    image = rng.random(igeom.shape)
+    assert np.all(smask.gather(image) == image[ref])
+    # contiguous and strided images
+    image2 = rng.random(igeom.shape[::-1]).T
+    data = smask.gather_all(im for im in [image, image2])
+    assert np.all(data[0] == image[ref])
+    assert np.all(data[1] == image2[ref])
+    cropped = smask.cropped()
+    assert np.all(cropped.to_dense() == ref)
+    if np.any(ref):
+        rows, cols = np.nonzero(ref)
+        assert cropped.bbox == (slice(rows.min(), rows.max() + 1),
+                                slice(cols.min(), cols.max() + 1))
+
+
+def test_to_sparse_mask_empty():
+    igeom = ImageGeometry(shape=(20, 30), pixel_size=(1, 1))
+    sl = StructureLayer(
+        label="test layer",
+        geometry=[(shapes.Circle(x=-30, y=20, r=8), 1),
+                  (shapes.Circle(x=10, y=10, r=8), -1)],
+        point_um=1,
+    )
+    smask = sl.to_sparse_mask(igeom)
+    assert smask.sum() == 0
+    assert smask.gather(np.ones((20, 30))).size == 0
+    assert smask.gather_all([np.ones((20, 30))])[0].size == 0
+    assert not np.any(smask.to_dense())
+    assert smask.cropped().mask.shape == (0, 0)
+
+
+def test_mask_cache():
+    igeom = ImageGeometry(shape=(70, 90), pixel_size=(1, 1))
+    sl = StructureLayer(
+        label="test layer",
+        geometry=[(shapes.Circle(x=30, y=20, r=8), 1)],
+        point_um=1,
+    )
+    smask = sl.to_sparse_mask(igeom)
+    assert not smask.mask.flags.writeable
+    assert sl.to_sparse_mask(igeom) is smask
+    # different image geometry
+    igeom2 = ImageGeometry(shape=(70, 90), pixel_size=(2, 1))
+    assert sl.to_sparse_mask(igeom2) is not smask
+    assert sl.to_sparse_mask(igeom) is smask
+    # modifications of the geometry invalidate the cache
+    sl.translate((1, 0))
+    smask2 = sl.to_sparse_mask(igeom)
+    assert smask2.offset == (smask.offset[0], smask.offset[1] + 1)
+    sl.translate((-1, 0))
+    assert np.all(sl.to_sparse_mask(igeom).to_dense() == smask.to_dense())
+    # modifying a shape directly also changes the key
+    sl.geometry[0][0].r = 4
+    assert sl.to_sparse_mask(igeom).sum() < smask.sum()
+
+
+def test_mask_cache_copy():
+    igeom = ImageGeometry(shape=(70, 90), pixel_size=(1, 1))
+    sl = StructureLayer(
+        label="test layer",
+        geometry=[(shapes.Circle(x=30, y=20, r=8), 1)],
+        point_um=1,
+    )
+    smask = sl.to_sparse_mask(igeom)
+    assert sl.copy().to_sparse_mask(igeom) is not smask
+    # the copy shares the cached masks
+    sl2 = sl.copy(caches=True)
+    assert sl2.to_sparse_mask(igeom) is smask
+    # masks of the copy can be added to the caches of the original
+    sl2.translate((5, 0))
+    smask2 = sl2.to_sparse_mask(igeom)
+    sl.translate((5, 0))
+    sl.update_caches(sl2)
+    assert sl.to_sparse_mask(igeom) is smask2
+    # the cache size is limited
+    for ii in range(sl.mask_cache_size + 1):
+        sl2.to_sparse_mask(ImageGeometry(shape=(70, 90 + ii),
+                                         pixel_size=(1, 1)))
+    sl.update_caches(sl2)
+    assert len(sl._mask_cache) == sl.mask_cache_size
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_mask_translation(seed):
+    """Shifted masks of translated layers are identical to new masks"""
+    rng = np.random.default_rng(seed)
+    igeom = ImageGeometry(shape=(80, 100), pixel_size=(rng.uniform(.5, 2), 1))
+    sl = StructureLayer(
+        label="test layer",
+        geometry=[
+            (shapes.Ellipse(x=40, y=30, a=12, b=7, phi=rng.uniform(0, 6)), 1),
+            (shapes.Polygon(points=rng.uniform(30, 50, size=(8, 2))), 1),
+            (shapes.Rectangle(x=42, y=35, a=6, b=4, phi=.4), -1),
+        ],
+        point_um=1,
+    )
+    scale_x = igeom.get_pixel_size()[1] / igeom.get_pixel_size()[0]
+    computed = 0
+    for ii in range(60):
+        if ii % 2:
+            # integer pixel translation
+            dr = rng.integers(-3, 4, size=2) * np.array([scale_x, 1])
+        else:
+            dr = rng.normal(scale=.02, size=2)
+        sl.translate(dr)
+        reference = sl._compute_sparse_mask(igeom)
+        smask = sl.to_sparse_mask(igeom)
+        if smask.mask.base is None:
+            computed += 1
+        assert np.all(smask.to_dense() == reference.to_dense())
+    # masks are reused at least for integer translations
+    assert computed < 40
+
+
+def test_mask_translation_slack():
+    shape = (50, 50)
+    for sh in [shapes.Ellipse(x=20.3, y=21.7, a=6, b=4, phi=.3),
+               shapes.Polygon(points=[[10.2, 11.1], [30.7, 14.4],
+                                      [22.1, 30.9]]),
+               shapes.Rectangle(x=20.1, y=25.2, a=10, b=5, phi=.2)]:
+        slack = sh.translation_slack(shape)
+        assert 0 <= slack <= 1
+        ref = sh.to_mask(shape)
+        for phi in np.linspace(0, 2 * np.pi, 12):
+            dx, dy = .999 * slack * np.cos(phi), .999 * slack * np.sin(phi)
+            sh.translate(dx, dy)
+            assert np.all(sh.to_mask(shape) == ref)
+            sh.translate(-dx, -dy)
+
+
 def test_position_1():
     sl = StructureLayer(
         label="test layer",